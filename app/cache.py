@@ -0,0 +1,138 @@
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire `ttl` seconds after being set.
+
+    `generation` changes on every invalidation, callers that compute a value
+    across an `await` compare it before storing so they never cache a result
+    a concurrent write has already made stale.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries: OrderedDict = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            self.evictions += 1
+            self.misses += 1
+            return default
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key):
+        self.generation += 1
+        if self.entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def invalidate(self, predicate):
+        """
+        Drop every entry for which `predicate(key, value)` is true.
+        """
+        self.generation += 1
+        stale = [key for key, (_, value) in self.entries.items() if predicate(key, value)]
+        for key in stale:
+            del self.entries[key]
+        self.invalidations += len(stale)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class FileEntry(NamedTuple):
+    content: memoryview
+    etag: str
+    media_type: str
+    last_modified: str
+
+
+class FileCache:
+    """
+    LRU of small file contents bounded by total bytes. Only for files that
+    never change once written (content-addressed images), so entries are never
+    revalidated against the disk.
+    """
+
+    def __init__(self, max_bytes: int, max_file_size: int):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.entries: OrderedDict[str, FileEntry] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(self, key, content: bytes, etag: str, media_type: str, last_modified: str) -> FileEntry:
+        entry = FileEntry(memoryview(content), etag, media_type, last_modified)
+        if len(content) > self.max_file_size:
+            return entry
+
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous.content)
+        self.entries[key] = entry
+        self.size += len(content)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted.content)
+            self.evictions += 1
+        return entry
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -1,17 +1,206 @@
 import os
+from contextlib import asynccontextmanager
+
 import motor.motor_asyncio
+from pymongo import IndexModel, ReadPreference
+from pymongo.read_preferences import SecondaryPreferred
 from dotenv import load_dotenv
 
 load_dotenv()
 
+MONGODB_URL = os.getenv("MONGODB_URL")
+MONGODB_DATABASE = os.getenv("MONGODB_DATABASE", "meal")
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", 100))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", 0))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", 20000))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 30000))
+# Contoh: "zstd,snappy,zlib" (urutan preferensi). zstd butuh paket `zstandard`, snappy butuh `python-snappy`;
+# compressor yang modulnya tidak terpasang dilewati oleh PyMongo dengan warning
+MONGODB_COMPRESSORS = [name.strip() for name in os.getenv("MONGODB_COMPRESSORS", "").split(",") if name.strip()]
+
+# Baca katalog (GET /meals, /meals/{id}, favourite) dari secondary. Setelah menulis, user bisa
+# melihat data lama paling lama CATALOGUE_MAX_STALENESS detik (minimal 90 menurut MongoDB)
+CATALOGUE_READ_SECONDARY = os.getenv("CATALOGUE_READ_SECONDARY", "false").lower() in ("1", "true", "yes")
+CATALOGUE_MAX_STALENESS = int(os.getenv("CATALOGUE_MAX_STALENESS", 90))
+
+CATALOGUE_READ_PREFERENCE = (
+    SecondaryPreferred(max_staleness=CATALOGUE_MAX_STALENESS) if CATALOGUE_READ_SECONDARY else ReadPreference.PRIMARY
+)
+
+# Berapa lama record outbox yang gagal permanen disimpan untuk diperiksa
+OUTBOX_FAILED_RETENTION = int(os.getenv("OUTBOX_FAILED_RETENTION", 7 * 24 * 60 * 60))
+
+
+class Mongo:
+    """
+    Holder of the Motor client, opened and closed by the app lifespan.
+    """
+
+    def __init__(self):
+        self.client = None
+        self.db = None
+
+    def connect(self):
+        if self.client is not None:
+            return
+        options = {
+            "maxPoolSize": MONGODB_MAX_POOL_SIZE,
+            "minPoolSize": MONGODB_MIN_POOL_SIZE,
+            "connectTimeoutMS": MONGODB_CONNECT_TIMEOUT_MS,
+            "serverSelectionTimeoutMS": MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        }
+        if MONGODB_COMPRESSORS:
+            options["compressors"] = MONGODB_COMPRESSORS
+        self.client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URL, **options)
+        self.db = self.client[MONGODB_DATABASE]
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+            self.db = None
+
+
+class LazyCollection:
+    """
+    Collection of the lifespan client that can be imported at module level.
+    Attribute access is forwarded to the Motor collection of the current
+    client, so `meal_collection.find(...)` works as before once connected.
+    """
+
+    def __init__(self, name: str, read_preference=None):
+        # Atribut privat agar tidak menutupi atribut collection Motor (name, database, ...)
+        self._name = name
+        self._read_preference = read_preference
+        self._database = None
+        self._collection = None
+
+    def __getattr__(self, attribute):
+        database = mongo.db
+        if database is None:
+            raise RuntimeError("MongoDB client is not connected, call mongo.connect() first")
+        if self._database is not database:
+            self._collection = database.get_collection(self._name, read_preference=self._read_preference)
+            self._database = database
+        return getattr(self._collection, attribute)
+
+
+mongo = Mongo()
+meal_collection = LazyCollection("meals")
+user_collection = LazyCollection("users")
+favourites_collection = LazyCollection("favourites")
+counters_collection = LazyCollection("counters")
+outbox_collection = LazyCollection("outbox")
+stats_collection = LazyCollection("stats")
+
+# Hanya untuk baca katalog; penulisan dan baca milik user sendiri tetap lewat primary
+catalogue_meals = LazyCollection("meals", CATALOGUE_READ_PREFERENCE)
+catalogue_favourites = LazyCollection("favourites", CATALOGUE_READ_PREFERENCE)
+catalogue_counters = LazyCollection("counters", CATALOGUE_READ_PREFERENCE)
+
+
+@asynccontextmanager
+async def catalogue_session():
+    """
+    Causally consistent session for the reads of one catalogue response, or
+    None when catalogue reads go to the primary. Within the session a read on
+    a secondary waits until that secondary has caught up with the earlier
+    reads, so a page is never older than the counters its ETag was built from.
+    """
+    if not CATALOGUE_READ_SECONDARY:
+        yield None
+        return
+    async with await mongo.client.start_session(causal_consistency=True) as session:
+        yield session
+
+
+# Semua index yang dibutuhkan query di router, per collection. Dibuat saat startup oleh ensure_indexes.
+# Nama index dibiarkan default (mis. `email_1`) agar sama dengan index yang sudah dibuat di database lama
+INDEXES = {
+    "users": [
+        # Dipakai get_current_user dan signin/signup, juga filter prefix email di admin
+        IndexModel([("email", 1)], unique=True),
+        # Filter direktori user di admin, dengan sort _id untuk pagination
+        IndexModel([("superuser", 1), ("active", 1), ("verified", 1), ("_id", 1)]),
+    ],
+    "meals": [
+        # Antrean moderasi dan GET /meals tanpa filter: status lalu urutan _id
+        IndexModel([("verification_status", 1), ("_id", 1)]),
+        # Filter category/area pada GET /meals, diurutkan dengan _id untuk pagination
+        IndexModel([("verification_status", 1), ("category", 1), ("_id", 1)]),
+        IndexModel([("verification_status", 1), ("area", 1), ("_id", 1)]),
+        # GET /meals/mymeals
+        IndexModel([("author", 1), ("_id", 1)]),
+    ],
+    "favourites": [
+        # Satu favourite per (user, meal), juga untuk cek flag `favourited`
+        IndexModel([("user_id", 1), ("meal_id", 1)], unique=True),
+        # GET /users/favourite-meals, pagination pada _id favourite
+        IndexModel([("user_id", 1), ("_id", 1)]),
+    ],
+    "outbox": [
+        # Worker outbox mengambil record pending yang paling lama tersedia
+        IndexModel([("state", 1), ("available_at", 1)]),
+        # Index TTL: record yang gagal dihapus MongoDB OUTBOX_FAILED_RETENTION detik setelah `failed_at`
+        IndexModel([("failed_at", 1)], expireAfterSeconds=OUTBOX_FAILED_RETENTION),
+    ],
+}
+
+
+async def remove_duplicate_favourites(collection) -> int:
+    """
+    Delete all but the oldest favourite of every `(user_id, meal_id)` pair,
+    so the unique index can be built on data written by the old toggle.
+    """
+    pipeline = [
+        {"$group": {"_id": {"user_id": "$user_id", "meal_id": "$meal_id"}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    duplicates = []
+    async for group in collection.aggregate(pipeline, allowDiskUse=True):
+        duplicates.extend(sorted(group["ids"])[1:])
+    for start in range(0, len(duplicates), 1000):
+        await collection.delete_many({"_id": {"$in": duplicates[start:start + 1000]}})
+    return len(duplicates)
+
+
+async def find_duplicate_emails(collection) -> list[str]:
+    """
+    Emails held by more than one user. Those accounts own meals and
+    favourites, so they are left for an admin to merge instead of deleted.
+    """
+    pipeline = [
+        {"$group": {"_id": "$email", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    return [group["_id"] async for group in collection.aggregate(pipeline, allowDiskUse=True)]
+
+
+async def ensure_indexes(database=None):
+    """
+    Create every index in `INDEXES`. Existing indexes with the same
+    definition are left alone, so this is safe on every startup.
+    """
+    if database is None:
+        database = mongo.db
+
+    # Index unik favourites belum ada: bersihkan duplikat dulu, sekali saja
+    favourites = database.get_collection("favourites")
+    if "user_id_1_meal_id_1" not in await favourites.index_information():
+        removed = await remove_duplicate_favourites(favourites)
+        if removed:
+            print(f"Removed {removed} duplicate favourites")
 
-client = motor.motor_asyncio.AsyncIOMotorClient(os.getenv("MONGODB_URL"))
-db = client.meal
-meal_collection = db.get_collection("meals")
-user_collection = db.get_collection("users")
-favourites_collection = db.get_collection("favourites")
-# meal_collection.create_index(
-#     [("name", "text"), ("area", "text"), ("ingredients.name", "text")],
-#     default_language="none",
-# )
+    # Index unik email belum ada: kalau ada email ganda, index itu dilewati sampai
+    # akunnya digabung, index lain tetap dibuat dan startup tidak gagal
+    skipped = set()
+    users = database.get_collection("users")
+    if "email_1" not in await users.index_information():
+        duplicates = await find_duplicate_emails(users)
+        if duplicates:
+            print(f"Skipping the unique email index, {len(duplicates)} duplicate emails: {', '.join(duplicates[:10])}")
+            skipped.add("email_1")
 
+    for collection, indexes in INDEXES.items():
+        indexes = [index for index in indexes if index.document["name"] not in skipped]
+        await database.get_collection(collection).create_indexes(indexes)
@@ -1,5 +1,6 @@
+from datetime import datetime
 from typing_extensions import Annotated
-from typing import Optional
+from typing import Literal, Optional
 from pydantic import ConfigDict, BaseModel, Field, EmailStr
 from pydantic.functional_validators import BeforeValidator
 
@@ -63,7 +64,7 @@ class MealAdmin(MealModel) :
     )
 
 class MealResponse(MealModel):
-    favourited : bool
+    favourited : bool = False
 
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
@@ -85,8 +86,59 @@ class MealResponse(MealModel):
         },
     )
 
+class MealSummary(BaseModel):
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    name : str = Field(...)
+    category : str = Field(...)
+    area : str = Field(...)
+    imageUrl : Optional[str] = None
+    favourited : bool = False
+
+
+class MealSummaryCollection(BaseModel):
+    meals : list[MealSummary]
+    next_cursor : Optional[str] = None
+
+
+# `view` pada endpoint list: summary hanya membaca field ini dari MongoDB
+MealView = Literal["summary", "full"]
+MEAL_SUMMARY_PROJECTION = {"name": 1, "category": 1, "area": 1, "imageUrl": 1}
+
+
+class PantryMatch(MealModel):
+    missing : list[str]
+
+
+class PantryMatchCollection(BaseModel):
+    meals : list[PantryMatch]
+    next_cursor : Optional[str] = None
+
+
+class FacetCounts(BaseModel):
+    category : dict[str, int]
+    area : dict[str, int]
+
+
+class DailyStats(BaseModel):
+    date : str
+    signups : int = 0
+    favourites : int = 0
+
+
+class AdminStats(BaseModel):
+    users : int = 0
+    verified_users : int = 0
+    favourites : int = 0
+    meals : dict[str, int] = {}
+    categories : dict[str, int] = {}
+    areas : dict[str, int] = {}
+    daily : list[DailyStats]
+    reconciled_at : Optional[datetime] = None
+
+
 class MealAdminCollection(BaseModel):
     meals : list[MealAdmin]
+    next_cursor : Optional[str] = None
 
 
 class UpdateMealModel(BaseModel):
@@ -100,7 +152,7 @@ class UpdateMealModel(BaseModel):
     instructions : Optional[str] = None
     youtubeUrl : Optional[str] = None
     imageUrl : Optional[str] = None
-    ingredients : Optional[list] = None
+    ingredients : Optional[list[Ingredient]] = None
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
         json_schema_extra={
@@ -125,8 +177,31 @@ class UpdateMealStatus(BaseModel):
     verification_status: str = Field("pending", enum=["pending", "approved", "rejected"])
 
 
+VerificationStatus = Literal["pending", "approved", "rejected"]
+
+
+class MealStatusUpdate(BaseModel):
+    id : str
+    verification_status : VerificationStatus
+
+
+class BulkMealStatusUpdate(BaseModel):
+    updates : list[MealStatusUpdate] = Field(..., min_length=1, max_length=500)
+
+
+class MealStatusResult(BaseModel):
+    id : str
+    result : Literal["updated", "not_found", "invalid_id"]
+    verification_status : Optional[VerificationStatus] = None
+
+
+class BulkMealStatusResult(BaseModel):
+    results : list[MealStatusResult]
+
+
 class MealCollection(BaseModel):
-    meals: list[MealModel]
+    meals: list[MealResponse]
+    next_cursor: Optional[str] = None
 
 
 
@@ -146,7 +221,9 @@ class UserModel(BaseModel) :
         }
     )
 
-class UserAdmin(UserModel):
+class UserAdmin(BaseModel):
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    email : str = Field(...)
     superuser : bool 
     verified : bool 
     active : bool 
@@ -157,7 +234,6 @@ class UserAdmin(UserModel):
         json_schema_extra={
             "example" : {
                 "email" : "YourEmail@email.com",
-                "password" : "YourSecretPassword",
                 "superuser" : False,
                 "active" : False,
                 "created_at" : "2024-12-01T08:36:18.248618"
@@ -172,8 +248,14 @@ class UserResponseModel(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     email: EmailStr
 
+# Hash password tidak pernah dibaca oleh endpoint admin
+USER_ADMIN_PROJECTION = {"email": 1, "superuser": 1, "verified": 1, "active": 1, "created_at": 1}
+
 class UserCollection(BaseModel) :
     users : list[UserAdmin]
+    next_cursor : Optional[str] = None
+    total : Optional[int] = None
+    total_is_estimate : bool = False
 
 class UpdateUserPrivilage(BaseModel):
     superuser : Optional[bool] = None
@@ -3,12 +3,13 @@ import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import EmailStr
-from typing import Annotated
+from typing import Annotated, Optional
 
+from app.cache import TTLCache
 from app.database.models import UserResponseModel
 from app.database.config import user_collection, meal_collection
 
-from passlib.hash import bcrypt
+from app.passwords import verify_password
 
 from dotenv import load_dotenv
 import os
@@ -18,9 +19,22 @@ SECRET_KEY = os.getenv('SECRET_KEY')
 
 JWT_SECRET = SECRET_KEY
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/signin')
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/signin', auto_error=False)
+
+# User yang sudah login, per email. TTL pendek membatasi data basi di proses lain,
+# perubahan lewat admin langsung menghapus entry di proses ini.
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", 4096)),
+    ttl=float(os.getenv("USER_CACHE_TTL", 30)),
+)
+
+def verification_token(user) -> str:
+    """
+    Token for the link in the verification mail, created when the mail is sent
+    so it is never stored.
+    """
+    return jwt.encode({"email": user["email"], "superuser": user["superuser"]}, JWT_SECRET, algorithm="HS256")
 
-def verify_password (plain_password : str, hashed_password : str):
-    return bcrypt.verify(plain_password, hashed_password)
 
 async def verify_user(email: EmailStr, password: str):
    # Cari pengguna berdasarkan email
@@ -31,7 +45,7 @@ async def verify_user(email: EmailStr, password: str):
         raise HTTPException(status_code=404, detail="User not found")
     
     # Jika password tidak cocok
-    if not verify_password(password, user["password"]):
+    if not await verify_password(password, user["password"]):
         raise HTTPException(status_code=401, detail="Incorrect password")
     
     # Jika akun belum diverifikasi
@@ -50,16 +64,49 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserResponseM
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
         email = payload.get("email")
-        user = await user_collection.find_one({"email": email})
+        user = user_cache.get(email)
+        if user is None:
+            generation = user_cache.generation
+            user = await user_collection.find_one({"email": email})
+            if user is not None and user_cache.generation == generation:
+                user_cache.set(email, user)
     except:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Invalid token'
         )
+
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Invalid token'
+        )
+
+    # Akun yang dinonaktifkan admin langsung kehilangan akses
+    if not user.get("active", False):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Your account is inactive. Please contact support to reactivate it."
+        )
     return user
 
 CurrentUser = Annotated[UserResponseModel, Depends(get_current_user)]
 
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[UserResponseModel]:
+    """
+    The signed-in user, or None for anonymous requests. An invalid or stale
+    token, or an inactive account, also falls back to anonymous so public
+    endpoints stay readable.
+    """
+    if token is None:
+        return None
+    try:
+        return await get_current_user(token)
+    except HTTPException:
+        return None
+
+OptionalUser = Annotated[Optional[UserResponseModel], Depends(get_optional_user)]
+
 async def get_current_super_user(current_user : CurrentUser) -> UserResponseModel:
     if current_user["superuser"] == False :
         raise HTTPException(
@@ -71,8 +118,17 @@ async def get_current_super_user(current_user : CurrentUser) -> UserResponseMode
 CurrentSuperUser = Annotated[UserResponseModel, Depends(get_current_super_user)]
 
 
-async def is_owner(id:str,user:CurrentUser) -> bool:
-    meal_obj = await meal_collection.find_one({"_id" : ObjectId(id)})
-    if meal_obj["author"] != user["email"] :
-        return False
-    return True
\ No newline at end of file
+async def ownership_error(id: str) -> HTTPException:
+    """
+    Error for a write filtered on `author` that matched nothing: 403 if the
+    meal exists (someone else's), 404 otherwise. Only runs on the failure path.
+    """
+    if await meal_collection.count_documents({"_id" : ObjectId(id)}, limit=1):
+        return HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="This meal don't belong to you"
+        )
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Meal {id} not found"
+    )
\ No newline at end of file
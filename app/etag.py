@@ -0,0 +1,95 @@
+import hashlib
+from datetime import datetime, timezone
+
+from fastapi import Request, Response, status
+from pymongo import UpdateOne
+
+from .database.config import counters_collection
+
+# Dinaikkan oleh setiap penulisan meal di meals.py dan admin.py
+CATALOGUE = "catalogue"
+
+
+def favourites_counter(user) -> str:
+    return f"favourites:{user['_id']}"
+
+
+def new_version(document: dict) -> dict:
+    """
+    Version fields for a newly inserted meal.
+    """
+    document["version"] = 1
+    document["updated_at"] = datetime.now(timezone.utc)
+    return document
+
+
+def versioned(update: dict) -> dict:
+    """
+    Add the `version` increment and `updated_at` timestamp to a meal update.
+    """
+    return {
+        **update,
+        "$inc": {**update.get("$inc", {}), "version": 1},
+        "$currentDate": {"updated_at": True},
+    }
+
+
+async def bump(*names: str):
+    """
+    Increment change counters, creating them on first use.
+    """
+    await counters_collection.bulk_write(
+        [UpdateOne({"_id": name}, {"$inc": {"seq": 1}}, upsert=True) for name in names],
+        ordered=False,
+    )
+
+
+async def read_counters(*names: str, collection=counters_collection, session=None) -> list[int]:
+    found = {
+        counter["_id"]: counter["seq"]
+        async for counter in collection.find({"_id": {"$in": list(names)}}, session=session)
+    }
+    return [found.get(name, 0) for name in names]
+
+
+def make_etag(*parts) -> str:
+    """
+    Strong ETag over the given version parts.
+    """
+    return '"' + hashlib.sha256(repr(parts).encode()).hexdigest()[:32] + '"'
+
+
+def meal_etag(meal: dict, favourited: bool) -> str:
+    return make_etag(str(meal["_id"]), meal.get("version", 0), favourited)
+
+
+async def page_etag(request: Request, user=None, collection=counters_collection, session=None) -> str:
+    """
+    ETag of a list page: the catalogue counter (and the user's favourites
+    counter) read before the documents, plus the query. A write in between
+    only makes the page newer than its ETag, never older. Pages read from
+    secondaries pass the catalogue counters and their `catalogue_session`.
+    """
+    names = [CATALOGUE]
+    if user is not None:
+        names.append(favourites_counter(user))
+    counters = await read_counters(*names, collection=collection, session=session)
+    user_id = str(user["_id"]) if user is not None else None
+    return make_etag(request.url.path, query_fingerprint(request), user_id, *counters)
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # If-None-Match memakai perbandingan lemah, prefix W/ diabaikan
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+def query_fingerprint(request: Request) -> str:
+    return "&".join(sorted(f"{key}={value}" for key, value in request.query_params.multi_items()))
@@ -0,0 +1,127 @@
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+import tempfile
+from pathlib import Path
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+
+load_dotenv()
+
+UPLOAD_DIR = Path("static/images")
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+UPLOAD_ROOT = UPLOAD_DIR.resolve()
+
+# File sementara di filesystem yang sama supaya os.replace atomic
+TMP_DIR = UPLOAD_DIR / ".tmp"
+TMP_DIR.mkdir(exist_ok=True)
+
+MAX_IMAGE_SIZE = int(os.getenv("MAX_IMAGE_SIZE", 5 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+
+# `<sha256>.<ext>` atau varian `<sha256>_w<width>.<ext>`
+CONTENT_ADDRESSED = re.compile(r"([0-9a-f]{64})(_w\d+)?(\.[A-Za-z0-9]+)?")
+
+
+def is_content_addressed(name: str) -> bool:
+    return CONTENT_ADDRESSED.fullmatch(name) is not None
+
+
+def is_original(name: str) -> bool:
+    """
+    True for an uploaded content-addressed image, False for its resized
+    variants and for names from before hashing.
+    """
+    match = CONTENT_ADDRESSED.fullmatch(name)
+    return match is not None and match.group(2) is None
+
+
+def image_path(name: str) -> Path:
+    """
+    Where the image `name` is stored: `ab/cd/abcd...` for content-addressed
+    names and their variants, directly in `UPLOAD_DIR` for files uploaded
+    before hashing.
+    """
+    match = CONTENT_ADDRESSED.fullmatch(name)
+    if match:
+        digest = match.group(1)
+        return UPLOAD_DIR / digest[:2] / digest[2:4] / name
+    return UPLOAD_DIR / name
+
+
+def stat_image(name: str):
+    """
+    `os.stat` of the stored image `name`, or None when it does not exist, is
+    not a regular file or resolves outside `UPLOAD_DIR` (`..`, symlinks).
+    """
+    path = image_path(name)
+    try:
+        if not path.resolve(strict=True).is_relative_to(UPLOAD_ROOT):
+            return None
+        stat_result = path.stat()
+    except (OSError, ValueError):
+        return None
+    return stat_result if stat.S_ISREG(stat_result.st_mode) else None
+
+
+class StagedImage:
+    """
+    An upload written to a temporary file, named by its SHA-256 hash.
+    `commit` moves it into place, `discard` removes it.
+    """
+
+    def __init__(self, temp_path: Path, name: str):
+        self.temp_path = temp_path
+        self.name = name
+
+    def commit(self):
+        path = image_path(self.name)
+        if path.exists():
+            # Gambar yang sama sudah tersimpan
+            self.discard()
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.temp_path, path)
+
+    def discard(self):
+        self.temp_path.unlink(missing_ok=True)
+
+
+async def stage_image(file: UploadFile, max_size: int = MAX_IMAGE_SIZE) -> StagedImage:
+    """
+    Copy an upload chunk by chunk into a temporary file, hashing it on the way.
+    Disk writes run in the threadpool so the event loop is never blocked.
+    Raises 413 once more than `max_size` bytes are read.
+    """
+    if file.size is not None and file.size > max_size:
+        raise image_too_large(max_size)
+
+    fd, temp_name = tempfile.mkstemp(dir=TMP_DIR)
+    temp_path = Path(temp_name)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise image_too_large(max_size)
+                digest.update(chunk)
+                await run_in_threadpool(buffer.write, chunk)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    extension = mimetypes.guess_extension(file.content_type or "") or ""
+    return StagedImage(temp_path, digest.hexdigest() + extension)
+
+
+def image_too_large(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Image larger than {max_size} bytes"
+    )
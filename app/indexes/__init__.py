@@ -0,0 +1,115 @@
+"""
+Per-process, in-memory indexes over the meal catalogue.
+
+They are built from the `meals` collection at startup and kept in sync by the
+write paths through `meal_saved` / `meal_deleted`.
+"""
+import os
+from typing import NamedTuple, Optional
+
+from dotenv import load_dotenv
+
+from ..cache import TTLCache
+from .facets import FacetIndex
+from .pantry import PantryIndex
+from .search import InvertedIndex, meal_tokens, prefix_match, tokenize
+from .trigram import TrigramIndex, meal_words
+
+load_dotenv()
+
+INDEX_PROJECTION = {
+    "name": 1,
+    "category": 1,
+    "area": 1,
+    "ingredients.name": 1,
+    "verification_status": 1,
+}
+
+search_index = InvertedIndex()
+pantry_index = PantryIndex()
+fuzzy_index = TrigramIndex()
+facet_index = FacetIndex()
+
+# Hasil pencarian GET /meals, key dari `search_key`
+search_cache = TTLCache(
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", 1024)),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", 60)),
+)
+
+
+class SearchKey(NamedTuple):
+    keywords: tuple
+    fuzzy: bool
+    limit: int
+    cursor: Optional[str]
+    category: Optional[str]
+    area: Optional[str]
+    view: str
+
+
+def search_key(search: str, fuzzy: bool, limit: int, cursor: str = None, category: str = None, area: str = None, view: str = "full") -> SearchKey:
+    """
+    Cache key of a search: keywords are lowercased and sorted since every
+    keyword has to match regardless of order.
+    """
+    return SearchKey(tuple(sorted(tokenize(search))), fuzzy, limit, cursor, category, area, view)
+
+
+def invalidate_searches(meal_id: str, meal: dict = None):
+    """
+    Drop the cached searches that the meal matched before this write, or
+    matches after it.
+    """
+    before_tokens = search_index.doc_terms.get(meal_id, ())
+    before_words = fuzzy_index.meal_words.get(meal_id, ())
+    before_facets = facet_index.meal_facets.get(meal_id)
+    after_tokens, after_words, after_facets = (), (), None
+    if meal is not None and meal.get("verification_status") == "approved":
+        after_tokens = set(meal_tokens(meal))
+        after_words = meal_words(meal)
+        after_facets = (meal.get("category", ""), meal.get("area", ""))
+    if not before_tokens and not after_tokens:
+        return
+
+    def matches(key, tokens, words, facets):
+        if facets is None:
+            return False
+        if key.category is not None and facets[0] != key.category:
+            return False
+        if key.area is not None and facets[1] != key.area:
+            return False
+        if key.fuzzy:
+            return fuzzy_index.matches(key.keywords, words)
+        return prefix_match(key.keywords, tokens)
+
+    def affected(key, value):
+        return (
+            matches(key, before_tokens, before_words, before_facets)
+            or matches(key, after_tokens, after_words, after_facets)
+        )
+
+    search_cache.invalidate(affected)
+
+
+def meal_saved(meal: dict):
+    """
+    Call after a meal is created or updated, with the stored document.
+    """
+    invalidate_searches(str(meal["_id"]), meal)
+    search_index.upsert(meal)
+    pantry_index.upsert(meal)
+    fuzzy_index.upsert(meal)
+    facet_index.upsert(meal)
+
+
+def meal_deleted(meal_id):
+    invalidate_searches(str(meal_id))
+    search_index.remove(str(meal_id))
+    pantry_index.remove(str(meal_id))
+    fuzzy_index.remove(str(meal_id))
+    facet_index.remove(str(meal_id))
+
+
+async def build_indexes(collection):
+    async for meal in collection.find({"verification_status": "approved"}, INDEX_PROJECTION):
+        meal_saved(meal)
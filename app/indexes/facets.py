@@ -0,0 +1,80 @@
+from collections import Counter
+
+
+class FacetIndex:
+    """
+    Category and area of every approved meal, with counts per
+    `(category, area)` pair kept up to date on writes.
+    """
+
+    def __init__(self):
+        self.meal_facets: dict[str, tuple[str, str]] = {}
+        self.categories: dict[str, set[str]] = {}
+        self.areas: dict[str, set[str]] = {}
+        self.pairs: Counter = Counter()
+
+    def __len__(self):
+        return len(self.meal_facets)
+
+    def upsert(self, meal: dict):
+        meal_id = str(meal["_id"])
+        self.remove(meal_id)
+        if meal.get("verification_status") != "approved":
+            return
+
+        category, area = meal.get("category", ""), meal.get("area", "")
+        self.meal_facets[meal_id] = (category, area)
+        self.categories.setdefault(category, set()).add(meal_id)
+        self.areas.setdefault(area, set()).add(meal_id)
+        self.pairs[category, area] += 1
+
+    def remove(self, meal_id: str):
+        facets = self.meal_facets.pop(meal_id, None)
+        if facets is None:
+            return
+
+        category, area = facets
+        for values, value in ((self.categories, category), (self.areas, area)):
+            values[value].discard(meal_id)
+            if not values[value]:
+                del values[value]
+        self.pairs[facets] -= 1
+        if not self.pairs[facets]:
+            del self.pairs[facets]
+
+    def allows(self, meal_id: str, category: str = None, area: str = None) -> bool:
+        facets = self.meal_facets.get(meal_id)
+        if facets is None:
+            return False
+        return (category is None or facets[0] == category) and (area is None or facets[1] == area)
+
+    def ids(self, category: str = None, area: str = None):
+        """
+        Ids of the meals in `category` and `area`, or None when unfiltered.
+        """
+        if category is None and area is None:
+            return None
+        if category is None:
+            return self.areas.get(area, set())
+        if area is None:
+            return self.categories.get(category, set())
+        return self.categories.get(category, set()) & self.areas.get(area, set())
+
+    def counts(self, category: str = None, area: str = None, ids=None) -> dict:
+        """
+        Meal counts per category under the `area` filter and per area under
+        the `category` filter. `ids` restricts the counts to a result set,
+        e.g. the matches of a search.
+        """
+        if ids is None:
+            pairs = self.pairs
+        else:
+            pairs = Counter(self.meal_facets[meal_id] for meal_id in ids if meal_id in self.meal_facets)
+
+        categories, areas = Counter(), Counter()
+        for (meal_category, meal_area), count in pairs.items():
+            if area is None or meal_area == area:
+                categories[meal_category] += count
+            if category is None or meal_category == category:
+                areas[meal_area] += count
+        return {"category": dict(categories.most_common()), "area": dict(areas.most_common())}
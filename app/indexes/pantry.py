@@ -0,0 +1,106 @@
+from bisect import bisect_right
+
+from .search import ingredient_names
+
+
+def normalize(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+class PantryIndex:
+    """
+    Ingredient vocabulary plus one bitset per approved meal.
+
+    Bit `i` of a meal's bitset is set when the meal uses `names[i]`, so the
+    ingredients a pantry is missing for a meal are `meal & ~pantry` and
+    counting them is a popcount.
+    """
+
+    def __init__(self):
+        self.vocabulary: dict[str, int] = {}
+        self.names: list[str] = []
+        self.meal_bits: dict[str, int] = {}
+        self.postings: dict[int, set[str]] = {}
+
+    def __len__(self):
+        return len(self.meal_bits)
+
+    def bit(self, name: str) -> int:
+        index = self.vocabulary.get(name)
+        if index is None:
+            index = self.vocabulary[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+    def upsert(self, meal: dict):
+        meal_id = str(meal["_id"])
+        self.remove(meal_id)
+        if meal.get("verification_status") != "approved":
+            return
+
+        bits = 0
+        for ingredient in ingredient_names(meal):
+            name = normalize(ingredient)
+            if name:
+                bits |= 1 << self.bit(name)
+        if not bits:
+            return
+
+        self.meal_bits[meal_id] = bits
+        for index in iter_bits(bits):
+            self.postings.setdefault(index, set()).add(meal_id)
+
+    def remove(self, meal_id: str):
+        bits = self.meal_bits.pop(meal_id, None)
+        if bits is None:
+            return
+
+        for index in iter_bits(bits):
+            self.postings[index].discard(meal_id)
+
+    def match(self, pantry: list[str], max_missing: int = 2, after: tuple = None) -> list[tuple[int, int, str]]:
+        """
+        Rank meals sharing at least one ingredient with `pantry`.
+
+        Returns `(missing, -matched, meal_id)` tuples for meals missing at most
+        `max_missing` ingredients, full matches first. `after` is the last
+        tuple of the previous page.
+        """
+        pantry_bits = self.pantry_bits(pantry)
+        candidates = set()
+        for index in iter_bits(pantry_bits):
+            candidates.update(self.postings[index])
+
+        results = []
+        for meal_id in candidates:
+            bits = self.meal_bits[meal_id]
+            missing = (bits & ~pantry_bits).bit_count()
+            if missing <= max_missing:
+                results.append((missing, -(bits & pantry_bits).bit_count(), meal_id))
+
+        results.sort()
+        if after is not None:
+            results = results[bisect_right(results, after):]
+        return results
+
+    def pantry_bits(self, pantry: list[str]) -> int:
+        bits = 0
+        for name in pantry:
+            index = self.vocabulary.get(normalize(name))
+            if index is not None:
+                bits |= 1 << index
+        return bits
+
+    def missing(self, meal_id: str, pantry: list[str]) -> list[str]:
+        """
+        Ingredient names of `meal_id` that are not in `pantry`.
+        """
+        bits = self.meal_bits.get(meal_id, 0) & ~self.pantry_bits(pantry)
+        return [self.names[index] for index in iter_bits(bits)]
+
+
+def iter_bits(bits: int):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
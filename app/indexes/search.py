@@ -0,0 +1,355 @@
+import heapq
+import math
+import re
+from bisect import bisect_left, insort
+from collections import Counter
+
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def ingredient_names(meal: dict) -> list[str]:
+    """
+    Ingredient names of a meal. Older documents may hold ingredients that are
+    not `{name, measure}` objects; those are skipped.
+    """
+    return [
+        ingredient["name"]
+        for ingredient in meal.get("ingredients") or []
+        if isinstance(ingredient, dict) and isinstance(ingredient.get("name"), str)
+    ]
+
+
+def meal_tokens(meal: dict) -> list[str]:
+    """
+    Tokens indexed for a meal: name, area, category and ingredient names.
+    """
+    tokens = tokenize(meal.get("name", ""))
+    tokens += tokenize(meal.get("area", ""))
+    tokens += tokenize(meal.get("category", ""))
+    for name in ingredient_names(meal):
+        tokens += tokenize(name)
+    return tokens
+
+
+def prefix_match(keywords, tokens) -> bool:
+    """
+    True when every keyword is a prefix of one of `tokens`.
+    """
+    return all(any(token.startswith(keyword) for token in tokens) for keyword in keywords)
+
+
+def rank_key(item: tuple[float, str]):
+    score, meal_id = item
+    return -score, meal_id
+
+
+def top_results(scores: dict[str, float], limit: int = None, after: tuple[float, str] = None) -> list[tuple[float, str]]:
+    """
+    Best `limit` `(score, meal_id)` pairs ranked below `after`.
+    """
+    results = ((score, meal_id) for meal_id, score in scores.items())
+    if after is not None:
+        bound = rank_key(after)
+        results = (item for item in results if rank_key(item) > bound)
+    if limit is None:
+        return sorted(results, key=rank_key)
+    return heapq.nsmallest(limit, results, key=rank_key)
+
+
+# Bobot posting dihitung ulang semua bila rata-rata panjang dokumen bergeser lebih dari ini
+AVERAGE_DRIFT = 0.01
+# Query dengan lebih banyak term dari ini (prefix sangat pendek) dinilai tanpa pruning
+MAX_PRUNED_TERMS = 32
+
+
+class Descending:
+    """
+    Wrapper that reverses ordering, so a min-heap of `(score, Descending(id))`
+    pops the worst result of `rank_key` order first.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class TermImpacts:
+    """
+    Postings of one term with their precomputed BM25 term-frequency weight,
+    kept as `(-weight, meal_id)` pairs in rank order. The idf factor is the
+    same for the whole term and is applied per query.
+    """
+
+    __slots__ = ("ranked", "weights")
+
+    def __init__(self, weights: dict[str, float]):
+        self.weights = weights
+        self.ranked = sorted((-weight, meal_id) for meal_id, weight in weights.items())
+
+    def add(self, meal_id: str, weight: float):
+        self.weights[meal_id] = weight
+        insort(self.ranked, (-weight, meal_id))
+
+    def remove(self, meal_id: str):
+        weight = self.weights.pop(meal_id)
+        del self.ranked[bisect_left(self.ranked, (-weight, meal_id))]
+
+
+class InvertedIndex:
+    """
+    Tokenized inverted index over approved meals, ranked with BM25.
+
+    Every keyword of a query must match (AND), a keyword matches any indexed
+    term it is a prefix of, so "chick" still finds "chicken" like the old
+    `$regex` search did.
+
+    Per-posting weights are built the first time a term is searched and kept
+    up to date by `upsert` / `remove`. A page is found with the threshold
+    algorithm: postings are read best first and scanning stops once no unread
+    meal can outrank the current top `limit`, so the cost follows the page
+    size rather than the number of matches.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, dict[str, int]] = {}
+        self.terms: list[str] = []
+        self.doc_terms: dict[str, Counter] = {}
+        self.doc_length: dict[str, int] = {}
+        self.total_length = 0
+        # Rata-rata panjang dokumen yang dipakai untuk bobot di `impacts`
+        self.average_length: float = None
+        self.impacts: dict[str, TermImpacts] = {}
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def upsert(self, meal: dict):
+        meal_id = str(meal["_id"])
+        self.remove(meal_id)
+        if meal.get("verification_status") != "approved":
+            return
+
+        counts = Counter(meal_tokens(meal))
+        self.doc_terms[meal_id] = counts
+        self.doc_length[meal_id] = sum(counts.values())
+        self.total_length += self.doc_length[meal_id]
+        self.refresh_average()
+        for term, tf in counts.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                insort(self.terms, term)
+            posting[meal_id] = tf
+            impacts = self.impacts.get(term)
+            if impacts is not None:
+                impacts.add(meal_id, self.tf_weight(tf, self.doc_length[meal_id]))
+
+    def remove(self, meal_id: str):
+        counts = self.doc_terms.pop(meal_id, None)
+        if counts is None:
+            return
+
+        self.total_length -= self.doc_length.pop(meal_id)
+        for term in counts:
+            posting = self.postings[term]
+            del posting[meal_id]
+            impacts = self.impacts.get(term)
+            if impacts is not None:
+                impacts.remove(meal_id)
+            if not posting:
+                del self.postings[term]
+                del self.terms[bisect_left(self.terms, term)]
+                self.impacts.pop(term, None)
+        self.refresh_average()
+
+    def refresh_average(self):
+        """
+        Drop every cached weight once the average document length has moved
+        by more than `AVERAGE_DRIFT`, so weights stay close to exact BM25.
+        """
+        if not self.doc_terms:
+            self.average_length = None
+            self.impacts.clear()
+            return
+        average = self.total_length / len(self.doc_terms)
+        if self.average_length is None or abs(average - self.average_length) > AVERAGE_DRIFT * self.average_length:
+            self.average_length = average
+            self.impacts.clear()
+
+    def tf_weight(self, tf: int, length: int) -> float:
+        norm = self.k1 * (1 - self.b + self.b * length / self.average_length)
+        return tf * (self.k1 + 1) / (tf + norm)
+
+    def term_impacts(self, term: str) -> TermImpacts:
+        impacts = self.impacts.get(term)
+        if impacts is None:
+            doc_length = self.doc_length
+            impacts = self.impacts[term] = TermImpacts({
+                meal_id: self.tf_weight(tf, doc_length[meal_id]) for meal_id, tf in self.postings[term].items()
+            })
+        return impacts
+
+    def idf(self, term: str) -> float:
+        n, df = len(self.doc_terms), len(self.postings[term])
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def expand(self, keyword: str) -> list[str]:
+        """
+        Indexed terms that start with `keyword`.
+        """
+        index = bisect_left(self.terms, keyword)
+        expanded = []
+        while index < len(self.terms) and self.terms[index].startswith(keyword):
+            expanded.append(self.terms[index])
+            index += 1
+        return expanded
+
+    def search(self, search: str, limit: int = None, after: tuple[float, str] = None, only: set[str] = None) -> list[tuple[float, str]]:
+        """
+        Return up to `limit` `(score, meal_id)` pairs matching every keyword,
+        best first.
+
+        `after` is the last pair of the previous page; only results ranked
+        below it are returned. `only` restricts the results to those ids.
+        """
+        keywords = tokenize(search)
+        if not keywords:
+            return []
+
+        groups = [self.expand(keyword) for keyword in keywords]
+        if not all(groups):
+            return []
+
+        # Kata kunci dengan posting paling sedikit dulu: meal yang tidak cocok cepat ditolak `score`
+        groups.sort(key=lambda terms: sum(len(self.postings[term]) for term in terms))
+        smallest = sum(len(self.postings[term]) for term in groups[0])
+
+        self.refresh_average()
+        # Satu list per term: (idf, impacts, nomor grup kata kunci), urut per grup
+        lists = [
+            (self.idf(term), self.term_impacts(term), group)
+            for group, terms in enumerate(groups) for term in terms
+        ]
+        if limit is None or len(lists) > MAX_PRUNED_TERMS or (only is not None and len(only) <= smallest):
+            return self.score_all(lists, limit, after, only)
+        return self.top_k(lists, len(groups), limit, after, only)
+
+    @staticmethod
+    def score(lists, meal_id: str):
+        """
+        BM25 score of `meal_id`, or None unless it matches every keyword.
+        Summed in list order, the same order `upper_bound` sums in.
+        """
+        total = 0.0
+        current, matched = 0, False
+        for idf, impacts, group in lists:
+            if group != current:
+                if not matched:
+                    return None
+                current, matched = group, False
+            weight = impacts.weights.get(meal_id)
+            if weight is not None:
+                total += idf * weight
+                matched = True
+        return total if matched else None
+
+    def score_all(self, lists, limit: int = None, after: tuple[float, str] = None, only: set[str] = None):
+        # Kandidat dari `only` atau dari kata kunci dengan posting paling sedikit (grup 0)
+        if only is None:
+            candidates = set()
+            for _, impacts, group in lists:
+                if group == 0:
+                    candidates.update(impacts.weights)
+        else:
+            candidates = only
+
+        scores = {}
+        for meal_id in candidates:
+            total = self.score(lists, meal_id)
+            if total is not None:
+                scores[meal_id] = total
+        return top_results(scores, limit, after)
+
+    def top_k(self, lists, group_count: int, limit: int, after: tuple[float, str] = None, only: set[str] = None):
+        positions = [0] * len(lists)
+        # Jumlah list per grup yang belum habis dibaca
+        open_lists = Counter(group for _, _, group in lists)
+        heap = [(impacts.ranked[0][0] * idf, index) for index, (idf, impacts, _) in enumerate(lists)]
+        heapq.heapify(heap)
+        bound_after = rank_key(after) if after is not None else None
+
+        best = []  # min-heap (score, Descending(meal_id)): hasil terburuk di depan
+        seen = set()
+        bound = None
+        while heap:
+            _, index = heapq.heappop(heap)
+            idf, impacts, group = lists[index]
+            weight, meal_id = impacts.ranked[positions[index]]
+            positions[index] += 1
+            finished = False
+            if positions[index] < len(impacts.ranked):
+                following = impacts.ranked[positions[index]][0]
+                heapq.heappush(heap, (following * idf, index))
+                # Bobot banyak yang sama; batas atas hanya berubah saat bobot di posisi baca berubah
+                if following != weight:
+                    bound = None
+            else:
+                open_lists[group] -= 1
+                # Meal yang belum terbaca harus ada di list setiap grup
+                finished = open_lists[group] == 0
+                bound = None
+
+            if meal_id not in seen:
+                seen.add(meal_id)
+                total = None if only is not None and meal_id not in only else self.score(lists, meal_id)
+                if total is not None and (bound_after is None or (-total, meal_id) > bound_after):
+                    item = (total, Descending(meal_id))
+                    if len(best) < limit:
+                        heapq.heappush(best, item)
+                    elif best[0] < item:
+                        heapq.heapreplace(best, item)
+
+            if finished:
+                break
+            if len(best) == limit:
+                if bound is None:
+                    bound = self.upper_bound(lists, positions)
+                worst_score, worst_id = best[0]
+                # Seri dengan batas atas: meal yang belum terbaca ada sesudah posisi baca dalam urutan id
+                if worst_score > bound or (worst_score == bound and worst_id.value <= self.last_read_id(lists, positions)):
+                    break
+
+        return sorted(((score, meal_id.value) for score, meal_id in best), key=rank_key)
+
+    @staticmethod
+    def upper_bound(lists, positions) -> float:
+        """
+        Highest score a meal not read yet can have: the sum of the weights at
+        the read positions, in the same order `score` sums in.
+        """
+        bound = 0.0
+        for (idf, impacts, _), position in zip(lists, positions):
+            if position < len(impacts.ranked):
+                bound += idf * -impacts.ranked[position][0]
+        return bound
+
+    @staticmethod
+    def last_read_id(lists, positions) -> str:
+        return max(
+            (impacts.ranked[position][1] for (_, impacts, _), position in zip(lists, positions) if position < len(impacts.ranked)),
+            default="",
+        )
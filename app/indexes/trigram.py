@@ -0,0 +1,130 @@
+from .search import ingredient_names, tokenize, top_results
+
+
+def trigrams(word: str) -> set[str]:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def meal_words(meal: dict) -> set[str]:
+    words = set(tokenize(meal.get("name", "")))
+    for name in ingredient_names(meal):
+        words.update(tokenize(name))
+    return words
+
+
+class TrigramIndex:
+    """
+    Character-trigram index over the words of approved meal names and
+    ingredient names, for typo-tolerant search.
+
+    A keyword matches a word when their trigram sets have a Jaccard similarity
+    of at least `threshold`. Only words sharing a trigram with the keyword are
+    looked at, never the whole catalogue.
+    """
+
+    def __init__(self, threshold: float = 0.3):
+        self.threshold = threshold
+        self.grams: dict[str, set[str]] = {}
+        self.word_grams: dict[str, int] = {}
+        self.word_meals: dict[str, set[str]] = {}
+        self.meal_words: dict[str, set[str]] = {}
+
+    def __len__(self):
+        return len(self.meal_words)
+
+    def upsert(self, meal: dict):
+        meal_id = str(meal["_id"])
+        self.remove(meal_id)
+        if meal.get("verification_status") != "approved":
+            return
+
+        words = meal_words(meal)
+        self.meal_words[meal_id] = words
+        for word in words:
+            meals = self.word_meals.get(word)
+            if meals is None:
+                meals = self.word_meals[word] = set()
+                grams = trigrams(word)
+                self.word_grams[word] = len(grams)
+                for gram in grams:
+                    self.grams.setdefault(gram, set()).add(word)
+            meals.add(meal_id)
+
+    def remove(self, meal_id: str):
+        words = self.meal_words.pop(meal_id, None)
+        if words is None:
+            return
+
+        for word in words:
+            meals = self.word_meals[word]
+            meals.discard(meal_id)
+            if not meals:
+                del self.word_meals[word]
+                del self.word_grams[word]
+                for gram in trigrams(word):
+                    self.grams[gram].discard(word)
+                    if not self.grams[gram]:
+                        del self.grams[gram]
+
+    def similar(self, keyword: str) -> dict[str, float]:
+        """
+        Indexed words similar to `keyword`, with their similarity.
+        """
+        grams = trigrams(keyword)
+        shared: dict[str, int] = {}
+        for gram in grams:
+            for word in self.grams.get(gram, ()):
+                shared[word] = shared.get(word, 0) + 1
+
+        matches = {}
+        for word, count in shared.items():
+            similarity = count / (len(grams) + self.word_grams[word] - count)
+            if similarity >= self.threshold:
+                matches[word] = similarity
+        return matches
+
+    def matches(self, keywords, words) -> bool:
+        """
+        True when every keyword is similar to one of `words`.
+        """
+        for keyword in keywords:
+            grams = trigrams(keyword)
+            for word in words:
+                word_grams = trigrams(word)
+                shared = len(grams & word_grams)
+                if shared / (len(grams) + len(word_grams) - shared) >= self.threshold:
+                    break
+            else:
+                return False
+        return True
+
+    def search(self, search: str, limit: int = None, after: tuple[float, str] = None, only: set[str] = None) -> list[tuple[float, str]]:
+        """
+        Return up to `limit` `(score, meal_id)` pairs with a word similar to
+        every keyword, best first. The score adds up the best similarity per
+        keyword. `only` restricts the results to those ids.
+        """
+        keywords = tokenize(search)
+        if not keywords:
+            return []
+
+        scores = None if only is None else dict.fromkeys(only, 0.0)
+        for keyword in keywords:
+            best: dict[str, float] = {}
+            for word, similarity in self.similar(keyword).items():
+                for meal_id in self.word_meals[word]:
+                    if similarity > best.get(meal_id, 0.0):
+                        best[meal_id] = similarity
+
+            if scores is None:
+                scores = best
+            else:
+                scores = {
+                    meal_id: score + best[meal_id]
+                    for meal_id, score in scores.items() if meal_id in best
+                }
+            if not scores:
+                return []
+
+        return top_results(scores, limit, after)
@@ -1,7 +1,14 @@
+import asyncio
+import random
+import time
+from email.message import EmailMessage
+from email.utils import formataddr
+
 from dotenv import load_dotenv
 import os
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
+import aiosmtplib
+from fastapi_mail import ConnectionConfig
 from pydantic import EmailStr
 
 load_dotenv()
@@ -12,32 +19,222 @@ conf = ConnectionConfig(
     MAIL_USERNAME=os.getenv('MAIL_USERNAME'),  # Ganti dengan email Anda
     MAIL_PASSWORD=os.getenv('MAIL_PASSWORD'),  # Gunakan password akun atau App Password
     MAIL_FROM=os.getenv('MAIL_FROM'),     # Sama dengan MAIL_USERNAME
-    MAIL_PORT=587,                        # Port SMTP Gmail
-    MAIL_SERVER="smtp.gmail.com",         # Server SMTP Gmail
+    MAIL_PORT=int(os.getenv('MAIL_PORT', 587)),                # Port SMTP Gmail
+    MAIL_SERVER=os.getenv('MAIL_SERVER', "smtp.gmail.com"),    # Server SMTP Gmail
     MAIL_FROM_NAME="Auxesia",             # Nama pengirim
-    MAIL_STARTTLS=True,                   # Harus True untuk Gmail
+    MAIL_STARTTLS=os.getenv('MAIL_STARTTLS', 'true').lower() == 'true',   # Harus True untuk Gmail
     MAIL_SSL_TLS=False,                   # Jangan gunakan SSL/TLS
-    USE_CREDENTIALS=True,                 # Autentikasi diperlukan
+    USE_CREDENTIALS=os.getenv('MAIL_USE_CREDENTIALS', 'true').lower() == 'true',  # Autentikasi diperlukan
     VALIDATE_CERTS=True                   # Validasi sertifikat
 )
 
 
-FM = FastMail(conf)
-
-async def VerifyEmail(email : EmailStr, token : str) :
+def verification_message(email : EmailStr, token : str) -> EmailMessage:
     html = f"""<p>Hi, this is a test mail. Thanks for using FastAPI-Mail. Verify your email:</p><br>
-            <a href="{DOMAIN}/auth/verifyemail?token={token}" 
+            <a href="{DOMAIN}/auth/verifyemail?token={token}"
             style="display: inline-block; background-color: green; color: white; padding: 10px 20px; border: none; border-radius: 5px; font-size: 16px; text-decoration: none; cursor: pointer;">
             Verify
             </a>"""
 
+    message = EmailMessage()
+    message["Subject"] = "Auxesia Email Verification"
+    message["From"] = formataddr((conf.MAIL_FROM_NAME, conf.MAIL_FROM))
+    message["To"] = email
+    message.set_content(html, subtype="html")
+    return message
+
+
+def smtp_client(config: ConnectionConfig) -> aiosmtplib.SMTP:
+    return aiosmtplib.SMTP(
+        hostname=config.MAIL_SERVER,
+        port=config.MAIL_PORT,
+        username=config.MAIL_USERNAME if config.USE_CREDENTIALS else None,
+        password=config.MAIL_PASSWORD.get_secret_value() if config.USE_CREDENTIALS else None,
+        use_tls=config.MAIL_SSL_TLS,
+        start_tls=config.MAIL_STARTTLS,
+        validate_certs=config.VALIDATE_CERTS,
+        timeout=config.TIMEOUT,
+    )
+
+
+def permanent_failure(error: Exception) -> bool:
+    # Penerima ditolak atau error 5xx: percuma dikirim ulang
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return True
+    return (
+        isinstance(error, aiosmtplib.SMTPResponseException)
+        and not isinstance(error, aiosmtplib.SMTPServerDisconnected)
+        and error.code >= 500
+    )
+
+
+class MailDispatcher:
+    """
+    Sends queued messages over a small pool of persistent SMTP connections.
+
+    Each of the `size` workers keeps one connection open and drains up to
+    `batch_size` messages per wake-up. Failed messages are retried with
+    exponential backoff up to `max_attempts` times. `submit` waits while
+    `queue_limit` messages are already queued and returns a future that
+    resolves once the message is sent or has finally failed. `cancel` drops
+    a message that is not being sent yet.
+    """
+
+    def __init__(self, config: ConnectionConfig, size: int, queue_limit: int, batch_size: int,
+                 max_attempts: int, backoff: float, idle_timeout: float):
+        self.config = config
+        self.size = size
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_limit)
+        self.workers: list[asyncio.Task] = []
+        self.retries: set[asyncio.Task] = set()
+        # Future pesan yang sedang dikirim ke server SMTP
+        self.sending: set[asyncio.Future] = set()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.batches = 0
+        self.connections = 0
+        self.send_time = 0.0
+
+    async def submit(self, message: EmailMessage, max_attempts: int = None) -> asyncio.Future:
+        """
+        Queue `message`. `max_attempts` overrides the dispatcher default, e.g.
+        1 for callers that retry on their own.
+        """
+        result = asyncio.get_running_loop().create_future()
+        await self.queue.put((message, 1, max_attempts or self.max_attempts, result))
+        return result
+
+    def cancel(self, result: asyncio.Future) -> bool:
+        """
+        Cancel a submitted message unless it is being sent right now. True
+        when the message will not go out.
+        """
+        if result in self.sending:
+            return False
+        return result.cancel()
+
+    def start(self):
+        if not self.workers:
+            self.workers = [asyncio.create_task(self.work()) for _ in range(self.size)]
 
-    message = MessageSchema(
-        subject="Auxesia Email Verification",
-        recipients=[email],
-        body=html,
-        subtype=MessageType.html)
+    async def stop(self, timeout: float = 10):
+        """
+        Give queued messages `timeout` seconds to go out, then stop the workers.
+        """
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Mail dispatcher stopped with {self.queue.qsize()} messages unsent")
+        for task in [*self.workers, *self.retries]:
+            task.cancel()
+        await asyncio.gather(*self.workers, *self.retries, return_exceptions=True)
+        self.workers = []
+
+    async def work(self):
+        smtp = smtp_client(self.config)
+        try:
+            while True:
+                batch = await self.next_batch(smtp)
+                try:
+                    await self.send_batch(smtp, batch)
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+        finally:
+            if smtp.is_connected:
+                smtp.close()
+
+    async def next_batch(self, smtp: aiosmtplib.SMTP) -> list:
+        try:
+            first = await asyncio.wait_for(self.queue.get(), self.idle_timeout)
+        except asyncio.TimeoutError:
+            # Koneksi yang menganggur terlalu lama ditutup, dibuka lagi saat ada pesan
+            if smtp.is_connected:
+                await self.quit(smtp)
+            first = await self.queue.get()
+
+        batch = [first]
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def send_batch(self, smtp: aiosmtplib.SMTP, batch: list):
+        self.batches += 1
+        for message, attempt, max_attempts, result in batch:
+            if result.cancelled():
+                continue
+            self.sending.add(result)
+            try:
+                if not smtp.is_connected:
+                    await smtp.connect()
+                    self.connections += 1
+                start = time.perf_counter()
+                await smtp.send_message(message)
+                self.send_time += time.perf_counter() - start
+                self.sent += 1
+                if not result.done():
+                    result.set_result(None)
+            except Exception as e:
+                if smtp.is_connected and not isinstance(e, aiosmtplib.SMTPResponseException):
+                    smtp.close()
+                self.retry_later(message, attempt, max_attempts, result, e)
+            finally:
+                self.sending.discard(result)
+
+    def retry_later(self, message: EmailMessage, attempt: int, max_attempts: int, result: asyncio.Future, error: Exception):
+        if result.cancelled():
+            return
+        if attempt >= max_attempts or permanent_failure(error):
+            self.failed += 1
+            print(f"Mail to {message['To']} failed after {attempt} attempts: {error}")
+            if not result.done():
+                result.set_exception(error)
+            return
+
+        self.retried += 1
+        delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+
+        async def requeue():
+            await asyncio.sleep(delay)
+            await self.queue.put((message, attempt + 1, max_attempts, result))
+
+        task = asyncio.create_task(requeue())
+        self.retries.add(task)
+        task.add_done_callback(self.retries.discard)
+
+    async def quit(self, smtp: aiosmtplib.SMTP):
+        try:
+            await smtp.quit()
+        except aiosmtplib.SMTPException:
+            smtp.close()
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self.workers),
+            "queued": self.queue.qsize(),
+            "queue_limit": self.queue.maxsize,
+            "waiting_retry": len(self.retries),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "batches": self.batches,
+            "connections": self.connections,
+            "avg_send_ms": round(self.send_time / self.sent * 1000, 2) if self.sent else None,
+        }
+
+
+mail_dispatcher = MailDispatcher(
+    conf,
+    size=int(os.getenv("MAIL_POOL_SIZE", 2)),
+    queue_limit=int(os.getenv("MAIL_QUEUE_LIMIT", 1000)),
+    batch_size=int(os.getenv("MAIL_BATCH_SIZE", 20)),
+    max_attempts=int(os.getenv("MAIL_MAX_ATTEMPTS", 5)),
+    backoff=float(os.getenv("MAIL_RETRY_BACKOFF", 2)),
+    idle_timeout=float(os.getenv("MAIL_IDLE_TIMEOUT", 60)),
+)
 
-    print(f"{DOMAIN}/auth/verifyemail?token={token}")
-    await FM.send_message(message)
-    return "Verification mail has been sent"
\ No newline at end of file
@@ -1,7 +1,18 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.security import OAuth2PasswordBearer
 
 from .routers import meals, static, users, admin, auth
+from .database.config import mongo, meal_collection, user_collection, favourites_collection, stats_collection, ensure_indexes
+from .indexes import build_indexes
+from .mail import mail_dispatcher
+from .outbox import outbox
+from .passwords import password_pool
+from .popularity import run_popularity_jobs
+from .stats import run_stats_jobs
+from .thumbnails import thumbnails
 
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi.middleware.cors import CORSMiddleware
@@ -10,7 +21,33 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    mongo.connect()
+    await ensure_indexes()
+    await build_indexes(meal_collection)
+    popularity_jobs = asyncio.create_task(run_popularity_jobs(meal_collection))
+    stats_jobs = asyncio.create_task(
+        run_stats_jobs(stats_collection, user_collection, meal_collection, favourites_collection)
+    )
+    mail_dispatcher.start()
+    outbox_workers = asyncio.create_task(outbox.run())
+    yield
+    # Record yang sedang dikirim tetap ter-lease dan diambil lagi setelah restart
+    outbox_workers.cancel()
+    await asyncio.gather(outbox_workers, return_exceptions=True)
+    await mail_dispatcher.stop()
+    popularity_jobs.cancel()
+    stats_jobs.cancel()
+    await asyncio.gather(popularity_jobs, stats_jobs, return_exceptions=True)
+    password_pool.shutdown()
+    thumbnails.shutdown()
+    # Ditutup terakhir: job di atas masih menulis view dan stats saat berhenti
+    mongo.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(SessionMiddleware, secret_key=os.getenv("SECRET_KEY"))
 app.add_middleware(
@@ -0,0 +1,228 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+
+from .database.config import outbox_collection, user_collection
+from .dependencies import verification_token
+from .mail import mail_dispatcher, verification_message
+from .queries import claimable_outbox
+
+load_dotenv()
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", 2))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 20))
+# Harus lebih lama dari timeout SMTP: mail yang belum terkirim dibatalkan satu timeout sebelum lease habis
+OUTBOX_LEASE = float(os.getenv("OUTBOX_LEASE", 180))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 2))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+OUTBOX_RETRY_BACKOFF = float(os.getenv("OUTBOX_RETRY_BACKOFF", 30))
+# Record tanpa user selama ini berarti insert user gagal atau proses mati di tengah signup
+OUTBOX_ORPHAN_AGE = float(os.getenv("OUTBOX_ORPHAN_AGE", 300))
+
+
+def now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def verification_record(email: str) -> dict:
+    created_at = now()
+    return {
+        "kind": "verify_email",
+        "email": email,
+        "state": "pending",
+        "attempts": 0,
+        "created_at": created_at,
+        "available_at": created_at,
+    }
+
+
+class Outbox:
+    """
+    Mongo-backed queue of verification mails that survives restarts.
+
+    A worker claims a record with `find_one_and_update`, which pushes its
+    `available_at` one lease into the future. A sent record is deleted, a
+    failed one is rescheduled with backoff. A worker that dies mid-send
+    leaves the lease to expire, and the record is claimed again.
+
+    Mails are submitted with a single dispatcher attempt, the outbox owns the
+    retries. Sends not started one SMTP timeout before the lease runs out are
+    cancelled and rescheduled. A send already in progress keeps its record:
+    the lease is extended and the result decides. Completions only touch
+    records still claimed by the same worker, so an expired lease never leads
+    to a second mail.
+
+    Records hold only the email, the token is created just before sending.
+    Failed records get `failed_at` and are removed by a TTL index.
+    """
+
+    def __init__(self, collection, users, dispatcher, workers: int, batch_size: int, lease: float):
+        self.collection = collection
+        self.users = users
+        self.dispatcher = dispatcher
+        self.workers = workers
+        self.batch_size = batch_size
+        self.lease = lease
+        self.wakeup = asyncio.Event()
+        self.sent = 0
+        self.rescheduled = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def notify(self):
+        # Bangunkan worker agar mail baru tidak menunggu interval polling
+        self.wakeup.set()
+
+    async def claim(self, worker_id: str):
+        current = now()
+        return await self.collection.find_one_and_update(
+            claimable_outbox(current),
+            {
+                "$set": {"available_at": current + timedelta(seconds=self.lease), "claimed_by": worker_id},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def claim_batch(self, worker_id: str) -> list[dict]:
+        batch = []
+        while len(batch) < self.batch_size:
+            record = await self.claim(worker_id)
+            if record is None:
+                break
+            batch.append(record)
+        return batch
+
+    async def process(self, batch: list[dict], worker_id: str):
+        # Satu query $in untuk semua user di batch
+        users = {
+            user["email"]: user
+            async for user in self.users.find(
+                {"email": {"$in": [record["email"] for record in batch]}}, {"email": 1, "superuser": 1, "verified": 1}
+            )
+        }
+
+        done, sending = [], []
+        for record in batch:
+            user = users.get(record["email"])
+            if user is None:
+                # Bisa jadi insert user belum selesai; lease yang habis akan mencobanya lagi
+                if now() - record["created_at"].replace(tzinfo=timezone.utc) > timedelta(seconds=OUTBOX_ORPHAN_AGE):
+                    done.append(record["_id"])
+                    self.dropped += 1
+                continue
+            if user.get("verified"):
+                done.append(record["_id"])
+                continue
+            message = verification_message(record["email"], verification_token(user))
+            sending.append((record, await self.dispatcher.submit(message, max_attempts=1)))
+
+        if sending:
+            # Lease paling awal di batch, dikurangi satu timeout untuk pengiriman yang sedang berjalan
+            expires = min(record["available_at"].replace(tzinfo=timezone.utc) for record, _ in sending)
+            timeout = (expires - now()).total_seconds() - self.dispatcher.config.TIMEOUT
+            await asyncio.wait([result for _, result in sending], timeout=max(timeout, 0))
+
+        in_flight = []
+        for record, result in sending:
+            if result.done():
+                await self.settle(record, result, done, worker_id)
+            elif self.dispatcher.cancel(result):
+                await self.reschedule(record, TimeoutError("Mail not sent before the lease ran out"), worker_id)
+            else:
+                in_flight.append((record, result))
+
+        if in_flight:
+            # Sudah sampai di server SMTP: mengirim ulang bisa menggandakan mail, jadi lease
+            # diperpanjang dan hasil pengiriman ditunggu
+            await self.collection.update_many(
+                {"_id": {"$in": [record["_id"] for record, _ in in_flight]}, "claimed_by": worker_id},
+                {"$set": {"available_at": now() + timedelta(seconds=self.lease)}},
+            )
+            await asyncio.wait([result for _, result in in_flight])
+            for record, result in in_flight:
+                await self.settle(record, result, done, worker_id)
+
+        if done:
+            await self.collection.delete_many({"_id": {"$in": done}, "claimed_by": worker_id})
+
+    async def settle(self, record: dict, result: asyncio.Future, done: list, worker_id: str):
+        if result.exception() is None:
+            done.append(record["_id"])
+            self.sent += 1
+        else:
+            await self.reschedule(record, result.exception(), worker_id)
+
+    async def reschedule(self, record: dict, error: Exception, worker_id: str):
+        if record["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+            self.failed += 1
+            update = {"$set": {"state": "failed", "failed_at": now(), "error": str(error)}}
+        else:
+            self.rescheduled += 1
+            delay = OUTBOX_RETRY_BACKOFF * 2 ** (record["attempts"] - 1)
+            update = {"$set": {"available_at": now() + timedelta(seconds=delay), "error": str(error)}}
+        # Lease yang sudah diambil worker lain tidak diubah
+        await self.collection.update_one({"_id": record["_id"], "claimed_by": worker_id}, update)
+
+    async def work(self):
+        worker_id = uuid.uuid4().hex
+        while True:
+            # Dikosongkan sebelum klaim, notify selama klaim tidak terlewat
+            self.wakeup.clear()
+            try:
+                batch = await self.claim_batch(worker_id)
+                if batch:
+                    await self.process(batch, worker_id)
+                    continue
+            except Exception as e:
+                print(f"Outbox worker failed: {e}")
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def scrub(self):
+        """
+        Drop the tokens older records were stored with and give older failed
+        records a `failed_at`, so the TTL index removes them too.
+        """
+        await self.collection.update_many({"token": {"$exists": True}}, {"$unset": {"token": ""}})
+        await self.collection.update_many(
+            {"state": "failed", "failed_at": {"$exists": False}}, {"$set": {"failed_at": now()}}
+        )
+
+    async def run(self):
+        """
+        Run the workers until cancelled.
+        """
+        try:
+            await self.scrub()
+        except Exception as e:
+            print(f"Outbox scrub failed: {e}")
+        await asyncio.gather(*(self.work() for _ in range(self.workers)))
+
+    async def stats(self) -> dict:
+        return {
+            "pending": await self.collection.count_documents({"state": "pending"}),
+            "failed_records": await self.collection.count_documents({"state": "failed"}),
+            "sent": self.sent,
+            "rescheduled": self.rescheduled,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+outbox = Outbox(
+    outbox_collection,
+    user_collection,
+    mail_dispatcher,
+    workers=OUTBOX_WORKERS,
+    batch_size=OUTBOX_BATCH_SIZE,
+    lease=OUTBOX_LEASE,
+)
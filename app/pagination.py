@@ -0,0 +1,55 @@
+import base64
+import binascii
+
+from bson import json_util
+from fastapi import HTTPException, Query, status
+from typing_extensions import Annotated
+
+Limit = Annotated[int, Query(ge=1, le=100)]
+
+
+def encode_cursor(value) -> str:
+    """
+    Opaque cursor for the sort key of the last item on a page.
+    """
+    return base64.urlsafe_b64encode(json_util.dumps(value).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        return json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def next_page(items: list, limit: int, key=lambda doc: doc["_id"]):
+    """
+    Trim a `limit + 1` fetch to one page and build the cursor of the next one.
+    """
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(key(items[-1]))
+
+
+def after_cursor(query: dict, cursor: str = None) -> dict:
+    """
+    Restrict `query` to the documents after `cursor` in `_id` order, keeping
+    any `_id` range already in it.
+    """
+    if cursor:
+        return {**query, "_id": {**query.get("_id", {}), "$gt": decode_cursor(cursor)}}
+    return query
+
+
+async def paginate(collection, query: dict, limit: int, cursor: str = None, projection: dict = None, session=None):
+    """
+    Keyset pagination on `_id`: every page is an index range scan of `limit + 1`
+    documents, no matter how deep it is.
+    """
+    query = after_cursor(query, cursor)
+    documents = await collection.find(query, projection, session=session).sort("_id", 1).to_list(limit + 1)
+    return next_page(documents, limit)
@@ -0,0 +1,82 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from passlib.hash import bcrypt
+
+load_dotenv()
+
+
+def _hash(password: str) -> str:
+    return bcrypt.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return bcrypt.verify(plain_password, hashed_password)
+
+
+class PasswordPool:
+    """
+    Process pool for bcrypt work so hashing never blocks the event loop.
+
+    At most `queue_limit` calls may be running or waiting; past that requests
+    get a 503 instead of piling up behind a login burst.
+    """
+
+    def __init__(self, size: int, queue_limit: int):
+        self.size = size
+        self.queue_limit = queue_limit
+        self.executor = None
+        self.pending = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        if self.pending >= self.queue_limit:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again",
+                headers={"Retry-After": "1"},
+            )
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.size,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "queue_limit": self.queue_limit,
+            "pending": self.pending,
+            "rejected": self.rejected,
+        }
+
+
+password_pool = PasswordPool(
+    size=int(os.getenv("PASSWORD_POOL_SIZE", os.cpu_count() or 1)),
+    queue_limit=int(os.getenv("PASSWORD_QUEUE_LIMIT", 64)),
+)
+
+
+async def hash_password(password: str) -> str:
+    return await password_pool.run(_hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_pool.run(_verify, plain_password, hashed_password)
@@ -0,0 +1,166 @@
+import asyncio
+import heapq
+import math
+import os
+import time
+from collections import Counter
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+from .queries import approved_among, popular_meals
+
+load_dotenv()
+
+VIEW_WEIGHT = 1.0
+FAVOURITE_WEIGHT = 5.0
+
+
+class ViewBuffer:
+    """
+    Meal view counts collected in memory and written as one `bulk_write` of
+    `$inc`s per flush instead of one update per request.
+    """
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.flushed = 0
+
+    def add(self, meal_id: str):
+        self.counts[meal_id] += 1
+
+    async def flush(self, collection):
+        if not self.counts:
+            return
+        counts, self.counts = self.counts, Counter()
+        try:
+            await collection.bulk_write(
+                [
+                    UpdateOne({"_id": ObjectId(meal_id)}, {"$inc": {"view_count": count}})
+                    for meal_id, count in counts.items()
+                ],
+                ordered=False,
+            )
+        except Exception:
+            # Simpan lagi untuk flush berikutnya
+            self.counts.update(counts)
+            raise
+        self.flushed += sum(counts.values())
+
+
+class TrendingTracker:
+    """
+    Exponentially time-decayed popularity score per meal.
+
+    Scores are stored relative to `origin`: an event of weight `w` at time `t`
+    adds `w * 2 ** ((t - origin) / half_life)`, so old events fade without
+    touching every score on each update.
+    """
+
+    def __init__(self, half_life: float, capacity: int):
+        self.half_life = half_life
+        self.capacity = capacity
+        self.origin = time.time()
+        self.scores: dict[str, float] = {}
+        self.top: list = []
+
+    def record(self, meal_id: str, weight: float):
+        now = time.time()
+        # Geser origin sebelum eksponen terlalu besar untuk float
+        if now - self.origin > 64 * self.half_life:
+            self.rebase(now)
+        boost = weight * 2 ** ((now - self.origin) / self.half_life)
+        self.scores[meal_id] = self.scores.get(meal_id, 0.0) + boost
+
+    def rebase(self, now: float):
+        factor = 2 ** (-(now - self.origin) / self.half_life)
+        self.scores = {
+            meal_id: score * factor
+            for meal_id, score in self.scores.items() if score * factor > 1e-6
+        }
+        self.origin = now
+
+    def ranked(self, k: int) -> list[str]:
+        """
+        Ids of the `k` highest scores. Also forgets the lowest scores past
+        `capacity`, which bounds memory.
+        """
+        if len(self.scores) > self.capacity:
+            self.scores = dict(heapq.nlargest(self.capacity, self.scores.items(), key=lambda item: item[1]))
+        return [meal_id for meal_id, _ in heapq.nlargest(k, self.scores.items(), key=lambda item: item[1])]
+
+    async def refresh(self, collection, k: int):
+        """
+        Load the current top `k` approved meals for `GET /meals/trending`.
+        """
+        ids = self.ranked(2 * k)
+        found = {
+            str(meal["_id"]): meal
+            async for meal in collection.find(approved_among(ids))
+        }
+        self.top = [found[meal_id] for meal_id in ids if meal_id in found][:k]
+
+    def seed(self, weights: dict[str, float]):
+        """
+        Start from persisted all-time activity, counted as if it happened one
+        `half_life` ago so fresh activity soon outweighs it.
+        """
+        factor = 2 ** ((time.time() - self.origin) / self.half_life - 1)
+        for meal_id, weight in heapq.nlargest(self.capacity, weights.items(), key=lambda item: item[1]):
+            self.scores[meal_id] = self.scores.get(meal_id, 0.0) + weight * factor
+
+    def forget(self, meal_id: str):
+        self.scores.pop(meal_id, None)
+        self.top = [meal for meal in self.top if str(meal["_id"]) != meal_id]
+
+
+view_buffer = ViewBuffer()
+trending = TrendingTracker(
+    half_life=float(os.getenv("TRENDING_HALF_LIFE", 6 * 60 * 60)),
+    capacity=int(os.getenv("TRENDING_CAPACITY", 10_000)),
+)
+
+FLUSH_INTERVAL = float(os.getenv("VIEW_FLUSH_INTERVAL", 5))
+TRENDING_INTERVAL = float(os.getenv("TRENDING_REFRESH_INTERVAL", 30))
+TRENDING_SIZE = int(os.getenv("TRENDING_SIZE", 20))
+
+
+async def seed_trending(collection):
+    """
+    Seed `trending` from the `view_count` / `favourite_count` stored on the
+    approved meals, so a restart does not start from an empty list.
+    """
+    weights = {}
+    async for meal in collection.find(
+        popular_meals(),
+        {"view_count": 1, "favourite_count": 1},
+    ):
+        weights[str(meal["_id"])] = (
+            VIEW_WEIGHT * max(meal.get("view_count", 0), 0) + FAVOURITE_WEIGHT * max(meal.get("favourite_count", 0), 0)
+        )
+    trending.seed(weights)
+
+
+async def run_popularity_jobs(collection):
+    """
+    Seed the trending scores, then flush buffered views and refresh the
+    trending list until cancelled.
+    """
+    last_refresh = -math.inf
+    try:
+        await seed_trending(collection)
+    except Exception as e:
+        print(f"Popularity job failed: {e}")
+    try:
+        while True:
+            try:
+                await view_buffer.flush(collection)
+                if time.monotonic() - last_refresh >= TRENDING_INTERVAL:
+                    await trending.refresh(collection, TRENDING_SIZE)
+                    last_refresh = time.monotonic()
+            except Exception as e:
+                print(f"Popularity job failed: {e}")
+            await asyncio.sleep(FLUSH_INTERVAL)
+    finally:
+        await view_buffer.flush(collection)
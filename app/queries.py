@@ -0,0 +1,168 @@
+"""
+Filters and pipelines sent by the routers and background jobs.
+
+Built here so `tests/test_query_plans.py` explains the exact shapes that are
+sent and checks that each one stays on an index.
+"""
+import re
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from .pagination import after_cursor
+
+# Flag yang tidak difilter: tetap memakai index (superuser, active, verified, _id)
+ANY_FLAG = {"$in": [True, False, None]}
+
+
+def approved_meals(category: str = None, area: str = None) -> dict:
+    query = {"verification_status": "approved"}
+    if category is not None:
+        query["category"] = category
+    if area is not None:
+        query["area"] = area
+    return query
+
+
+def approved_among(meal_ids: list[str]) -> dict:
+    return {"_id": {"$in": [ObjectId(meal_id) for meal_id in meal_ids]}, "verification_status": "approved"}
+
+
+def popular_meals() -> dict:
+    """
+    Approved meals with any recorded views or favourites.
+    """
+    return {"verification_status": "approved", "$or": [{"view_count": {"$gt": 0}}, {"favourite_count": {"$gt": 0}}]}
+
+
+def authored_by(user) -> dict:
+    return {"author": user["email"]}
+
+
+def owned_meal(meal_id: str, user) -> dict:
+    """
+    Filter for writes only the author may make: the ownership check and the
+    write are one operation.
+    """
+    return {"_id": ObjectId(meal_id), "author": user["email"]}
+
+
+def favourite_of(user, meal_id) -> dict:
+    return {"user_id": ObjectId(user["_id"]), "meal_id": ObjectId(meal_id)}
+
+
+def favourites_among(user, meal_ids: list) -> dict:
+    return {"user_id": ObjectId(user["_id"]), "meal_id": {"$in": meal_ids}}
+
+
+def favourite_meals_pipeline(user, cursor: str = None, projection: dict = None, limit: int = None) -> list:
+    """
+    The user's favourites in `_id` order (keyset pagination on favourites)
+    joined with their meals. `projection` limits the joined meal fields,
+    `limit` is left out when streaming.
+    """
+    pipeline = [
+        {
+            "$match": after_cursor({"user_id": ObjectId(user["_id"])}, cursor)
+        },
+        {
+            "$sort": {"_id": 1}
+        },
+        {
+            "$lookup": {
+                "from": "meals",
+                "localField": "meal_id",
+                "foreignField": "_id",
+                "as": "meal_details"
+            }
+        },
+        {
+            # Favourite yang meal-nya sudah dihapus tetap dihitung untuk cursor
+            "$unwind": {"path": "$meal_details", "preserveNullAndEmptyArrays": True}
+        },
+        {
+            "$project": {
+                "meal_details._id": 1,
+                "meal_details.name": 1,
+                "meal_details.category": 1,
+                "meal_details.area": 1,
+                "meal_details.instructions": 1,
+                "meal_details.youtubeUrl": 1,
+                "meal_details.imageUrl": 1,
+                "meal_details.ingredients": 1,
+                "meal_details.author": 1
+            }
+        }
+    ]
+    if projection is not None:
+        # Field besar tidak ikut di-join sama sekali
+        pipeline[2]["$lookup"]["pipeline"] = [{"$project": projection}]
+        pipeline[-1] = {
+            "$project": {
+                "meal_details._id": 1,
+                **{f"meal_details.{field}": 1 for field in projection},
+            }
+        }
+    if limit is not None:
+        pipeline.insert(2, {"$limit": limit})
+    return pipeline
+
+
+def created_at_value(value: datetime) -> str:
+    # created_at disimpan sebagai string isoformat UTC tanpa zona waktu
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+
+def user_filter(
+    verified: bool = None,
+    active: bool = None,
+    superuser: bool = None,
+    created_from: datetime = None,
+    created_to: datetime = None,
+    email_prefix: str = None,
+) -> dict:
+    """
+    Query for the admin user directory, shaped so every filter combination
+    stays on an index scan sorted by `_id` (by `email` with `email_prefix`).
+    """
+    query = {}
+    flags = {"superuser": superuser, "active": active, "verified": verified}
+    if any(value is not None for value in flags.values()):
+        # Flag yang tidak difilter ditulis sebagai $in, index (superuser, active, verified, _id)
+        # tetap dipakai dan hasilnya di-merge dalam urutan _id
+        for field, value in flags.items():
+            query[field] = value if value is not None else ANY_FLAG
+
+    if created_from is not None or created_to is not None:
+        # _id berisi waktu insert, jadi rentang created_at dipersempit lewat rentang _id
+        # (dengan sedikit kelonggaran), created_at sendiri tetap difilter persis
+        query["_id"] = {}
+        query["created_at"] = {}
+        if created_from is not None:
+            query["_id"]["$gte"] = ObjectId.from_datetime(created_from - timedelta(minutes=1))
+            query["created_at"]["$gte"] = created_at_value(created_from)
+        if created_to is not None:
+            query["_id"]["$lt"] = ObjectId.from_datetime(created_to + timedelta(minutes=1))
+            query["created_at"]["$lt"] = created_at_value(created_to)
+
+    if email_prefix:
+        # Prefix regex berjangkar dipakai sebagai range scan pada index unik email
+        query["email"] = {"$regex": "^" + re.escape(email_prefix)}
+    return query
+
+
+def daily_counts_pipeline(since: datetime) -> list:
+    """
+    Documents per day of their `_id` timestamp, from `since` on. The `_id`
+    range keeps it on the `_id` index.
+    """
+    return [
+        {"$match": {"_id": {"$gte": ObjectId.from_datetime(since)}}},
+        {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": {"$toDate": "$_id"}}}, "count": {"$sum": 1}}},
+    ]
+
+
+def claimable_outbox(current: datetime) -> dict:
+    return {"state": "pending", "available_at": {"$lte": current}}
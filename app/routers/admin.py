@@ -1,15 +1,100 @@
-from bson import ObjectId
-from fastapi import APIRouter, HTTPException, status
+import os
+from datetime import datetime, timedelta, timezone
 
-from app.database.models import MealAdminCollection, UserCollection, UserAdmin, UpdateUserPrivilage, MealAdmin, UpdateMealStatus
-from app.dependencies import CurrentSuperUser
-from app.database.config import user_collection, meal_collection
+from bson import ObjectId, json_util
+from fastapi import APIRouter, HTTPException, Query, status
+from pymongo import ReturnDocument, UpdateOne
+
+from app.database.models import (
+    MealAdminCollection, UserCollection, UserAdmin, UpdateUserPrivilage, MealAdmin, UpdateMealStatus,
+    BulkMealStatusUpdate, BulkMealStatusResult, USER_ADMIN_PROJECTION, AdminStats,
+)
+from app.cache import TTLCache
+from app.dependencies import CurrentSuperUser, user_cache
+from app.database.config import user_collection, meal_collection, stats_collection
+from app.etag import CATALOGUE, bump, versioned
+from app.indexes import meal_saved, search_cache
+from app.pagination import Limit, after_cursor, decode_cursor, next_page, paginate
+from app.mail import mail_dispatcher
+from app.outbox import outbox
+from app.stats import STATS_ID, STATS_RECONCILE_DAYS, day_key, stats_buffer
+from app.passwords import password_pool
+from app.queries import user_filter
+from app.thumbnails import thumbnails
+from app.routers.static import image_cache
+from app.streaming import StreamFormat, batches, collection_encoder, document_encoder, json_response, stream_documents
 router = APIRouter(tags=["Admin"], prefix="/admin")
 
+# Sama seperti GET /admin/users/{id}: `_id`, bukan `id`
+encode_user = document_encoder(UserAdmin, by_alias=True)
+encode_users = collection_encoder(UserAdmin, "users", by_alias=True)
+encode_meals = collection_encoder(MealAdmin, "meals")
+
+
+# Total hasil filter di-cache sebentar dan dihitung paling banyak sampai USER_COUNT_LIMIT
+USER_COUNT_LIMIT = int(os.getenv("USER_COUNT_LIMIT", 10_000))
+user_counts = TTLCache(
+    maxsize=int(os.getenv("USER_COUNT_CACHE_SIZE", 256)),
+    ttl=float(os.getenv("USER_COUNT_CACHE_TTL", 60)),
+)
+
+
+async def count_users(query: dict) -> tuple[int, bool]:
+    """
+    Total for a directory query and whether it is an estimate. Unfiltered it
+    comes from collection metadata, filtered counts stop at `USER_COUNT_LIMIT`.
+    """
+    if not query:
+        return await user_collection.estimated_document_count(), True
+
+    key = json_util.dumps(query)
+    counted = user_counts.get(key)
+    if counted is None:
+        total = await user_collection.count_documents(query, limit=USER_COUNT_LIMIT)
+        counted = (total, total >= USER_COUNT_LIMIT)
+        user_counts.set(key, counted)
+    return counted
+
 
 @router.get("/users", response_model=UserCollection)
-async def users_list(user : CurrentSuperUser):
-    return UserCollection(users=await user_collection.find().to_list(1000))
+async def users_list(
+    user : CurrentSuperUser,
+    limit: Limit = 20,
+    cursor: str = None,
+    stream: StreamFormat = None,
+    verified: bool = None,
+    active: bool = None,
+    superuser: bool = None,
+    email_prefix: str = None,
+    created_from: datetime = None,
+    created_to: datetime = None,
+):
+    """
+    Filter users by flags, email prefix and `created_at` range (`created_to`
+    exclusive). Pages are ordered by `_id`, or by email when `email_prefix`
+    is given. The first page includes `total`, an estimate when
+    `total_is_estimate` is true.
+    """
+    query = user_filter(verified, active, superuser, created_from, created_to, email_prefix)
+
+    if email_prefix:
+        sort, key = "email", lambda document: document["email"]
+        find_query = query
+        if cursor:
+            find_query = {**query, "email": {**query["email"], "$gt": decode_cursor(cursor)}}
+    else:
+        sort, key = "_id", lambda document: document["_id"]
+        find_query = after_cursor(query, cursor)
+
+    documents = user_collection.find(find_query, USER_ADMIN_PROJECTION).sort(sort, 1)
+    if stream:
+        return stream_documents(batches(documents), encode_user, stream, "users")
+
+    users, next_cursor = next_page(await documents.to_list(limit + 1), limit, key=key)
+    extra = {}
+    if not cursor:
+        extra["total"], extra["total_is_estimate"] = await count_users(query)
+    return json_response(encode_users(users, next_cursor, **extra))
 
 @router.get("/users/{id}", response_model=UserAdmin)
 async def get_user(user : CurrentSuperUser, id : str) :
@@ -21,7 +106,7 @@ async def get_user(user : CurrentSuperUser, id : str) :
             detail="Invalid user ID"
         )
 
-    user_obj = await user_collection.find_one({"_id" : ObjectId(id)})
+    user_obj = await user_collection.find_one({"_id" : ObjectId(id)}, USER_ADMIN_PROJECTION)
     if not user_obj :
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -46,14 +131,6 @@ async def update_user_privileges(
             detail="Invalid user ID"
         )
 
-    # Cari user berdasarkan ID
-    user = await user_collection.find_one({"_id": ObjectId(id)})
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, 
-            detail="User not found"
-        )
-
     # Filter atribut yang akan diupdate
     update_data = updates.dict(exclude_unset=True)
     if not update_data:
@@ -62,20 +139,21 @@ async def update_user_privileges(
             detail="No updates provided"
         )
 
-    # Update user di database
-    update_result = await user_collection.update_one(
+    # Update user di database dan kembalikan data yang diperbarui
+    updated_user = await user_collection.find_one_and_update(
         {"_id": ObjectId(id)}, 
-        {"$set": update_data}
+        {"$set": update_data},
+        projection=USER_ADMIN_PROJECTION,
+        return_document=ReturnDocument.AFTER,
     )
-
-    if update_result.matched_count == 0:
+    if not updated_user:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
-            detail="Failed to update user"
+            status_code=status.HTTP_404_NOT_FOUND, 
+            detail="User not found"
         )
 
-    # Kembalikan data user yang diperbarui
-    updated_user = await user_collection.find_one({"_id": ObjectId(id)})
+    # Hak akses berubah, jangan pakai user lama dari cache
+    user_cache.pop(updated_user["email"])
     return updated_user
 
 
@@ -87,11 +165,72 @@ async def update_user_privileges(
     response_model=MealAdminCollection,
     response_model_by_alias=False,
 )
-async def list_meals(user : CurrentSuperUser):
-    meals = await meal_collection.find({ "verification_status" : "pending"}).to_list()
-    return MealAdminCollection(meals=meals)
+async def list_meals(user : CurrentSuperUser, limit: Limit = 20, cursor: str = None):
+    """
+    The moderation queue: pending meals, oldest first.
+    """
+    meals, next_cursor = await paginate(
+        meal_collection, { "verification_status" : "pending"}, limit, cursor
+    )
+    return json_response(encode_meals(meals, next_cursor))
+
+
 
 
+@router.patch("/meals", response_description="Per-meal results", response_model=BulkMealStatusResult)
+async def update_meal_statuses(body: BulkMealStatusUpdate, user: CurrentSuperUser):
+    """
+    Set `verification_status` on up to 500 meals at once. All updates are sent
+    in one `bulk_write`, then the meals are read back with one `$in` query.
+    """
+    def normalized(meal_id: str) -> str:
+        # Hex huruf besar juga valid; hasil disimpan dengan bentuk yang dikembalikan MongoDB
+        return str(ObjectId(meal_id)) if ObjectId.is_valid(meal_id) else meal_id
+
+    # Id yang muncul lebih dari sekali: update terakhir yang dipakai
+    updates = {}
+    results = {}
+    for update in body.updates:
+        if ObjectId.is_valid(update.id):
+            updates[normalized(update.id)] = update.verification_status
+        else:
+            results[update.id] = {"id": update.id, "result": "invalid_id"}
+
+    if updates:
+        ids = [ObjectId(meal_id) for meal_id in updates]
+        # Nilai lama untuk statistik, hanya field yang dihitung
+        before = {
+            str(meal["_id"]): meal
+            async for meal in meal_collection.find(
+                {"_id": {"$in": ids}}, {"verification_status": 1, "category": 1, "area": 1}
+            )
+        }
+
+        await meal_collection.bulk_write(
+            [
+                UpdateOne({"_id": ObjectId(meal_id)}, versioned({"$set": {"verification_status": verification_status}}))
+                for meal_id, verification_status in updates.items()
+            ],
+            ordered=False,
+        )
+
+        saved = 0
+        found = meal_collection.find({"_id": {"$in": ids}})
+        async for meal in found:
+            stats_buffer.meal_changed(before.get(str(meal["_id"])), meal)
+            meal_saved(meal)
+            saved += 1
+            results[str(meal["_id"])] = {
+                "id": str(meal["_id"]),
+                "result": "updated",
+                "verification_status": meal["verification_status"],
+            }
+        if saved:
+            await bump(CATALOGUE)
+
+    for meal_id in updates:
+        results.setdefault(meal_id, {"id": meal_id, "result": "not_found"})
+    return {"results": [results[normalized(update.id)] for update in body.updates]}
 
 
 @router.patch("/meals{id}",response_description="Updated Meal",response_model=MealAdmin)
@@ -103,14 +242,6 @@ async def update_meal_status(id: str, updates: UpdateMealStatus, user: CurrentSu
             detail="Invalid user ID"
         )
 
-    # Cari meal berdasarkan ID
-    meal = await meal_collection.find_one({"_id": ObjectId(id)})
-    if not meal:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, 
-            detail="User not found"
-        )
-
     # Filter atribut yang akan diupdate
     update_data = updates.dict(exclude_unset=True)
     if not update_data:
@@ -119,18 +250,59 @@ async def update_meal_status(id: str, updates: UpdateMealStatus, user: CurrentSu
             detail="No updates provided"
         )
 
-    # Update user di database
-    update_result = await meal_collection.update_one(
+    # Update meal di database, dokumen lama dipakai untuk statistik
+    before = await meal_collection.find_one_and_update(
         {"_id": ObjectId(id)}, 
-        {"$set": update_data}
+        versioned({"$set": update_data}),
+        return_document=ReturnDocument.BEFORE,
     )
-
-    if update_result.matched_count == 0:
+    if not before:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
-            detail="Failed to update user"
+            status_code=status.HTTP_404_NOT_FOUND, 
+            detail="Meal not found"
         )
 
-    # Kembalikan data user yang diperbarui
-    updated_meal = await meal_collection.find_one({"_id": ObjectId(id)})
-    return updated_meal
\ No newline at end of file
+    updated_meal = {**before, **update_data, "version": before.get("version", 0) + 1}
+    stats_buffer.meal_changed(before, updated_meal)
+    meal_saved(updated_meal)
+    await bump(CATALOGUE)
+    return updated_meal
+
+
+@router.get("/stats", response_description="Site totals and daily activity", response_model=AdminStats)
+async def site_stats(user : CurrentSuperUser, days: int = Query(30, ge=1, le=STATS_RECONCILE_DAYS)):
+    """
+    Totals and the last `days` days of signups and favourites, read from the
+    precomputed stats documents in one query.
+    """
+    today = datetime.now(timezone.utc)
+    day_keys = [day_key(today - timedelta(days=offset)) for offset in range(days)]
+    documents = {
+        document["_id"]: document
+        async for document in stats_collection.find({"_id": {"$in": [STATS_ID, *day_keys]}})
+    }
+
+    totals = documents.get(STATS_ID, {})
+    return {
+        **{field: value for field, value in totals.items() if field != "_id"},
+        "daily": [
+            {"date": key.removeprefix("daily:"), **{
+                field: value for field, value in documents.get(key, {}).items() if field != "_id"
+            }}
+            for key in day_keys
+        ],
+    }
+
+
+@router.get("/metrics", response_description="Cache and worker metrics")
+async def metrics(user : CurrentSuperUser):
+    return {
+        "search_cache" : search_cache.stats(),
+        "user_cache" : user_cache.stats(),
+        "user_counts" : user_counts.stats(),
+        "password_pool" : password_pool.stats(),
+        "thumbnails" : thumbnails.stats(),
+        "image_cache" : image_cache.stats(),
+        "mail" : mail_dispatcher.stats(),
+        "outbox" : await outbox.stats(),
+    }
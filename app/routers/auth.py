@@ -1,20 +1,22 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import HTMLResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
 from dotenv import load_dotenv
 import os
-from passlib.hash import bcrypt
 
 import jwt
 
 from authlib.integrations.starlette_client import OAuth
+from pymongo.errors import DuplicateKeyError
 
 from app.database.models import UserModel
-from app.dependencies import verify_user
-from app.database.config import user_collection
-from app.mail import VerifyEmail
+from app.dependencies import verify_user, user_cache
+from app.database.config import user_collection, outbox_collection
+from app.outbox import outbox, verification_record
+from app.stats import stats_buffer
+from app.passwords import hash_password
 
 router = APIRouter(tags=["Auth"], prefix="/auth")
 
@@ -69,9 +71,9 @@ async def generate_token(form_data: OAuth2PasswordRequestForm = Depends()):
 @router.post("/signup", 
             status_code=status.HTTP_201_CREATED
             )
-async def create_user(user: UserModel, task : BackgroundTasks):
+async def create_user(user: UserModel):
     # Hash the password before saving
-    hashed_password = bcrypt.hash(user.password)
+    hashed_password = await hash_password(user.password)
 
     # Prepare user data
     user_data = user.dict(by_alias=True, exclude=["id"])
@@ -81,25 +83,20 @@ async def create_user(user: UserModel, task : BackgroundTasks):
     user_data["active"] = True
     user_data["verified"] = False
 
-    # Check if the user already exists
-    existing_user = await user_collection.find_one({"email": user.email})
-    if existing_user:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already taken")
-
-    # Insert the new user into the database
-    result = await user_collection.insert_one(user_data)
-
-    # Fetch and return the created user
-    created_user = await user_collection.find_one({"_id": result.inserted_id})
+    # Record outbox ditulis sebelum user, jadi mail verifikasi tidak hilang walau proses mati setelah insert user.
+    # Hanya email yang disimpan, token dibuat worker outbox saat mail dikirim
+    mail = verification_record(user_data["email"])
+    await outbox_collection.insert_one(mail)
 
-    payload = {
-        "email": created_user["email"],
-        "superuser" : created_user["superuser"]
-    }
+    # Insert the new user, the unique index on email rejects existing users
+    try:
+        await user_collection.insert_one(user_data)
+    except DuplicateKeyError:
+        await outbox_collection.delete_one({"_id": mail["_id"]})
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already taken")
 
-    # Encode token JWT
-    token = jwt.encode(payload, JWT_SECRET, algorithm="HS256")
-    task.add_task(VerifyEmail,created_user['email'],token)
+    outbox.notify()
+    stats_buffer.add({"users": 1}, day={"signups": 1})
     return {"massage" : "User created successfully. Verification email sent."}
 
 
@@ -122,6 +119,11 @@ async def email_verification(token: str):
         # Handle case where user is not found
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
+        user_cache.pop(email)
+
+        # `user` adalah dokumen sebelum update
+        if not user.get("verified"):
+            stats_buffer.add({"verified_users": 1})
 
         # HTML response
         html_content = f"""
@@ -1,15 +1,33 @@
+import asyncio
 from bson import ObjectId
-from fastapi import APIRouter,HTTPException, Response, status, File, UploadFile
+from typing import Union
+
+from fastapi import APIRouter,HTTPException, Request, Response, status, File, UploadFile, Query
 from pymongo import ReturnDocument
 
-from pathlib import Path
-import shutil
 from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
 import os
 
-from ..dependencies import CurrentUser, is_owner
-from ..database.models import MealModel, MealCollection, UpdateMealModel, MealResponse
-from ..database.config import meal_collection, favourites_collection
+from ..dependencies import CurrentUser, OptionalUser, ownership_error
+from ..database.models import (
+    MealModel, MealCollection, UpdateMealModel, MealResponse, PantryMatch, PantryMatchCollection, FacetCounts,
+    MealSummary, MealSummaryCollection, MealView, MEAL_SUMMARY_PROJECTION,
+)
+from ..database.config import (
+    meal_collection, favourites_collection, catalogue_meals, catalogue_favourites, catalogue_counters, catalogue_session,
+)
+from ..images import stage_image
+from ..stats import stats_buffer
+from ..thumbnails import thumbnails
+from ..etag import (
+    CATALOGUE, bump, favourites_counter, meal_etag, new_version, not_modified, not_modified_response, page_etag, versioned,
+)
+from ..indexes import search_index, pantry_index, fuzzy_index, facet_index, search_cache, search_key, meal_saved, meal_deleted, INDEX_PROJECTION
+from ..pagination import Limit, after_cursor, decode_cursor, next_page, paginate
+from ..popularity import view_buffer, trending, VIEW_WEIGHT, FAVOURITE_WEIGHT
+from ..queries import approved_meals, authored_by, favourite_of, favourites_among, owned_meal
+from ..streaming import BATCH_SIZE, StreamFormat, batches, collection_encoder, document_encoder, json_response, stream_documents
 
 router = APIRouter(tags=["Meals"])
 
@@ -17,8 +35,58 @@ load_dotenv()
 
 DOMAIN = os.getenv("DOMAIN")
 
-UPLOAD_DIR = Path("static/images")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+async def with_favourited(meals: list, user, favourites=favourites_collection, session=None) -> list:
+    """
+    Add the `favourited` flag to a page of meals with a single `$in` query.
+    """
+    favourited = set()
+    if user is not None and meals:
+        favourites = favourites.find(
+            favourites_among(user, [meal["_id"] for meal in meals]),
+            {"meal_id": 1, "_id": 0},
+            session=session,
+        )
+        favourited = {favourite["meal_id"] async for favourite in favourites}
+    return [{**meal, "favourited": meal["_id"] in favourited} for meal in meals]
+
+
+async def find_in_order(ids: list[str], projection: dict = None, meals=meal_collection) -> list[dict]:
+    """
+    Fetch meals by id with one `$in` query, in the order of `ids`.
+    """
+    found = {
+        str(meal["_id"]): meal
+        async for meal in meals.find({"_id": {"$in": [ObjectId(meal_id) for meal_id in ids]}}, projection)
+    }
+    return [found[meal_id] for meal_id in ids if meal_id in found]
+
+
+async def ranked_batches(ids: list[str], projection: dict = None):
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield await find_in_order(ids[start:start + BATCH_SIZE], projection, catalogue_meals)
+
+
+# Handler list mengembalikan dokumen mentah yang di-encode langsung, tanpa validasi Pydantic
+encode_meal = document_encoder(MealResponse)
+encode_meals = collection_encoder(MealResponse, "meals")
+encode_matches = collection_encoder(PantryMatch, "meals")
+
+# Per `view`: proyeksi MongoDB, encoder per dokumen (stream) dan encoder per halaman
+MEAL_VIEWS = {
+    "summary": (MEAL_SUMMARY_PROJECTION, document_encoder(MealSummary), collection_encoder(MealSummary, "meals")),
+    "full": (None, encode_meal, encode_meals),
+}
+
+# Route yang sejak awal memakai `response_model_by_alias=True` tetap mengirim `_id`
+MEAL_VIEWS_BY_ALIAS = {
+    "summary": (
+        MEAL_SUMMARY_PROJECTION,
+        document_encoder(MealSummary, by_alias=True),
+        collection_encoder(MealSummary, "meals", by_alias=True),
+    ),
+    "full": (None, document_encoder(MealResponse, by_alias=True), collection_encoder(MealResponse, "meals", by_alias=True)),
+}
 
 @router.post(
     "/meals",
@@ -37,67 +105,211 @@ async def create_meal(meal: MealModel, user : CurrentUser):
 
     meal_data['author'] = user["email"]
     meal_data['verification_status'] = 'pending'
+    new_version(meal_data)
 
-    new_meal = await meal_collection.insert_one(
+    # insert_one menambahkan `_id` ke meal_data
+    await meal_collection.insert_one(
         meal_data
     )
-    created_meal = await meal_collection.find_one(
-        {"_id": new_meal.inserted_id}
-    )
-    return created_meal
+    meal_saved(meal_data)
+    stats_buffer.meal_changed(None, meal_data)
+    await bump(CATALOGUE)
+    return meal_data
 
 
 
 @router.get(
     "/meals",
     response_description="List all meals",
-    response_model=MealCollection,
+    response_model=Union[MealSummaryCollection, MealCollection],
     response_model_by_alias=False,
 )
 async def list_meals(
-    limit: int = 20, 
+    request: Request,
+    user: OptionalUser,
+    limit: Limit = 20, 
+    search: str = None,
+    fuzzy: bool = False,
+    category: str = None,
+    area: str = None,
+    cursor: str = None,
+    stream: StreamFormat = None,
+    view: MealView = "summary",
+):
+    """
+    List meals with optional search on name, ingredients, area and category,
+    supporting multiple keywords. `category` and `area` filter on the exact
+    values returned by `/meals/facets`.
+
+    Searches are answered by the in-memory inverted index and ranked with BM25,
+    every keyword must match. With `fuzzy=true` keywords are matched against
+    meal and ingredient names by trigram similarity, so misspellings still
+    find results.
+
+    Pass the returned `next_cursor` back as `cursor` to get the next page.
+    Signed-in users get `favourited` set on their favourite meals.
+
+    `stream=ndjson` or `stream=json` streams every remaining match (from
+    `cursor` on, ignoring `limit`) as it is read instead of one page.
+
+    By default only the summary fields are read and returned, `view=full`
+    includes instructions and ingredients.
+
+    Pages carry an `ETag`, send it back in `If-None-Match` to get a 304 while
+    the catalogue (and your favourites) are unchanged.
+    """
+    projection, encode_one, encode_page = MEAL_VIEWS[view]
+
+    def add_favourited(batch):
+        return with_favourited(batch, user, catalogue_favourites)
+
+    if search:
+        after = None
+        if cursor:
+            try:
+                score, meal_id = decode_cursor(cursor)
+                after = (float(score), str(meal_id))
+            except (TypeError, ValueError):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Invalid cursor"
+                )
+
+        index = fuzzy_index if fuzzy else search_index
+        only = facet_index.ids(category, area)
+        if stream:
+            ids = [meal_id for _, meal_id in index.search(search, after=after, only=only)]
+            return stream_documents(ranked_batches(ids, projection), encode_one, stream, "meals", add_favourited)
+
+        async with catalogue_session() as session:
+            etag = await page_etag(request, user, catalogue_counters, session)
+            if not_modified(request, etag):
+                return not_modified_response(etag)
+
+            key = search_key(search, fuzzy, limit, cursor, category, area, view)
+            cached = search_cache.get(key)
+            if cached is None:
+                generation = search_cache.generation
+
+                # Ambil id hasil pencarian dari index, lalu dokumen dari MongoDB. Hasilnya di-cache,
+                # jadi dibaca dari primary: secondary yang tertinggal bisa belum punya meal baru
+                ranked, next_cursor = next_page(index.search(search, limit + 1, after, only), limit, key=list)
+                meals = await find_in_order([meal_id for _, meal_id in ranked], projection)
+
+                # Jangan simpan hasil yang sudah basi karena ada perubahan meal di tengah jalan
+                if search_cache.generation == generation:
+                    search_cache.set(key, (meals, next_cursor))
+            else:
+                meals, next_cursor = cached
+            meals = await with_favourited(meals, user, catalogue_favourites, session)
+        return json_response(encode_page(meals, next_cursor), headers={"ETag": etag})
+
+    query = approved_meals(category, area)
+    if stream:
+        documents = batches(catalogue_meals.find(after_cursor(query, cursor), projection).sort("_id", 1))
+        return stream_documents(documents, encode_one, stream, "meals", add_favourited)
+
+    async with catalogue_session() as session:
+        etag = await page_etag(request, user, catalogue_counters, session)
+        if not_modified(request, etag):
+            return not_modified_response(etag)
+
+        meals, next_cursor = await paginate(catalogue_meals, query, limit, cursor, projection, session)
+        meals = await with_favourited(meals, user, catalogue_favourites, session)
+    return json_response(encode_page(meals, next_cursor), headers={"ETag": etag})
+
+
+@router.get(
+    "/meals/facets",
+    response_description="Meal counts per category and area",
+    response_model=FacetCounts,
+)
+async def meal_facets(
     search: str = None,
+    fuzzy: bool = False,
+    category: str = None,
+    area: str = None,
 ):
     """
-    List meals with optional search on name, ingredients, and area,
-    supporting multiple keywords.
+    Count approved meals per category (within `area`) and per area (within
+    `category`), optionally restricted to the matches of `search`.
+
+    Counts come from the in-memory facet index, no aggregation runs per request.
     """
-    # Buat filter untuk pencarian
-    query = {
-        "verification_status": "approved"
-    }
-    
+    ids = None
     if search:
-        keywords = search.split()  # Pecah search menjadi array kata kunci
-        query["$and"] = [  # Semua kata kunci harus cocok
-            {
-                "$or": [
-                    {"name": {"$regex": keyword, "$options": "i"}},  # Case-insensitive name search
-                    {"area": {"$regex": keyword, "$options": "i"}},  # Case-insensitive area search
-                    {
-                        "ingredients": {
-                            "$elemMatch": {"name": {"$regex": keyword, "$options": "i"}}
-                        }
-                    },
-                ]
-            }
-            for keyword in keywords
-        ]
+        index = fuzzy_index if fuzzy else search_index
+        ids = [meal_id for _, meal_id in index.search(search)]
+    return facet_index.counts(category, area, ids)
 
-    # if search:
-    #     query["$text"] = {"$search": search}  # Pencarian menggunakan text index
 
 
-    # Cari data sesuai query
-    meals = await meal_collection.find(query).to_list(limit)
-    return MealCollection(meals=meals)
 
+@router.get("/meals/mymeals", response_model=Union[MealSummaryCollection, MealCollection])
+async def User_meals(request: Request, user : CurrentUser, limit: Limit = 20, cursor: str = None, stream: StreamFormat = None, view: MealView = "summary") :
+    projection, encode_one, encode_page = MEAL_VIEWS_BY_ALIAS[view]
+    if stream:
+        documents = batches(meal_collection.find(after_cursor(authored_by(user), cursor), projection).sort("_id", 1))
+        return stream_documents(documents, encode_one, stream, "meals", lambda batch: with_favourited(batch, user))
 
+    etag = await page_etag(request, user)
+    if not_modified(request, etag):
+        return not_modified_response(etag)
 
+    meals, next_cursor = await paginate(meal_collection, authored_by(user), limit, cursor, projection)
+    return json_response(encode_page(await with_favourited(meals, user), next_cursor), headers={"ETag": etag})
 
-@router.get("/meals/mymeals", response_model=MealCollection)
-async def User_meals(user : CurrentUser) :
-    return MealCollection(meals = await meal_collection.find({"author" : user["email"]}).to_list(100))
+
+@router.get(
+    "/meals/trending",
+    response_description="Trending meals",
+    response_model=Union[MealSummaryCollection, MealCollection],
+    response_model_by_alias=False,
+)
+async def trending_meals(view: MealView = "summary"):
+    """
+    Meals ranked by recent views and favourites, with older activity decaying
+    away. The list is refreshed in the background, this only reads memory.
+    """
+    _, _, encode_page = MEAL_VIEWS[view]
+    return json_response(encode_page(trending.top))
+
+
+@router.get(
+    "/meals/cook",
+    response_description="Meals you can cook with your ingredients",
+    response_model=PantryMatchCollection,
+    response_model_by_alias=False,
+)
+async def what_can_i_cook(
+    ingredients: list[str] = Query(...),
+    max_missing: int = Query(2, ge=0, le=2),
+    limit: Limit = 20,
+    cursor: str = None,
+):
+    """
+    Rank approved meals by how well `ingredients` cover them: full matches
+    first, then meals missing one or two ingredients.
+    """
+    after = None
+    if cursor:
+        try:
+            missing, matched, meal_id = decode_cursor(cursor)
+            after = (int(missing), int(matched), str(meal_id))
+        except (TypeError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+
+    ranked, next_cursor = next_page(
+        pantry_index.match(ingredients, max_missing, after)[:limit + 1], limit, key=list
+    )
+    meals = [
+        {**meal, "missing": pantry_index.missing(str(meal["_id"]), ingredients)}
+        for meal in await find_in_order([meal_id for _, _, meal_id in ranked])
+    ]
+    return json_response(encode_matches(meals, next_cursor))
 
 
 @router.get(
@@ -106,9 +318,12 @@ async def User_meals(user : CurrentUser) :
     response_model=MealResponse,
     response_model_by_alias=False,
 )
-async def show_meals(id: str, user: CurrentUser):
+async def show_meals(id: str, request: Request, user: CurrentUser):
     """
     Get the record for a specific meal, looked up by `id`.
+
+    The response carries an `ETag`; with a matching `If-None-Match` only the
+    meal's version is read and a 304 is returned.
     """
 
     # Validasi ObjectId
@@ -118,38 +333,75 @@ async def show_meals(id: str, user: CurrentUser):
             detail="Invalid meal ID"
         )
     
-    # Cari meal berdasarkan ID
-    meal = await meal_collection.find_one({"_id": ObjectId(id)})
+    # Revalidasi cukup membaca versi meal, bukan seluruh dokumen
+    conditional = request.headers.get("if-none-match") is not None
+    meal, favourited = await asyncio.gather(
+        catalogue_meals.find_one({"_id": ObjectId(id)}, {"version": 1} if conditional else None),
+        catalogue_favourites.find_one(favourite_of(user, id), {"_id": 1}),
+    )
     if not meal:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
             detail=f"Meal {id} not found"
         )
     
-    # Default favourited = False jika user tidak ada
-    favourited = False
-
-    is_favourited = await favourites_collection.find_one({
-        'user_id': ObjectId(user['_id']),
-        'meal._id': ObjectId(id)
-    })
-    if is_favourited:
-        favourited = True
-    
+    # View ditulis ke MongoDB per batch oleh job di background. Key-nya id dalam bentuk
+    # yang sama dengan str(meal["_id"]), dipakai TrendingTracker.refresh
+    meal_id = str(ObjectId(id))
+    view_buffer.add(meal_id)
+    trending.record(meal_id, VIEW_WEIGHT)
+
+    favourited = favourited is not None
+    etag = meal_etag(meal, favourited)
+    if conditional:
+        if not_modified(request, etag):
+            return not_modified_response(etag)
+        meal = await catalogue_meals.find_one({"_id": ObjectId(id)})
+        if not meal:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, 
+                detail=f"Meal {id} not found"
+            )
+        # ETag dari versi dokumen yang benar-benar dikirim
+        etag = meal_etag(meal, favourited)
+
     # Return response dengan field favourited
-    return MealResponse(
-        **meal,
-        favourited=favourited
-    )
+    return json_response(encode_meal({**meal, "favourited": favourited}), headers={"ETag": etag})
 
 
 @router.post("/meals/{id}/favourite")
 async def add_meal_to_favourite(id : str, user : CurrentUser) :
-    existing_favourite = await favourites_collection.find_one_and_delete({'user_id' : ObjectId(user["_id"]), 'meal._id' : ObjectId(id)})
-    if existing_favourite :
+    """
+    Toggle the meal in the user's favourites.
+    """
+    # Validasi ObjectId
+    if not ObjectId.is_valid(id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, 
+            detail="Invalid meal ID"
+        )
+
+    favourite = favourite_of(user, id)
+    removed = await favourites_collection.find_one_and_delete(favourite, projection={'_id' : 1})
+    if removed is not None :
+        # Tidak pernah di bawah nol, rekonsiliasi stats memperbaiki sisa selisihnya
+        await meal_collection.update_one({'_id' : ObjectId(id), 'favourite_count' : {'$gt' : 0}}, {'$inc' : {'favourite_count' : -1}})
+        # Dikurangi dari hari favourite itu dibuat
+        stats_buffer.add({'favourites' : -1}, day={'favourites' : -1}, at=removed['_id'].generation_time)
+        await bump(favourites_counter(user))
         return {'detail' : f'Meal {id} deleted from favourite'}
-    meal = await meal_collection.find_one({'_id' : ObjectId(id)})
-    favourite = await favourites_collection.insert_one({'user_id' : user['_id'], 'meal_id' : meal['_id']})
+
+    if not await meal_collection.count_documents({'_id' : ObjectId(id)}, limit=1) :
+        raise HTTPException(status_code=404, detail=f"Meal {id} not found")
+
+    # Upsert pada index unik (user_id, meal_id) tidak pernah membuat duplikat,
+    # counter hanya naik untuk request yang benar-benar menambah favourite
+    added = await favourites_collection.update_one(favourite, {'$setOnInsert' : favourite}, upsert=True)
+    if added.upserted_id is not None :
+        await meal_collection.update_one({'_id' : ObjectId(id)}, {'$inc' : {'favourite_count' : 1}})
+        trending.record(str(ObjectId(id)), FAVOURITE_WEIGHT)
+        stats_buffer.add({'favourites' : 1}, day={'favourites' : 1})
+    await bump(favourites_counter(user))
     return {'detail' : f'Meal {id} added to favourite'}
 
 
@@ -175,34 +427,33 @@ async def update_meal(id: str, meal: UpdateMealModel, user:CurrentUser):
             detail="Invalid meal ID"
         )
     
-
-    #Checking is it the owner who want to edit or not
-    if not await is_owner(id, user):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="This meal don't belong to you"
-        )
-    
     meal = {
         k: v for k, v in meal.model_dump(by_alias=True).items() if v is not None
     }
 
+    # Hanya pemilik yang bisa edit: filter `author` membuat cek dan update satu operasi
+    owned = owned_meal(id, user)
+
     if len(meal) >= 1:
-        update_result = await meal_collection.find_one_and_update(
-            {"_id": ObjectId(id)},
-            {"$set": meal},
-            return_document=ReturnDocument.AFTER,
+        # Dokumen sebelum update dibutuhkan untuk statistik category/area
+        before = await meal_collection.find_one_and_update(
+            owned,
+            versioned({"$set": meal}),
+            return_document=ReturnDocument.BEFORE,
         )
-        if update_result is not None:
+        if before is not None:
+            update_result = {**before, **meal, "version": before.get("version", 0) + 1}
+            stats_buffer.meal_changed(before, update_result)
+            meal_saved(update_result)
+            await bump(CATALOGUE)
             return update_result
-        else:
-            raise HTTPException(status_code=404, detail=f"Meal {id} not found")
+        raise await ownership_error(id)
 
     # The update is empty, but we should still return the matching document:
-    if (existing_meal := await meal_collection.find_one({"_id": id})) is not None:
+    if (existing_meal := await meal_collection.find_one(owned)) is not None:
         return existing_meal
 
-    raise HTTPException(status_code=404, detail=f"Student {id} not found")
+    raise await ownership_error(id)
 
 
 @router.delete("/meals/{id}", response_description="Delete a meal")
@@ -217,20 +468,22 @@ async def delete_meal(id: str, user : CurrentUser):
             detail="Invalid meal ID"
         )
     
+    # Hanya pemilik yang bisa menghapus
+    deleted = await meal_collection.find_one_and_delete(
+        owned_meal(id, user),
+        projection={"verification_status": 1, "category": 1, "area": 1},
+    )
 
-    #Checking is it the owner who want to edit or not
-    if not await is_owner(id, user):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="This meal don't belong to you"
-        )
-
-    delete_result = await meal_collection.delete_one({"_id": ObjectId(id)})
-
-    if delete_result.deleted_count == 1:
+    if deleted is not None:
+        stats_buffer.meal_changed(deleted, None)
+        # Index di memori memakai id dari MongoDB (hex huruf kecil), bukan id dari path
+        meal_id = str(deleted["_id"])
+        meal_deleted(meal_id)
+        trending.forget(meal_id)
+        await bump(CATALOGUE)
         return Response(status_code=status.HTTP_204_NO_CONTENT)
 
-    raise HTTPException(status_code=404, detail=f"Meal {id} not found")
+    raise await ownership_error(id)
 
 
 
@@ -251,37 +504,46 @@ async def update_image_url(id: str, user : CurrentUser ,file: UploadFile = File(
             detail="Invalid meal ID"
         )
 
-
-    #Checking is it the owner who want to edit or not
-    if not await is_owner(id, user):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="This meal don't belong to you"
-        )
-
     # Cek apakah file yang diupload adalah gambar
     if not file.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="File must be an image")
 
-    file_path = UPLOAD_DIR / file.filename
+    # Tulis ke file sementara per chunk, nama file = hash SHA-256 isinya
+    image = await stage_image(file)
 
-    # Simpan file ke direktori
-    with file_path.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
     # Generate URL untuk gambar yang baru
-    new_image_url = f"http://{DOMAIN}/static/images/{file.filename}"
+    new_image_url = f"http://{DOMAIN}/static/images/{image.name}"
+
+    # Hanya meal milik user ini yang boleh diubah
+    owned = owned_meal(id, user)
+    try:
+        # Cek kepemilikan dulu supaya upload ke meal orang lain tidak ikut tersimpan
+        if not await meal_collection.count_documents(owned, limit=1):
+            raise await ownership_error(id)
+
+        # File dipindahkan sebelum imageUrl ditulis, jadi URL baru langsung bisa diakses.
+        # Nama file berbasis hash, file yang tertinggal karena update gagal tidak merusak apa pun
+        await run_in_threadpool(image.commit)
+        updated = await meal_collection.find_one_and_update(
+            owned,
+            versioned({"$set": {"imageUrl": new_image_url}}),
+            projection=INDEX_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+    except BaseException:
+        await run_in_threadpool(image.discard)
+        raise
 
-    # Update meal di MongoDB
-    update_result = await meal_collection.update_one(
-        {"_id": ObjectId(id)},  # mencari meal berdasarkan ID
-        {"$set": {"imageUrl": new_image_url}}  # update field `imageUrl`
-    )
+    if updated is None:
+        # Meal dihapus di antara cek dan update
+        raise await ownership_error(id)
 
-    if update_result.modified_count == 0:
-        raise HTTPException(
-            status_code=404, detail=f"Meal with ID {id} not found or imageUrl already up-to-date"
-        )
+    # imageUrl ada di halaman pencarian yang di-cache, jadi cache dibersihkan sebelum ETag berubah
+    meal_saved(updated)
+    await bump(CATALOGUE)
+
+    # Thumbnail dibuat di process pool, tidak menahan response
+    thumbnails.enqueue(image.name)
 
     # Kembalikan URL baru atau data meal yang sudah diupdate
     
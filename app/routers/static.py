@@ -1,20 +1,156 @@
-from fastapi import APIRouter, HTTPException
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
 from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+
+from ..cache import FileCache, FileEntry
+from ..etag import not_modified
+from ..images import image_path, is_content_addressed, is_original, stat_image
+from ..thumbnails import thumbnails, variant_candidates
 
-from ..routers.meals import UPLOAD_DIR
+load_dotenv()
 
 router = APIRouter(tags=["Static"])
 
+# Nama content-addressed tidak pernah berubah isinya
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# Pengganti sementara untuk `?w=` selama varian yang diminta belum ada
+PROVISIONAL = "public, max-age=60"
+
+BYTE_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+image_cache = FileCache(
+    max_bytes=int(os.getenv("IMAGE_CACHE_BYTES", 64 * 1024 * 1024)),
+    max_file_size=int(os.getenv("IMAGE_CACHE_MAX_FILE", 256 * 1024)),
+)
+
+
+def image_not_found() -> HTTPException:
+    return HTTPException(status_code=404, detail="Image not found")
+
+
+def byte_range(request: Request, entry: FileEntry):
+    """
+    The `(start, end)` of a single satisfiable `Range` to serve, None to serve
+    the whole file. Multiple ranges are answered with the whole file.
+    """
+    header = request.headers.get("range")
+    if header is None:
+        return None
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range != entry.etag:
+        return None
+    match = BYTE_RANGE.fullmatch(header.strip())
+    if match is None:
+        return None
+
+    size = len(entry.content)
+    first, last = match.groups()
+    if first:
+        if last and int(last) < int(first):
+            # Range tidak valid diabaikan (RFC 9110), kirim seluruh file
+            return None
+        start, end = int(first), min(int(last) + 1, size) if last else size
+    elif last:
+        start, end = max(size - int(last), 0), size
+    else:
+        return None
+    if start >= size or start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+def memory_response(request: Request, entry: FileEntry, headers: dict) -> Response:
+    headers = {**headers, "ETag": entry.etag, "Last-Modified": entry.last_modified, "Accept-Ranges": "bytes"}
+    selected = byte_range(request, entry)
+    if selected is None:
+        return Response(entry.content, media_type=entry.media_type, headers=headers)
+
+    # Slice memoryview tidak menyalin isi file
+    start, end = selected
+    headers["Content-Range"] = f"bytes {start}-{end - 1}/{len(entry.content)}"
+    return Response(
+        entry.content[start:end],
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=entry.media_type,
+        headers=headers,
+    )
+
+
+async def serve_image(request: Request, name: str, cache_control: str = None):
+    """
+    Serve `name` from the memory cache, or from disk. Returns None when the
+    file does not exist. `cache_control` overrides the default for the name.
+    """
+    immutable = is_content_addressed(name)
+    headers = {"Cache-Control": cache_control or (IMMUTABLE if immutable else REVALIDATE)}
+
+    entry = image_cache.get(name) if immutable else None
+    if entry is None:
+        path = image_path(name)
+        stat_result = await run_in_threadpool(stat_image, name)
+        if stat_result is None:
+            return None
+
+        # Nama content-addressed sudah berupa hash isinya
+        if immutable:
+            etag = f'"{os.path.splitext(name)[0]}"'
+        else:
+            etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+        if not_modified(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={**headers, "ETag": etag})
+
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if not immutable or stat_result.st_size > image_cache.max_file_size:
+            # File besar dikirim langsung dari disk, termasuk Range
+            return FileResponse(path, stat_result=stat_result, media_type=media_type, headers={**headers, "ETag": etag})
+
+        content = await run_in_threadpool(path.read_bytes)
+        entry = image_cache.set(name, content, etag, media_type, formatdate(stat_result.st_mtime, usegmt=True))
+
+    if not_modified(request, entry.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={**headers, "ETag": entry.etag})
+    return memory_response(request, entry, headers)
+
+
 @router.get("/static/images/{filename}")
-async def get_image(filename: str):
+async def get_image(filename: str, request: Request, w: int = Query(None, ge=1)):
     """
     Retrieve an image by its filename.
-    """
-    file_path = UPLOAD_DIR / filename
 
-    # Check if the file exists
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="Image not found")
+    With `w`, the smallest resized variant at least `w` pixels wide is served.
+    The original is served while the variants are not generated yet. `w` is
+    ignored on variant names, they are served as they are.
+
+    Content-addressed images are cached by clients forever, all images support
+    `If-None-Match` and `Range`.
+    """
+    if w is not None and is_original(filename):
+        # Hanya varian yang diminta (atau original bila memang tidak ada varian untuk `w`)
+        # yang boleh di-cache selamanya di URL ini; pengganti lain hanya sebentar
+        candidates = variant_candidates(filename, w)
+        for index, variant in enumerate(candidates):
+            response = await serve_image(request, variant, None if index == 0 else PROVISIONAL)
+            if response is not None:
+                return response
+        # Belum ada varian: buat di background, sementara kirim original
+        response = await serve_image(request, filename, PROVISIONAL if candidates else None)
+        if response is not None:
+            thumbnails.enqueue(filename)
+            return response
+        raise image_not_found()
 
-    # Return the image as a file response
-    return FileResponse(file_path)
+    response = await serve_image(request, filename)
+    if response is None:
+        raise image_not_found()
+    return response
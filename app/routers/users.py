@@ -1,4 +1,6 @@
-from fastapi import APIRouter, status, HTTPException, Depends
+from typing import Union
+
+from fastapi import APIRouter, status, HTTPException, Depends, Request
 from datetime import datetime
 from fastapi.security import OAuth2PasswordRequestForm
 import jwt
@@ -10,8 +12,13 @@ from bson import ObjectId
 from pydantic import EmailStr
 
 from app.dependencies import CurrentUser
-from ..database.config import user_collection, meal_collection, favourites_collection
-from ..database.models import UserResponseModel, MealCollection, MealModel
+from ..database.config import user_collection, meal_collection, catalogue_favourites, catalogue_counters, catalogue_session
+from ..etag import not_modified, not_modified_response, page_etag
+from ..database.models import UserResponseModel, MealCollection, MealSummaryCollection, MealView
+from ..pagination import Limit, next_page
+from ..queries import favourite_meals_pipeline
+from ..streaming import StreamFormat, batches, json_response, stream_documents
+from .meals import MEAL_VIEWS_BY_ALIAS
 
 
 router = APIRouter(tags=["Users"], prefix="/users")
@@ -26,50 +33,40 @@ async def get_user(user : CurrentUser) :
     return user
 
 
-@router.get("/favourite-meals", response_model=MealCollection)
-async def get_favourite_meals(user : CurrentUser) :
-    pipeline = [
-        {
-            "$match": {
-                "user_id": ObjectId(user['_id'])
-            }
-        },
-        {
-            "$lookup": {
-                "from": "meals",
-                "localField": "meal_id",
-                "foreignField": "_id",
-                "as": "meal_details"
-            }
-        },
-        {
-            "$unwind": "$meal_details"
-        },
-        {
-            "$project": {
-                "meal_details._id": 1,
-                "meal_details.name": 1,
-                "meal_details.category": 1,
-                "meal_details.area": 1,
-                "meal_details.instructions": 1,
-                "meal_details.youtubeUrl": 1,
-                "meal_details.imageUrl": 1,
-                "meal_details.ingredients": 1,
-                "meal_details.author": 1
-            }
-        }
+@router.get("/favourite-meals", response_model=Union[MealSummaryCollection, MealCollection])
+async def get_favourite_meals(request: Request, user : CurrentUser, limit: Limit = 20, cursor: str = None, stream: StreamFormat = None, view: MealView = "summary") :
+    projection, encode_one, encode_page = MEAL_VIEWS_BY_ALIAS[view]
+
+    if stream:
+        async def favourite_meals(batch):
+            return [
+                {**document['meal_details'], 'favourited': True}
+                for document in batch if 'meal_details' in document
+            ]
+
+        documents = batches(catalogue_favourites.aggregate(favourite_meals_pipeline(user, cursor, projection)))
+        return stream_documents(documents, encode_one, stream, "meals", favourite_meals)
+
+    # Keyset pagination pada _id favourites
+    pipeline = favourite_meals_pipeline(user, cursor, projection, limit + 1)
+
+    async with catalogue_session() as session:
+        etag = await page_etag(request, user, catalogue_counters, session)
+        if not_modified(request, etag):
+            return not_modified_response(etag)
+
+        # Menjalankan pipeline agregasi
+        results = catalogue_favourites.aggregate(pipeline, session=session)
+        documents = await results.to_list(limit + 1)
+
+    documents, next_cursor = next_page(documents, limit)
+
+    # Mengambil meal_details dari hasil agregasi
+    meals = [
+        {**document['meal_details'], 'favourited': True}
+        for document in documents if 'meal_details' in document
     ]
     
-    # Menjalankan pipeline agregasi
-    cursor = favourites_collection.aggregate(pipeline)
-    
-    # Mengonversi hasil cursor menjadi list of meals
-    meals = []
-    async for document in cursor:
-        meal_data = document['meal_details']
-        meal = MealModel(**meal_data)  # Membuat model MealModel dari data meal_details
-        meals.append(meal)
-    
-    # Mengembalikan MealCollection yang berisi list meals
-    return MealCollection(meals=meals)
+    # Mengembalikan dokumen yang langsung di-encode sebagai MealCollection
+    return json_response(encode_page(meals, next_cursor), headers={"ETag": etag})
 
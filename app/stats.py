@@ -0,0 +1,196 @@
+import asyncio
+import math
+import os
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+from .queries import daily_counts_pipeline, user_filter
+
+load_dotenv()
+
+STATS_ID = "global"
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", 5))
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", 60 * 60))
+# Berapa hari terakhir yang dihitung ulang oleh rekonsiliasi
+STATS_RECONCILE_DAYS = int(os.getenv("STATS_RECONCILE_DAYS", 90))
+
+
+def day_key(value: datetime = None) -> str:
+    return f"daily:{(value or datetime.now(timezone.utc)).strftime('%Y-%m-%d')}"
+
+
+def field_key(value) -> str:
+    # Nama field MongoDB tidak boleh berisi `.` atau diawali `$`
+    return str(value).replace(".", "．").replace("$", "＄")
+
+
+def meal_delta(before: dict = None, after: dict = None) -> Counter:
+    """
+    `$inc`s on the stats document for a meal going from `before` to `after`
+    (None for an insert or a delete).
+    """
+    delta = Counter()
+    for meal, sign in ((before, -1), (after, 1)):
+        if meal is not None:
+            delta[f"meals.{field_key(meal.get('verification_status'))}"] += sign
+            delta[f"categories.{field_key(meal.get('category'))}"] += sign
+            delta[f"areas.{field_key(meal.get('area'))}"] += sign
+    return delta
+
+
+class StatsBuffer:
+    """
+    Increments for the `/admin/stats` documents, collected in memory and
+    written as one `bulk_write` per flush like the view counts.
+    """
+
+    def __init__(self):
+        self.counts: defaultdict[str, Counter] = defaultdict(Counter)
+
+    def add(self, delta: dict, day: dict = None, at: datetime = None):
+        self.counts[STATS_ID].update(delta)
+        if day:
+            self.counts[day_key(at)].update(day)
+
+    def meal_changed(self, before: dict = None, after: dict = None):
+        self.add(meal_delta(before, after))
+
+    async def flush(self, collection):
+        counts, self.counts = self.counts, defaultdict(Counter)
+        operations = []
+        for document_id, delta in counts.items():
+            increments = {field: value for field, value in delta.items() if value}
+            if increments:
+                operations.append(UpdateOne({"_id": document_id}, {"$inc": increments}, upsert=True))
+        if not operations:
+            return
+        try:
+            await collection.bulk_write(operations, ordered=False)
+        except Exception:
+            # Simpan lagi untuk flush berikutnya
+            for document_id, delta in counts.items():
+                self.counts[document_id].update(delta)
+            raise
+
+
+async def meal_counts(meals) -> dict:
+    """
+    Meals per status, category and area in one pass over the collection.
+    """
+    fields = {"meals": "verification_status", "categories": "category", "areas": "area"}
+    pipeline = [{"$facet": {
+        name: [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}] for name, field in fields.items()
+    }}]
+    [facets] = await meals.aggregate(pipeline).to_list(1)
+    return {
+        name: {field_key(group["_id"]): group["count"] for group in groups}
+        for name, groups in facets.items()
+    }
+
+
+async def daily_counts(collection, since: datetime) -> dict:
+    """
+    Documents per day of their `_id` timestamp, from `since` on.
+    """
+    return {f"daily:{group['_id']}": group["count"] async for group in collection.aggregate(daily_counts_pipeline(since))}
+
+
+async def reconcile_favourite_counts(meals, favourites) -> int:
+    """
+    Set `favourite_count` on every meal to its number of favourites. Also
+    backfills meals favourited before the counter existed. Returns the number
+    of meals corrected.
+    """
+    pipeline = [{"$group": {"_id": "$meal_id", "count": {"$sum": 1}}}]
+    counts = {group["_id"]: group["count"] async for group in favourites.aggregate(pipeline, allowDiskUse=True)}
+
+    operations = []
+    corrected = 0
+    async for meal in meals.find({}, {"favourite_count": 1}):
+        count = counts.get(meal["_id"], 0)
+        if meal.get("favourite_count") != count:
+            operations.append(UpdateOne({"_id": meal["_id"]}, {"$set": {"favourite_count": count}}))
+        if len(operations) == 1000:
+            await meals.bulk_write(operations, ordered=False)
+            corrected += len(operations)
+            operations = []
+    if operations:
+        await meals.bulk_write(operations, ordered=False)
+        corrected += len(operations)
+    return corrected
+
+
+async def reconcile(stats_collection, users, meals, favourites, days: int = STATS_RECONCILE_DAYS):
+    """
+    Recompute the stats documents and the per-meal `favourite_count` from the
+    collections, overwriting any drift of the incremental counters. Daily
+    counters older than `days` are kept.
+    """
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    user_total, verified, favourite_total, meal_totals, signups, favourites_added = await asyncio.gather(
+        users.estimated_document_count(),
+        # Bentuk query yang sama dengan filter direktori admin, dihitung dari index saja
+        users.count_documents(user_filter(verified=True)),
+        favourites.estimated_document_count(),
+        meal_counts(meals),
+        daily_counts(users, since),
+        daily_counts(favourites, since),
+    )
+
+    operations = [
+        UpdateOne(
+            {"_id": STATS_ID},
+            {"$set": {
+                "users": user_total,
+                "verified_users": verified,
+                "favourites": favourite_total,
+                **meal_totals,
+                "reconciled_at": datetime.now(timezone.utc),
+            }},
+            upsert=True,
+        )
+    ]
+    day = since
+    while day <= datetime.now(timezone.utc):
+        key = day_key(day)
+        operations.append(UpdateOne(
+            {"_id": key},
+            {"$set": {"signups": signups.get(key, 0), "favourites": favourites_added.get(key, 0)}},
+            upsert=True,
+        ))
+        day += timedelta(days=1)
+    await stats_collection.bulk_write(operations, ordered=False)
+    await reconcile_favourite_counts(meals, favourites)
+
+
+async def run_stats_jobs(stats_collection, users, meals, favourites):
+    """
+    Flush buffered increments often and reconcile now and then, until cancelled.
+    """
+    # Dokumen stats belum ada (deploy pertama): hitung penuh sekali di awal
+    last_reconcile = time.monotonic()
+    try:
+        if await stats_collection.find_one({"_id": STATS_ID}, {"_id": 1}) is None:
+            last_reconcile = -math.inf
+    except Exception as e:
+        print(f"Stats job failed: {e}")
+        last_reconcile = -math.inf
+    try:
+        while True:
+            try:
+                await stats_buffer.flush(stats_collection)
+                if time.monotonic() - last_reconcile >= STATS_RECONCILE_INTERVAL:
+                    await reconcile(stats_collection, users, meals, favourites)
+                    last_reconcile = time.monotonic()
+            except Exception as e:
+                print(f"Stats job failed: {e}")
+            await asyncio.sleep(STATS_FLUSH_INTERVAL)
+    finally:
+        await stats_buffer.flush(stats_collection)
+
+
+stats_buffer = StatsBuffer()
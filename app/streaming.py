@@ -0,0 +1,107 @@
+import json
+from typing import Literal, Optional
+
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+
+StreamFormat = Optional[Literal["ndjson", "json"]]
+
+BATCH_SIZE = 100
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+
+def document_projector(model, by_alias: bool = False):
+    """
+    Pick the fields of a response `model` from a raw MongoDB document. Like
+    `response_model_by_alias`, `by_alias` decides whether `_id` is written as
+    `_id` or as `id`. No model instance is built, documents from our own
+    collections are trusted.
+    """
+    fields = [
+        (
+            field.alias or name if by_alias else name,
+            field.alias or name,
+            None if field.is_required() else field.get_default(call_default_factory=True),
+        )
+        for name, field in model.model_fields.items()
+    ]
+
+    def project(document: dict) -> dict:
+        return {output: document.get(key, default) for output, key, default in fields}
+
+    return project
+
+
+def dumps(value) -> bytes:
+    # ObjectId (dan tipe BSON lain) ditulis sebagai string
+    return json.dumps(value, default=str, separators=(",", ":")).encode()
+
+
+def document_encoder(model, by_alias: bool = False):
+    project = document_projector(model, by_alias)
+
+    def encode(document: dict) -> bytes:
+        return dumps(project(document))
+
+    return encode
+
+
+def collection_encoder(model, key: str, by_alias: bool = False):
+    """
+    Encode a page as `{key: [...], "next_cursor": ...}` in one pass, for
+    handlers that return raw documents instead of validating them into a
+    collection model and then again through `response_model`.
+    """
+    project = document_projector(model, by_alias)
+
+    def encode_page(documents: list, next_cursor: str = None, **extra) -> bytes:
+        return dumps({key: [project(document) for document in documents], "next_cursor": next_cursor, **extra})
+
+    return encode_page
+
+
+def json_response(content: bytes, status_code: int = 200, headers: dict = None) -> Response:
+    return Response(content=content, status_code=status_code, media_type="application/json", headers=headers)
+
+
+async def batches(cursor, size: int = BATCH_SIZE):
+    batch = []
+    async for document in cursor:
+        batch.append(document)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def stream_documents(documents, encode, format: str, key: str, prepare=None) -> StreamingResponse:
+    """
+    Stream batches of documents as NDJSON or as a chunked `{key: [...]}` JSON
+    object. Only one batch is held in memory at a time; `prepare` may rewrite
+    each batch (e.g. add per-user flags) before it is encoded.
+    """
+    async def ndjson():
+        async for batch in documents:
+            if prepare is not None:
+                batch = await prepare(batch)
+            yield b"".join(encode(document) + b"\n" for document in batch)
+
+    async def json_array():
+        yield b'{"' + key.encode() + b'":['
+        separator = b""
+        async for batch in documents:
+            if prepare is not None:
+                batch = await prepare(batch)
+            chunk = b",".join(encode(document) for document in batch)
+            if chunk:
+                yield separator + chunk
+                separator = b","
+        yield b'],"next_cursor":null}'
+
+    body = ndjson() if format == "ndjson" else json_array()
+    return StreamingResponse(body, media_type=MEDIA_TYPES[format])
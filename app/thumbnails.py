@@ -0,0 +1,163 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from .images import TMP_DIR, image_path, is_original
+
+load_dotenv()
+
+# Lebar varian yang dibuat untuk setiap upload
+VARIANT_WIDTHS = (160, 320, 640)
+VARIANT_FORMAT = "webp"
+VARIANT_QUALITY = 80
+FINISHED_LIMIT = 100_000
+
+
+def variant_name(name: str, width: int) -> str:
+    return f"{Path(name).stem}_w{width}.{VARIANT_FORMAT}"
+
+
+def variant_path(name: str, width: int) -> Path:
+    # Disimpan di direktori shard yang sama dengan gambar aslinya
+    return image_path(variant_name(name, width))
+
+
+def render_variants(source: str, targets: list[tuple[int, str]], tmp_dir: str) -> list[int]:
+    """
+    Resize `source` to every `(width, path)` in `targets`. Runs in a worker
+    process. Widths not smaller than the original are skipped, those requests
+    are served the original. Returns the widths written.
+    """
+    from PIL import Image, ImageOps
+
+    written = []
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        for width, target in sorted(targets, reverse=True):
+            if width >= image.width:
+                continue
+            height = max(1, round(image.height * width / image.width))
+            # Resize dari varian sebelumnya yang lebih besar, lebih cepat dari original
+            image = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+            fd, temp = tempfile.mkstemp(dir=tmp_dir)
+            with os.fdopen(fd, "wb") as buffer:
+                image.save(buffer, VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4)
+            os.replace(temp, target)
+            written.append(width)
+    return written
+
+
+class ThumbnailPipeline:
+    """
+    Generates the resized variants of uploaded images in a process pool.
+
+    At most `concurrency` images are rendered at once and at most
+    `queue_limit` are pending. Jobs past that are dropped: the image is still
+    served at full size, and its variants are queued again on the next `?w=`
+    request.
+    """
+
+    def __init__(self, size: int, concurrency: int, queue_limit: int):
+        self.size = size
+        self.concurrency = concurrency
+        self.queue_limit = queue_limit
+        self.executor = None
+        self.semaphore = None
+        self.pending: dict[str, asyncio.Task] = {}
+        # Gambar yang sudah diproses di proses ini, termasuk yang terlalu kecil untuk varian
+        self.finished: set[str] = set()
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def enqueue(self, name: str) -> bool:
+        # Hanya original yang punya varian; varian dari varian tidak pernah dibuat
+        if not is_original(name):
+            return False
+        if name in self.pending or name in self.finished:
+            return True
+        if len(self.pending) >= self.queue_limit:
+            self.dropped += 1
+            return False
+        task = asyncio.create_task(self.render(name))
+        self.pending[name] = task
+        task.add_done_callback(lambda _: self.pending.pop(name, None))
+        return True
+
+    async def render(self, name: str) -> list[int]:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.size,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+        # Path absolut, worker tidak bergantung pada cwd
+        targets = [
+            (width, str(variant_path(name, width).resolve()))
+            for width in VARIANT_WIDTHS if not variant_path(name, width).exists()
+        ]
+        if not targets:
+            self.finish(name)
+            return []
+
+        async with self.semaphore:
+            try:
+                written = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, render_variants, str(image_path(name).resolve()), targets, str(TMP_DIR.resolve())
+                )
+            except Exception as e:
+                self.failed += 1
+                print(f"Thumbnail generation failed for {name}: {e}")
+                return []
+        self.completed += 1
+        self.finish(name)
+        return written
+
+    def finish(self, name: str):
+        if len(self.finished) >= FINISHED_LIMIT:
+            self.finished.clear()
+        self.finished.add(name)
+
+    async def join(self):
+        await asyncio.gather(*self.pending.values(), return_exceptions=True)
+
+    def shutdown(self):
+        for task in self.pending.values():
+            task.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "concurrency": self.concurrency,
+            "pending": len(self.pending),
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+def variant_candidates(name: str, width: int) -> list[str]:
+    """
+    Names of the variants at least `width` wide, smallest first.
+    """
+    return [variant_name(name, candidate) for candidate in VARIANT_WIDTHS if candidate >= width]
+
+
+thumbnails = ThumbnailPipeline(
+    size=int(os.getenv("THUMBNAIL_POOL_SIZE", max(1, (os.cpu_count() or 1) // 2))),
+    concurrency=int(os.getenv("THUMBNAIL_CONCURRENCY", 2)),
+    queue_limit=int(os.getenv("THUMBNAIL_QUEUE_LIMIT", 256)),
+)
@@ -0,0 +1,127 @@
+"""
+Signup-burst mail throughput against a local `aiosmtpd` server.
+
+"before" sends every message like the old background task: its own
+connection per message (connect, EHLO, send, QUIT), `--before-concurrency`
+at a time (unbounded, a burst of fresh connections times out on the local
+server before it finishes). "after"
+submits the same burst to `MailDispatcher`. `--handshake-ms` delays each EHLO
+to stand in for the STARTTLS and login round trips of a real server, which
+is the cost persistent connections avoid.
+
+    pip install aiosmtpd
+    python -m benchmarks.mail_bench --messages 500 --handshake-ms 50
+"""
+import argparse
+import asyncio
+import os
+import socket
+import time
+
+os.environ.setdefault("MAIL_USERNAME", "bench")
+os.environ.setdefault("MAIL_PASSWORD", "bench")
+os.environ.setdefault("MAIL_FROM", "bench@example.com")
+
+import aiosmtplib  # noqa: E402
+from aiosmtpd.controller import Controller  # noqa: E402
+from fastapi_mail import ConnectionConfig  # noqa: E402
+
+from app.mail import MailDispatcher, verification_message  # noqa: E402
+
+
+class CountingHandler:
+    def __init__(self, handshake: float):
+        self.handshake = handshake
+        self.received = 0
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        await asyncio.sleep(self.handshake)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def local_config(port: int) -> ConnectionConfig:
+    return ConnectionConfig(
+        MAIL_USERNAME="bench",
+        MAIL_PASSWORD="bench",
+        MAIL_FROM="bench@example.com",
+        MAIL_PORT=port,
+        MAIL_SERVER="127.0.0.1",
+        MAIL_STARTTLS=False,
+        MAIL_SSL_TLS=False,
+        USE_CREDENTIALS=False,
+        VALIDATE_CERTS=False,
+    )
+
+
+async def before(messages: list, port: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(message):
+        async with semaphore:
+            await aiosmtplib.send(message, hostname="127.0.0.1", port=port, start_tls=False)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(message) for message in messages))
+    return time.perf_counter() - start
+
+
+async def after(messages: list, port: int, size: int, batch_size: int) -> tuple[float, dict]:
+    dispatcher = MailDispatcher(
+        local_config(port), size=size, queue_limit=len(messages), batch_size=batch_size,
+        max_attempts=3, backoff=0.1, idle_timeout=60,
+    )
+    dispatcher.start()
+    start = time.perf_counter()
+    for message in messages:
+        await dispatcher.submit(message)
+    await dispatcher.queue.join()
+    elapsed = time.perf_counter() - start
+    await dispatcher.stop()
+    return elapsed, dispatcher.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--handshake-ms", type=float, default=50)
+    parser.add_argument("--size", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--before-concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    messages = [verification_message(f"user{i}@example.com", "token") for i in range(args.messages)]
+
+    for label in ("before", "after"):
+        handler = CountingHandler(args.handshake_ms / 1000)
+        port = free_port()
+        controller = Controller(handler, hostname="127.0.0.1", port=port)
+        controller.start()
+        try:
+            if label == "before":
+                elapsed, stats = asyncio.run(before(messages, port, args.before_concurrency)), None
+            else:
+                elapsed, stats = asyncio.run(after(messages, port, args.size, args.batch_size))
+        finally:
+            controller.stop()
+
+        assert handler.received == args.messages, handler.received
+        print(f"{label:<8}{elapsed:8.2f}s  {args.messages / elapsed:8.0f} mails/s  {handler.connections:6} connections")
+        if stats:
+            print(f"\n{stats}")
+
+
+if __name__ == "__main__":
+    main()
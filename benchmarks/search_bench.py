@@ -0,0 +1,109 @@
+"""
+Compare the in-memory search indexes with the old `$regex` search on a
+synthetic catalogue.
+
+The regex path is reproduced in-process with `re` (same unanchored,
+case-insensitive OR over name, area and ingredient names per keyword) so the
+benchmark runs without a database; against MongoDB it is a COLLSCAN doing the
+same work plus BSON decoding.
+
+    python -m benchmarks.search_bench --meals 50000
+"""
+import argparse
+import random
+import re
+import statistics
+import time
+
+from app.indexes.search import InvertedIndex
+from app.indexes.trigram import TrigramIndex
+
+DISHES = ["ayam goreng", "rendang", "nasi goreng", "soto ayam", "gado gado", "sate",
+          "chicken curry", "beef stew", "fried rice", "noodle soup", "pancake", "omelette"]
+AREAS = ["Indonesia", "Malaysia", "Thailand", "Japan", "India", "Italy", "Mexico"]
+CATEGORIES = ["chicken", "beef", "seafood", "vegetarian", "dessert", "pasta"]
+INGREDIENTS = ["chicken", "beef", "rice", "egg", "garlic", "onion", "shallot", "chili",
+               "coconut milk", "soy sauce", "lemongrass", "ginger", "potato", "tomato",
+               "noodles", "shrimp", "tofu", "tempeh", "peanut", "lime"]
+
+QUERIES = {
+    "exact": ["chicken", "rendang", "rice egg", "coconut milk", "soto ayam indonesia"],
+    "typo": ["chiken", "randang", "coconat", "nodle soup", "omlette"],
+}
+
+
+def synthetic_meals(count: int, seed: int = 42) -> list[dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "_id": f"{i:024x}",
+            "name": f"{rng.choice(DISHES)} {rng.choice(['special', 'spicy', 'classic', ''])}".strip(),
+            "area": rng.choice(AREAS),
+            "category": rng.choice(CATEGORIES),
+            "ingredients": [{"name": name} for name in rng.sample(INGREDIENTS, rng.randint(3, 8))],
+            "verification_status": "approved",
+        }
+        for i in range(count)
+    ]
+
+
+def regex_search(meals: list[dict], search: str, limit: int) -> list[dict]:
+    patterns = [re.compile(re.escape(keyword), re.IGNORECASE) for keyword in search.split()]
+    results = []
+    for meal in meals:
+        if all(
+            pattern.search(meal["name"])
+            or pattern.search(meal["area"])
+            or any(pattern.search(ingredient["name"]) for ingredient in meal["ingredients"])
+            for pattern in patterns
+        ):
+            results.append(meal)
+            if len(results) == limit:
+                break
+    return results
+
+
+def timed(fn, repeat: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--meals", type=int, default=50_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    meals = synthetic_meals(args.meals)
+
+    start = time.perf_counter()
+    inverted, fuzzy = InvertedIndex(), TrigramIndex()
+    for meal in meals:
+        inverted.upsert(meal)
+        fuzzy.upsert(meal)
+    print(f"built indexes over {len(meals)} meals in {time.perf_counter() - start:.2f}s\n")
+
+    print(f"{'query':<28}{'path':<10}{'hits':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for kind, queries in QUERIES.items():
+        for query in queries:
+            paths = {
+                "regex": lambda: regex_search(meals, query, args.limit),
+                "inverted": lambda: inverted.search(query, args.limit),
+                "fuzzy": lambda: fuzzy.search(query, args.limit),
+            }
+            for path, fn in paths.items():
+                # Regex tanpa hasil harus memindai seluruh katalog
+                hits = len(fn())
+                p50, p99 = timed(fn, args.repeat)
+                print(f"{kind + ': ' + query:<28}{path:<10}{hits:>8}{p50:>10.2f}{p99:>10.2f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Per-meal cost of encoding a 1k-meal list response.
+
+"before" reproduces what a list handler did: build `MealCollection`, then
+FastAPI dumps it, validates it again against `response_model`, serializes it
+in JSON mode and `json.dumps` the result. "after" is the raw-document encoder
+the handlers now return directly. Both are checked to produce the same body
+with and without `response_model_by_alias`, so `_id` routes stay `_id`.
+
+    python -m benchmarks.serialization_bench --meals 1000
+"""
+import argparse
+import json
+import time
+
+from bson import ObjectId
+from pydantic import TypeAdapter
+
+from app.database.models import MealCollection, MealResponse
+from app.streaming import collection_encoder
+
+
+def synthetic_documents(count: int) -> list[dict]:
+    return [
+        {
+            "_id": ObjectId(),
+            "name": f"Ayam Goreng {i}",
+            "category": "chicken",
+            "area": "Indonesia",
+            "instructions": "Lorem ipsum dolor sit amet, consectetur adipisicing elit. " * 8,
+            "youtubeUrl": "https://youtube.com/videoexample",
+            "imageUrl": f"http://localhost/static/images/{i}.jpg",
+            "ingredients": [{"name": f"ingredient {j}", "measure": "100 gram"} for j in range(8)],
+            "author": "user@email.com",
+            "verification_status": "approved",
+            "favourited": i % 3 == 0,
+        }
+        for i in range(count)
+    ]
+
+
+def before(documents: list[dict], adapter: TypeAdapter, by_alias: bool = False) -> bytes:
+    collection = MealCollection(meals=documents)
+    content = collection.model_dump(by_alias=True)
+    value = adapter.validate_python(content)
+    return json.dumps(adapter.dump_python(value, mode="json", by_alias=by_alias)).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--meals", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    documents = synthetic_documents(args.meals)
+    adapter = TypeAdapter(MealCollection)
+    encode_meals = collection_encoder(MealResponse, "meals")
+
+    paths = {
+        "before": lambda: before(documents, adapter),
+        "after": lambda: encode_meals(documents),
+    }
+    for by_alias in (False, True):
+        expected = json.loads(before(documents, adapter, by_alias))
+        assert json.loads(collection_encoder(MealResponse, "meals", by_alias)(documents)) == expected, by_alias
+
+    for name, fn in paths.items():
+        fn()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            fn()
+        elapsed = (time.perf_counter() - start) / args.repeat
+        print(f"{name:<8}{elapsed * 1000:8.2f} ms per response  {elapsed / args.meals * 1e6:6.2f} us per meal")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Signin throughput and the latency of an unrelated endpoint during a login
+burst.
+
+Run the API (with MongoDB and a verified account), then:
+
+    python -m benchmarks.signin_bench --url http://localhost:8000 \\
+        --email user@email.com --password secret --concurrency 32
+
+`--concurrency` workers sign in back to back while a single prober hits
+`GET /meals`; with bcrypt on the event loop the prober's p99 grows with every
+concurrent login, with the process pool it stays flat.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def signin_worker(client, args, deadline, results):
+    while time.perf_counter() < deadline:
+        response = await client.post(
+            "/auth/signin", data={"username": args.email, "password": args.password}
+        )
+        results[response.status_code] = results.get(response.status_code, 0) + 1
+
+
+async def prober(client, deadline, latencies):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await client.get("/meals", params={"limit": 1})
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        idle = []
+        await prober(client, time.perf_counter() + 2, idle)
+
+        results, latencies = {}, []
+        deadline = time.perf_counter() + args.duration
+        await asyncio.gather(
+            prober(client, deadline, latencies),
+            *(signin_worker(client, args, deadline, results) for _ in range(args.concurrency)),
+        )
+
+    signins = sum(results.values())
+    print(f"signins: {signins} in {args.duration:.0f}s ({signins / args.duration:.1f}/s) {results}")
+    print(f"GET /meals idle:  p50 {statistics.median(idle):.1f} ms  p99 {percentile(idle, 0.99):.1f} ms")
+    print(f"GET /meals burst: p50 {statistics.median(latencies):.1f} ms  p99 {percentile(latencies, 0.99):.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+"""
+Throughput of repeated image fetches through `GET /static/images/{name}`.
+
+"before" is the old handler (`exists()` then a plain `FileResponse` per
+request). "after" is the current route: cached small images are served from
+memory, and with `--revalidate` clients send back the ETag and get a 304.
+Requests go through the ASGI app in-process, so the numbers are handler +
+Starlette cost without the network.
+
+    python -m benchmarks.static_bench --images 200 --requests 5000
+"""
+import argparse
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import httpx
+from fastapi import APIRouter, FastAPI, HTTPException
+from fastapi.responses import FileResponse
+
+# UPLOAD_DIR relatif terhadap cwd, jadi pindah dulu sebelum import app.images
+if multiprocessing.parent_process() is None:
+    WORKDIR = tempfile.mkdtemp(prefix="static_bench_")
+    os.chdir(WORKDIR)
+
+from app.images import image_path  # noqa: E402
+from app.routers import static  # noqa: E402
+
+
+def before_app() -> FastAPI:
+    router = APIRouter()
+
+    @router.get("/static/images/{filename}")
+    async def get_image(filename: str):
+        file_path = image_path(filename)
+        if not file_path.exists():
+            raise HTTPException(status_code=404, detail="Image not found")
+        return FileResponse(file_path)
+
+    app = FastAPI()
+    app.include_router(router)
+    return app
+
+
+def after_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(static.router)
+    return app
+
+
+def synthetic_images(count: int, size: int) -> list[str]:
+    names = []
+    for _ in range(count):
+        content = os.urandom(size)
+        name = hashlib.sha256(content).hexdigest() + ".jpg"
+        path = image_path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        names.append(name)
+    return names
+
+
+async def fetch_all(app: FastAPI, names: list[str], requests: int, revalidate: bool, seed: int = 42) -> float:
+    rng = random.Random(seed)
+    # Sebagian kecil gambar paling sering diminta, seperti katalog sebenarnya
+    order = [names[min(int(rng.paretovariate(1.2)) - 1, len(names) - 1)] for _ in range(requests)]
+    etags = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        start = time.perf_counter()
+        for name in order:
+            headers = {"If-None-Match": etags[name]} if revalidate and name in etags else {}
+            response = await client.get(f"/static/images/{name}", headers=headers)
+            assert response.status_code in (200, 304)
+            etags[name] = response.headers["etag"]
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--size", type=int, default=60 * 1024)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    try:
+        names = synthetic_images(args.images, args.size)
+        print(f"{args.requests} fetches over {args.images} images of {args.size // 1024} KiB\n")
+
+        runs = {
+            "before": (before_app(), False),
+            "after": (after_app(), False),
+            "after 304": (after_app(), True),
+        }
+        for label, (app, revalidate) in runs.items():
+            elapsed = asyncio.run(fetch_all(app, names, args.requests, revalidate))
+            print(f"{label:<12}{args.requests / elapsed:10.0f} req/s  {elapsed / args.requests * 1e6:8.1f} us/req")
+        print(f"\n{static.image_cache.stats()}")
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
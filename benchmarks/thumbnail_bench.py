@@ -0,0 +1,121 @@
+"""
+Throughput of the thumbnail pipeline on a batch of synthetic uploads.
+
+Images are written to a temporary upload directory, then every variant is
+rendered once inline (one image at a time in this process, what a handler
+doing the work itself would get) and once through `ThumbnailPipeline` with
+the given pool size and concurrency. For the pipeline the worst event loop
+stall is reported too; inline rendering stalls the loop for a whole image.
+
+    python -m benchmarks.thumbnail_bench --images 48 --size 4 --concurrency 4
+"""
+import argparse
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from PIL import Image
+
+# UPLOAD_DIR relatif terhadap cwd, jadi pindah dulu sebelum import app.images
+# (hanya di proses utama, worker hasil spawn ikut mengimport modul ini)
+if multiprocessing.parent_process() is None:
+    WORKDIR = tempfile.mkdtemp(prefix="thumbnail_bench_")
+    os.chdir(WORKDIR)
+
+from app.images import TMP_DIR, image_path  # noqa: E402
+from app.thumbnails import VARIANT_WIDTHS, ThumbnailPipeline, render_variants, variant_path  # noqa: E402
+
+
+def synthetic_uploads(count: int, width: int, height: int, seed: int = 42) -> list[str]:
+    rng = random.Random(seed)
+    names = []
+    for _ in range(count):
+        image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+        image.paste((rng.randrange(256), rng.randrange(256), rng.randrange(256)), (0, 0, width // 3, height // 3))
+        image = Image.blend(image, Image.effect_noise((width, height), 40).convert("RGB"), 0.3)
+
+        temp = TMP_DIR / "upload.jpg"
+        image.save(temp, "JPEG", quality=90)
+        name = hashlib.sha256(temp.read_bytes()).hexdigest() + ".jpg"
+        path = image_path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp, path)
+        names.append(name)
+    return names
+
+
+def clear_variants(names: list[str]):
+    for name in names:
+        for width in VARIANT_WIDTHS:
+            variant_path(name, width).unlink(missing_ok=True)
+
+
+def inline(names: list[str]):
+    for name in names:
+        targets = [(width, str(variant_path(name, width))) for width in VARIANT_WIDTHS]
+        render_variants(str(image_path(name)), targets, str(TMP_DIR))
+
+
+async def loop_lag(stop: asyncio.Event, interval: float = 0.005) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def pipelined(names: list[str], size: int, concurrency: int):
+    pipeline = ThumbnailPipeline(size=size, concurrency=concurrency, queue_limit=len(names))
+    # Panaskan worker dulu supaya waktu spawn tidak ikut terukur
+    await asyncio.gather(*(pipeline.render(name) for name in names[:size]))
+    clear_variants(names)
+    pipeline.finished.clear()
+
+    stop = asyncio.Event()
+    lag = asyncio.create_task(loop_lag(stop))
+    start = time.perf_counter()
+    for name in names:
+        pipeline.enqueue(name)
+    await pipeline.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    pipeline.shutdown()
+    return elapsed, await lag, pipeline.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=48)
+    parser.add_argument("--width", type=int, default=2000)
+    parser.add_argument("--height", type=int, default=1500)
+    parser.add_argument("--size", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    try:
+        names = synthetic_uploads(args.images, args.width, args.height)
+        print(f"{args.images} uploads of {args.width}x{args.height}, variants {VARIANT_WIDTHS}\n")
+
+        start = time.perf_counter()
+        inline(names)
+        elapsed = time.perf_counter() - start
+        print(f"{'inline':<12}{elapsed:8.2f}s  {args.images / elapsed:8.1f} images/s"
+              f"  loop stall {elapsed / args.images * 1000:7.1f} ms per image")
+
+        clear_variants(names)
+        elapsed, lag, stats = asyncio.run(pipelined(names, args.size, args.concurrency))
+        print(f"{'pipeline':<12}{elapsed:8.2f}s  {args.images / elapsed:8.1f} images/s"
+              f"  worst loop stall {lag * 1000:7.1f} ms")
+        print(f"\n{stats}")
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
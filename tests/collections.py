@@ -0,0 +1,132 @@
+"""
+In-memory stand-in for the few Motor collection methods the unit tests reach,
+with just the query operators those code paths send. Query shapes themselves
+are checked against a real server in `test_query_plans.py`.
+"""
+import copy
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+OPERATORS = {
+    "$in": lambda value, argument: value in argument,
+    "$gt": lambda value, argument: value is not None and value > argument,
+    "$gte": lambda value, argument: value is not None and value >= argument,
+    "$lt": lambda value, argument: value is not None and value < argument,
+    "$lte": lambda value, argument: value is not None and value <= argument,
+}
+
+
+def matches(document: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(matches(document, branch) for branch in condition):
+                return False
+            continue
+        value = document.get(field)
+        if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+            for operator, argument in condition.items():
+                if operator == "$exists":
+                    if (field in document) != argument:
+                        return False
+                elif not OPERATORS[operator](value, argument):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def apply(document: dict, update: dict):
+    for field, value in update.get("$set", {}).items():
+        document[field] = value
+    for field, value in update.get("$inc", {}).items():
+        document[field] = document.get(field, 0) + value
+    for field in update.get("$unset", {}):
+        document.pop(field, None)
+
+
+def project(document: dict, projection: dict = None) -> dict:
+    if not projection:
+        return copy.deepcopy(document)
+    return {field: copy.deepcopy(value) for field, value in document.items() if field == "_id" or projection.get(field)}
+
+
+class Cursor:
+    def __init__(self, documents: list):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self.iterate()
+
+    async def iterate(self):
+        for document in self.documents:
+            yield document
+
+    async def to_list(self, length=None):
+        return self.documents[:length]
+
+
+class Collection:
+    def __init__(self, documents: list = ()):
+        self.documents = []
+        for document in documents:
+            self.documents.append({"_id": ObjectId(), **document})
+
+    def matching(self, query: dict) -> list[dict]:
+        return [document for document in self.documents if matches(document, query)]
+
+    async def insert_one(self, document: dict):
+        document.setdefault("_id", ObjectId())
+        self.documents.append(copy.deepcopy(document))
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    def find(self, query: dict = None, projection: dict = None):
+        return Cursor([project(document, projection) for document in self.matching(query or {})])
+
+    async def find_one(self, query: dict, projection: dict = None):
+        found = self.matching(query)
+        return project(found[0], projection) if found else None
+
+    async def find_one_and_update(self, query: dict, update: dict, sort=None, return_document=ReturnDocument.BEFORE):
+        found = self.matching(query)
+        for field, direction in reversed(sort or []):
+            found.sort(key=lambda document: document[field], reverse=direction < 0)
+        if not found:
+            return None
+        before = copy.deepcopy(found[0])
+        apply(found[0], update)
+        return copy.deepcopy(found[0]) if return_document == ReturnDocument.AFTER else before
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False):
+        found = self.matching(query)[:1]
+        for document in found:
+            apply(document, update)
+        upserted_id = None
+        if not found and upsert:
+            document = {field: value for field, value in query.items() if not isinstance(value, dict)}
+            document = {"_id": ObjectId(), **document, **update.get("$setOnInsert", {})}
+            apply(document, update)
+            self.documents.append(document)
+            upserted_id = document["_id"]
+        return SimpleNamespace(matched_count=len(found), modified_count=len(found), upserted_id=upserted_id)
+
+    async def update_many(self, query: dict, update: dict):
+        found = self.matching(query)
+        for document in found:
+            apply(document, update)
+        return SimpleNamespace(matched_count=len(found), modified_count=len(found))
+
+    async def find_one_and_delete(self, query: dict, projection: dict = None):
+        found = self.matching(query)[:1]
+        self.documents = [document for document in self.documents if document not in found]
+        return project(found[0], projection) if found else None
+
+    async def delete_many(self, query: dict):
+        found = self.matching(query)
+        self.documents = [document for document in self.documents if document not in found]
+        return SimpleNamespace(deleted_count=len(found))
+
+    async def count_documents(self, query: dict, limit: int = None):
+        count = len(self.matching(query))
+        return min(count, limit) if limit else count
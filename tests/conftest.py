@@ -0,0 +1,11 @@
+import os
+
+# Setelan wajib app.mail dan app.dependencies, diisi sebelum modul app diimpor
+for name, value in {
+    "SECRET_KEY": "test-secret",
+    "MAIL_USERNAME": "test",
+    "MAIL_PASSWORD": "test",
+    "MAIL_FROM": "noreply@example.com",
+    "DOMAIN": "localhost",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,69 @@
+import pytest
+
+from app import cache
+from app.cache import TTLCache
+from app.indexes import SearchKey, meal_deleted, meal_saved, search_cache, search_key
+
+from .test_search import meal
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_ttl_cache_expires_entries(clock):
+    entries = TTLCache(maxsize=10, ttl=5)
+    entries.set("a", 1)
+    assert entries.get("a") == 1
+
+    clock[0] += 5
+    assert entries.get("a", "missing") == "missing"
+    assert entries.stats()["hits"] == 1 and entries.stats()["misses"] == 1 and entries.stats()["evictions"] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    entries = TTLCache(maxsize=2, ttl=60)
+    entries.set("a", 1)
+    entries.set("b", 2)
+    entries.get("a")
+    entries.set("c", 3)
+
+    assert list(entries.entries) == ["a", "c"]
+    assert len(entries) == 2
+
+
+def test_ttl_cache_invalidation_bumps_generation(clock):
+    entries = TTLCache(maxsize=10, ttl=60)
+    entries.set("a", 1)
+    entries.set("b", 2)
+    generation = entries.generation
+
+    entries.invalidate(lambda key, value: value == 2)
+    assert entries.get("b") is None and entries.get("a") == 1
+    entries.pop("missing")
+    assert entries.generation == generation + 2
+    assert entries.invalidations == 1
+
+
+def test_search_key_sorts_keywords():
+    assert search_key("Rice  chicken", False, 20) == SearchKey(("chicken", "rice"), False, 20, None, None, None, "full")
+
+
+def test_meal_writes_invalidate_matching_searches():
+    chicken, beef = search_key("chick", False, 20), search_key("beef", False, 20)
+    try:
+        search_cache.set(chicken, ([], None))
+        search_cache.set(beef, ([], None))
+        meal_saved(meal("cache-1", "Chicken Soup"))
+        assert search_cache.get(chicken) is None
+        assert search_cache.get(beef) is not None
+
+        search_cache.set(chicken, ([], None))
+        meal_deleted("cache-1")
+        assert search_cache.get(chicken) is None
+    finally:
+        meal_deleted("cache-1")
+        search_cache.entries.clear()
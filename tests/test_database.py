@@ -0,0 +1,67 @@
+import asyncio
+from collections import Counter
+
+from app.database.config import INDEXES, ensure_indexes
+
+from .collections import Collection, Cursor
+
+
+class IndexedCollection(Collection):
+    """
+    Records the indexes created on it; `aggregate` answers the duplicate
+    `$group` pipelines by the first grouped field.
+    """
+
+    def __init__(self, documents: list = (), indexes: tuple = ("_id_",)):
+        super().__init__(documents)
+        self.indexes = list(indexes)
+        self.created = []
+
+    async def index_information(self):
+        return {name: {} for name in self.indexes}
+
+    def aggregate(self, pipeline: list, allowDiskUse: bool = False):
+        key = pipeline[0]["$group"]["_id"]
+        if not isinstance(key, str):
+            return Cursor([])
+        counts = Counter(document.get(key[1:]) for document in self.documents)
+        return Cursor([{"_id": value, "count": count} for value, count in counts.items() if count > 1])
+
+    async def create_indexes(self, indexes: list):
+        self.created.extend(index.document["name"] for index in indexes)
+
+
+class Database:
+    def __init__(self, **collections):
+        self.collections = collections
+
+    def get_collection(self, name: str):
+        return self.collections.setdefault(name, IndexedCollection())
+
+
+def test_duplicate_emails_skip_only_the_unique_index(capsys):
+    users = IndexedCollection([{"email": "a@example.com"}, {"email": "a@example.com"}, {"email": "b@example.com"}])
+    database = Database(users=users)
+
+    asyncio.run(ensure_indexes(database))
+
+    assert "email_1" not in users.created
+    assert users.created == [index.document["name"] for index in INDEXES["users"][1:]]
+    assert database.get_collection("meals").created == [index.document["name"] for index in INDEXES["meals"]]
+    assert "a@example.com" in capsys.readouterr().out
+
+
+def test_unique_emails_create_every_index():
+    users = IndexedCollection([{"email": "a@example.com"}, {"email": "b@example.com"}])
+
+    asyncio.run(ensure_indexes(Database(users=users)))
+
+    assert users.created == [index.document["name"] for index in INDEXES["users"]]
+
+
+def test_existing_email_index_is_not_rechecked():
+    users = IndexedCollection([{"email": "a@example.com"}] * 2, indexes=("_id_", "email_1"))
+
+    asyncio.run(ensure_indexes(Database(users=users)))
+
+    assert "email_1" in users.created
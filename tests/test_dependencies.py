@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+
+from app.dependencies import get_optional_user, user_cache, verification_token
+
+
+@pytest.fixture
+def cached_user():
+    user = {"_id": "u1", "email": "cook@example.com", "superuser": False, "active": True}
+    user_cache.set(user["email"], user)
+    yield user
+    user_cache.pop(user["email"])
+
+
+def test_optional_user_without_token_is_anonymous():
+    assert asyncio.run(get_optional_user(None)) is None
+
+
+def test_optional_user_with_invalid_token_is_anonymous():
+    assert asyncio.run(get_optional_user("garbage")) is None
+
+
+def test_optional_user_with_valid_token(cached_user):
+    assert asyncio.run(get_optional_user(verification_token(cached_user))) == cached_user
+
+
+def test_optional_user_inactive_is_anonymous(cached_user):
+    cached_user["active"] = False
+    assert asyncio.run(get_optional_user(verification_token(cached_user))) is None
@@ -0,0 +1,40 @@
+import pytest
+from starlette.requests import Request
+
+from app.etag import make_etag, not_modified, query_fingerprint
+
+
+def request(headers: dict = None, query: str = "") -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/meals",
+        "query_string": query.encode(),
+        "headers": [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()],
+    })
+
+
+ETAG = make_etag("meal", 1)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    (ETAG, True),
+    (f"W/{ETAG}", True),
+    (f'"other", {ETAG}', True),
+    ("*", True),
+    ('"other"', False),
+])
+def test_not_modified(header, expected):
+    headers = {"If-None-Match": header} if header is not None else {}
+    assert not_modified(request(headers), ETAG) is expected
+
+
+def test_make_etag_depends_on_every_part():
+    assert make_etag("meal", 1) == ETAG
+    assert make_etag("meal", 2) != ETAG
+    assert ETAG.startswith('"') and ETAG.endswith('"')
+
+
+def test_query_fingerprint_ignores_parameter_order():
+    assert query_fingerprint(request(query="b=2&a=1&a=0")) == query_fingerprint(request(query="a=0&a=1&b=2"))
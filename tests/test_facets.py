@@ -0,0 +1,32 @@
+from app.indexes.facets import FacetIndex
+
+from .test_search import meal
+
+
+def test_facet_ids_and_counts():
+    index = FacetIndex()
+    index.upsert(meal("1", "Soto", "Chicken", "Indonesian"))
+    index.upsert(meal("2", "Rendang", "Beef", "Indonesian"))
+    index.upsert(meal("3", "Teriyaki", "Chicken", "Japanese"))
+
+    assert index.ids() is None
+    assert index.ids(category="Chicken") == {"1", "3"}
+    assert index.ids(category="Chicken", area="Indonesian") == {"1"}
+    assert index.allows("2", area="Indonesian") and not index.allows("2", category="Chicken")
+    assert index.counts(area="Indonesian") == {
+        "category": {"Chicken": 1, "Beef": 1},
+        "area": {"Indonesian": 2, "Japanese": 1},
+    }
+    assert index.counts(ids={"3", "missing"}) == {"category": {"Chicken": 1}, "area": {"Japanese": 1}}
+
+
+def test_facet_upsert_moves_meal():
+    index = FacetIndex()
+    index.upsert(meal("1", "Soto", "Chicken", "Indonesian"))
+    index.upsert(meal("1", "Soto", "Beef", "Indonesian"))
+
+    assert index.categories == {"Beef": {"1"}}
+    assert dict(index.pairs) == {("Beef", "Indonesian"): 1}
+
+    index.remove("1")
+    assert index.categories == {} and index.areas == {} and not index.pairs
@@ -0,0 +1,78 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
+from app import images
+from app.images import image_path, stage_image
+
+CONTENT = b"\x89PNG" + b"x" * 1000
+NAME = hashlib.sha256(CONTENT).hexdigest() + ".png"
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    tmp_dir = tmp_path / ".tmp"
+    tmp_dir.mkdir()
+    monkeypatch.setattr(images, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(images, "UPLOAD_ROOT", tmp_path.resolve())
+    monkeypatch.setattr(images, "TMP_DIR", tmp_dir)
+    return tmp_path
+
+
+def upload(content: bytes = CONTENT, declared: bool = False) -> UploadFile:
+    return UploadFile(
+        io.BytesIO(content),
+        size=len(content) if declared else None,
+        headers=Headers({"content-type": "image/png"}),
+    )
+
+
+def stage(file: UploadFile, max_size: int = 4096):
+    return asyncio.run(stage_image(file, max_size))
+
+
+def test_stage_names_upload_by_hash(upload_dir):
+    image = stage(upload())
+
+    assert image.name == NAME
+    assert image.temp_path.parent == upload_dir / ".tmp"
+    assert image.temp_path.read_bytes() == CONTENT
+
+
+@pytest.mark.parametrize("declared", [True, False])
+def test_stage_rejects_large_upload(upload_dir, declared):
+    with pytest.raises(HTTPException) as error:
+        stage(upload(declared=declared), max_size=len(CONTENT) - 1)
+
+    assert error.value.status_code == 413
+    assert list((upload_dir / ".tmp").iterdir()) == []
+
+
+def test_commit_moves_image_into_shard(upload_dir):
+    image = stage(upload())
+    image.commit()
+
+    assert image_path(NAME) == upload_dir / NAME[:2] / NAME[2:4] / NAME
+    assert image_path(NAME).read_bytes() == CONTENT
+    assert not image.temp_path.exists()
+
+
+def test_commit_of_existing_image_discards_upload(upload_dir):
+    stage(upload()).commit()
+    again = stage(upload())
+    again.commit()
+
+    assert not again.temp_path.exists()
+    assert image_path(NAME).read_bytes() == CONTENT
+
+
+def test_discard_removes_upload(upload_dir):
+    image = stage(upload())
+    image.discard()
+    image.discard()
+
+    assert not image.temp_path.exists() and not image_path(NAME).exists()
@@ -0,0 +1,157 @@
+import asyncio
+import socket
+from email.message import EmailMessage
+
+import aiosmtplib
+import pytest
+from aiosmtpd.controller import Controller
+from fastapi_mail import ConnectionConfig
+
+from app.mail import MailDispatcher
+
+
+class Handler:
+    """
+    aiosmtpd handler answering each DATA with the next reply from `replies`,
+    then "250 OK" once they run out.
+    """
+
+    def __init__(self, *replies: str, delay: float = 0):
+        self.replies = list(replies)
+        self.delay = delay
+        self.attempts = 0
+        self.received = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.attempts += 1
+        await asyncio.sleep(self.delay)
+        if self.replies:
+            return self.replies.pop(0)
+        self.received.append(envelope.rcpt_tos)
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    servers = []
+
+    def start(*replies: str, delay: float = 0):
+        handler = Handler(*replies, delay=delay)
+        controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+        controller.start()
+        servers.append(controller)
+        return handler, controller.port
+
+    yield start
+    for controller in servers:
+        controller.stop()
+
+
+def dispatcher(port: int, max_attempts: int = 3) -> MailDispatcher:
+    config = ConnectionConfig(
+        MAIL_USERNAME="test",
+        MAIL_PASSWORD="test",
+        MAIL_FROM="noreply@example.com",
+        MAIL_PORT=port,
+        MAIL_SERVER="127.0.0.1",
+        MAIL_STARTTLS=False,
+        MAIL_SSL_TLS=False,
+        USE_CREDENTIALS=False,
+        VALIDATE_CERTS=False,
+        TIMEOUT=5,
+    )
+    return MailDispatcher(
+        config, size=1, queue_limit=10, batch_size=5, max_attempts=max_attempts, backoff=0.01, idle_timeout=5
+    )
+
+
+def message(to: str = "cook@example.com") -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = "noreply@example.com"
+    message["To"] = to
+    message["Subject"] = "Test"
+    message.set_content("Hello")
+    return message
+
+
+async def send(mail: MailDispatcher, *messages: EmailMessage) -> list:
+    mail.start()
+    try:
+        results = [await mail.submit(item) for item in messages]
+        return await asyncio.gather(*results, return_exceptions=True)
+    finally:
+        await mail.stop()
+
+
+def test_send(smtp_server):
+    handler, port = smtp_server()
+    mail = dispatcher(port)
+
+    assert asyncio.run(send(mail, message("a@example.com"), message("b@example.com"))) == [None, None]
+    assert handler.received == [["a@example.com"], ["b@example.com"]]
+    assert mail.sent == 2 and mail.retried == 0 and mail.connections == 1
+
+
+def test_temporary_failure_is_retried(smtp_server):
+    handler, port = smtp_server("451 Try again later")
+    mail = dispatcher(port)
+
+    assert asyncio.run(send(mail, message())) == [None]
+    assert handler.attempts == 2 and handler.received == [["cook@example.com"]]
+    assert mail.retried == 1 and mail.failed == 0
+
+
+def test_gives_up_after_max_attempts(smtp_server):
+    handler, port = smtp_server(*["451 Try again later"] * 5)
+    mail = dispatcher(port, max_attempts=3)
+
+    [error] = asyncio.run(send(mail, message()))
+    assert isinstance(error, aiosmtplib.SMTPResponseException) and error.code == 451
+    assert handler.attempts == 3 and handler.received == []
+    assert mail.retried == 2 and mail.failed == 1
+
+
+def test_permanent_failure_is_not_retried(smtp_server):
+    handler, port = smtp_server("550 No such user")
+    mail = dispatcher(port)
+
+    [error] = asyncio.run(send(mail, message()))
+    assert error.code == 550
+    assert handler.attempts == 1 and mail.retried == 0 and mail.failed == 1
+
+
+def test_cancel_drops_message_not_yet_sent(smtp_server):
+    handler, port = smtp_server()
+    mail = dispatcher(port)
+
+    async def scenario():
+        result = await mail.submit(message())
+        assert mail.cancel(result)
+        mail.start()
+        await mail.stop()
+
+    asyncio.run(scenario())
+    assert handler.attempts == 0 and mail.sent == 0
+
+
+def test_cancel_keeps_message_being_sent(smtp_server):
+    handler, port = smtp_server(delay=0.2)
+    mail = dispatcher(port)
+
+    async def scenario():
+        mail.start()
+        result = await mail.submit(message())
+        while result not in mail.sending:
+            await asyncio.sleep(0.01)
+        assert not mail.cancel(result)
+        await result
+        await mail.stop()
+
+    asyncio.run(scenario())
+    assert handler.received == [["cook@example.com"]] and mail.sent == 1
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+from starlette.requests import Request
+
+from app.indexes import facet_index, meal_deleted, meal_saved, search_index
+from app.popularity import TrendingTracker, ViewBuffer
+from app.routers import meals
+from app.stats import StatsBuffer
+
+from .collections import Collection
+
+AUTHOR = {"_id": ObjectId(), "email": "cook@example.com"}
+
+
+@pytest.fixture
+def meal(monkeypatch):
+    async def bump(*names):
+        pass
+
+    document = {
+        "_id": ObjectId(),
+        "name": "Soto Ayam",
+        "category": "Chicken",
+        "area": "Indonesian",
+        "author": AUTHOR["email"],
+        "verification_status": "approved",
+    }
+    monkeypatch.setattr(meals, "meal_collection", Collection([document]))
+    monkeypatch.setattr(meals, "catalogue_meals", meals.meal_collection)
+    monkeypatch.setattr(meals, "favourites_collection", Collection())
+    monkeypatch.setattr(meals, "catalogue_favourites", meals.favourites_collection)
+    monkeypatch.setattr(meals, "view_buffer", ViewBuffer())
+    monkeypatch.setattr(meals, "bump", bump)
+    monkeypatch.setattr(meals, "stats_buffer", StatsBuffer())
+    monkeypatch.setattr(meals, "trending", TrendingTracker(half_life=60, capacity=10))
+    meal_saved(document)
+    yield document
+    meal_deleted(str(document["_id"]))
+
+
+def test_delete_with_uppercase_id_removes_meal_from_indexes(meal):
+    meal_id = str(meal["_id"])
+    meals.trending.record(meal_id, 1)
+    response = asyncio.run(meals.delete_meal(meal_id.upper(), AUTHOR))
+
+    assert response.status_code == 204
+    assert meal_id not in facet_index.meal_facets
+    assert search_index.search("soto") == []
+    assert meal_id not in meals.trending.scores
+
+
+def request(path: str) -> Request:
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": []})
+
+
+def test_views_and_favourites_recorded_under_stored_id(meal):
+    meal_id = str(meal["_id"])
+    response = asyncio.run(meals.show_meals(meal_id.upper(), request(f"/meals/{meal_id.upper()}"), AUTHOR))
+    asyncio.run(meals.add_meal_to_favourite(meal_id.upper(), AUTHOR))
+
+    assert response.status_code == 200
+    assert meals.view_buffer.counts == {meal_id: 1}
+    assert list(meals.trending.scores) == [meal_id]
+    asyncio.run(meals.trending.refresh(meals.meal_collection, 10))
+    assert [str(found["_id"]) for found in meals.trending.top] == [meal_id]
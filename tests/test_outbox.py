@@ -0,0 +1,230 @@
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+import jwt
+import pytest
+
+from app import outbox as outbox_module
+from app.dependencies import JWT_SECRET
+from app.outbox import Outbox, now, verification_record
+
+from .collections import Collection
+
+LEASE = 0.3
+TIMEOUT = 0.05
+
+
+class Dispatcher:
+    """
+    Stand-in for `MailDispatcher`. `outcomes` maps a recipient to what happens
+    to its mail: "sent", an exception, "queued" (never starts) or "slow"
+    (already being sent at the lease cutoff, done shortly after).
+    """
+
+    def __init__(self, **outcomes):
+        self.config = SimpleNamespace(TIMEOUT=TIMEOUT)
+        self.outcomes = outcomes
+        self.delivered = []
+        self.sending = set()
+
+    async def submit(self, message, max_attempts=None):
+        assert max_attempts == 1
+        result = asyncio.get_running_loop().create_future()
+        outcome = self.outcomes.get(message["To"], "sent")
+        if outcome == "sent":
+            self.delivered.append(message)
+            result.set_result(None)
+        elif isinstance(outcome, Exception):
+            result.set_exception(outcome)
+        elif outcome == "slow":
+            self.sending.add(result)
+
+            def finish():
+                self.sending.discard(result)
+                self.delivered.append(message)
+                result.set_result(None)
+
+            asyncio.get_running_loop().call_later(2 * LEASE, finish)
+        return result
+
+    def cancel(self, result):
+        if result in self.sending:
+            return False
+        return result.cancel()
+
+
+def user(email, verified=False):
+    return {"email": email, "superuser": False, "verified": verified}
+
+
+def make_outbox(users=(), lease=LEASE, **outcomes) -> Outbox:
+    return Outbox(Collection(), Collection(users), Dispatcher(**outcomes), workers=1, batch_size=10, lease=lease)
+
+
+async def add(outbox: Outbox, email: str, age: float = 0) -> dict:
+    record = verification_record(email)
+    record["created_at"] -= timedelta(seconds=age)
+    record["available_at"] -= timedelta(seconds=age)
+    await outbox.collection.insert_one(record)
+    return record
+
+
+def stored(outbox: Outbox, record: dict):
+    return next((document for document in outbox.collection.documents if document["_id"] == record["_id"]), None)
+
+
+def test_record_holds_no_token():
+    assert "token" not in verification_record("a@example.com")
+
+
+def test_claim_takes_oldest_available_record():
+    async def scenario():
+        outbox = make_outbox()
+        newer = await add(outbox, "b@example.com", age=5)
+        older = await add(outbox, "a@example.com", age=10)
+        future = verification_record("c@example.com")
+        future["available_at"] += timedelta(minutes=1)
+        await outbox.collection.insert_one(future)
+
+        first = await outbox.claim("w1")
+        assert first["_id"] == older["_id"]
+        assert first["attempts"] == 1 and first["claimed_by"] == "w1"
+        assert first["available_at"] > now()
+        assert (await outbox.claim("w1"))["_id"] == newer["_id"]
+        assert await outbox.claim("w1") is None
+
+    asyncio.run(scenario())
+
+
+def test_expired_lease_is_claimed_again():
+    async def scenario():
+        outbox = make_outbox(lease=0.05)
+        record = await add(outbox, "a@example.com")
+
+        claimed = await outbox.claim("w1")
+        assert await outbox.claim("w2") is None
+        await asyncio.sleep(0.06)
+        reclaimed = await outbox.claim("w2")
+        assert reclaimed["_id"] == record["_id"]
+        assert reclaimed["attempts"] == 2 and reclaimed["claimed_by"] == "w2"
+
+        # w1 hanya boleh mengubah record yang masih diklaimnya
+        await outbox.reschedule(claimed, RuntimeError("late"), "w1")
+        assert "error" not in stored(outbox, record)
+
+    asyncio.run(scenario())
+
+
+def test_sent_mail_deletes_record_with_token_created_at_send():
+    async def scenario():
+        outbox = make_outbox([user("a@example.com")])
+        record = await add(outbox, "a@example.com")
+        await outbox.process(await outbox.claim_batch("w1"), "w1")
+
+        assert stored(outbox, record) is None and outbox.sent == 1
+        [message] = outbox.dispatcher.delivered
+        token = message.get_content().split("token=")[1].split('"')[0]
+        assert jwt.decode(token, JWT_SECRET, algorithms=["HS256"]) == {"email": "a@example.com", "superuser": False}
+
+    asyncio.run(scenario())
+
+
+def test_failed_send_is_rescheduled_with_backoff(monkeypatch):
+    monkeypatch.setattr(outbox_module, "OUTBOX_RETRY_BACKOFF", 30)
+
+    async def scenario():
+        outbox = make_outbox([user("a@example.com")], **{"a@example.com": ConnectionError("down")})
+        record = await add(outbox, "a@example.com")
+        await outbox.process(await outbox.claim_batch("w1"), "w1")
+
+        rescheduled = stored(outbox, record)
+        assert rescheduled["state"] == "pending" and rescheduled["error"] == "down"
+        assert now() + timedelta(seconds=29) < rescheduled["available_at"] <= now() + timedelta(seconds=30)
+        assert outbox.rescheduled == 1
+
+    asyncio.run(scenario())
+
+
+def test_last_attempt_marks_record_failed(monkeypatch):
+    monkeypatch.setattr(outbox_module, "OUTBOX_MAX_ATTEMPTS", 1)
+
+    async def scenario():
+        outbox = make_outbox([user("a@example.com")], **{"a@example.com": ConnectionError("down")})
+        record = await add(outbox, "a@example.com")
+        await outbox.process(await outbox.claim_batch("w1"), "w1")
+
+        failed = stored(outbox, record)
+        assert failed["state"] == "failed" and "failed_at" in failed
+        assert await outbox.claim("w1") is None and outbox.failed == 1
+
+    asyncio.run(scenario())
+
+
+def test_unstarted_send_is_cancelled_at_lease_cutoff():
+    async def scenario():
+        outbox = make_outbox([user("a@example.com")], **{"a@example.com": "queued"})
+        record = await add(outbox, "a@example.com")
+        await outbox.process(await outbox.claim_batch("w1"), "w1")
+
+        assert stored(outbox, record)["error"] == "Mail not sent before the lease ran out"
+        assert outbox.dispatcher.delivered == [] and outbox.rescheduled == 1
+
+    asyncio.run(scenario())
+
+
+def test_send_in_progress_at_lease_cutoff_is_not_rescheduled():
+    async def scenario():
+        outbox = make_outbox([user("a@example.com")], **{"a@example.com": "slow"})
+        record = await add(outbox, "a@example.com")
+        batch = await outbox.claim_batch("w1")
+        processing = asyncio.create_task(outbox.process(batch, "w1"))
+
+        # Setelah batas lease: lease diperpanjang, record tidak bisa diklaim worker lain
+        await asyncio.sleep(LEASE)
+        assert stored(outbox, record)["available_at"] > batch[0]["available_at"]
+        assert await outbox.claim("w2") is None
+
+        await processing
+        assert stored(outbox, record) is None
+        assert len(outbox.dispatcher.delivered) == 1 and outbox.rescheduled == 0
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("age, dropped", [(0, False), (outbox_module.OUTBOX_ORPHAN_AGE + 60, True)])
+def test_orphaned_record_dropped_only_when_old(age, dropped):
+    async def scenario():
+        outbox = make_outbox()
+        record = await add(outbox, "ghost@example.com", age=age)
+        await outbox.process(await outbox.claim_batch("w1"), "w1")
+
+        assert (stored(outbox, record) is None) is dropped
+        assert outbox.dropped == int(dropped) and outbox.dispatcher.delivered == []
+
+    asyncio.run(scenario())
+
+
+def test_verified_user_gets_no_mail():
+    async def scenario():
+        outbox = make_outbox([user("a@example.com", verified=True)])
+        record = await add(outbox, "a@example.com")
+        await outbox.process(await outbox.claim_batch("w1"), "w1")
+
+        assert stored(outbox, record) is None and outbox.dispatcher.delivered == []
+
+    asyncio.run(scenario())
+
+
+def test_scrub_removes_stored_tokens_and_stamps_failed_records():
+    async def scenario():
+        outbox = make_outbox()
+        await outbox.collection.insert_one({**verification_record("a@example.com"), "token": "secret"})
+        await outbox.collection.insert_one({**verification_record("b@example.com"), "state": "failed"})
+        await outbox.scrub()
+
+        pending, failed = outbox.collection.documents
+        assert "token" not in pending and "failed_at" not in pending
+        assert "failed_at" in failed
+
+    asyncio.run(scenario())
@@ -0,0 +1,45 @@
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.pagination import after_cursor, decode_cursor, encode_cursor, next_page
+
+
+def test_cursor_round_trips_bson_values():
+    value = ObjectId()
+    assert decode_cursor(encode_cursor(value)) == value
+    assert decode_cursor(encode_cursor([1.5, "abc"])) == [1.5, "abc"]
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", "e30", encode_cursor("x")[:-4] + "!!!!"])
+def test_invalid_cursor_is_bad_request(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_next_page_trims_extra_item():
+    items = [{"_id": i} for i in range(4)]
+    page, cursor = next_page(items, 3)
+    assert page == items[:3]
+    assert decode_cursor(cursor) == 2
+
+
+def test_next_page_without_more_items():
+    items = [{"_id": i} for i in range(3)]
+    assert next_page(items, 3) == (items, None)
+
+
+def test_next_page_custom_key():
+    items = [{"_id": i, "score": -i} for i in range(3)]
+    _, cursor = next_page(items, 2, key=lambda doc: [doc["score"], doc["_id"]])
+    assert decode_cursor(cursor) == [-1, 1]
+
+
+def test_after_cursor_keeps_existing_id_range():
+    since, last = ObjectId(), ObjectId()
+    query = {"author": "a@b.com", "_id": {"$gte": since}}
+
+    assert after_cursor(query) is query
+    assert after_cursor(query, encode_cursor(last)) == {"author": "a@b.com", "_id": {"$gte": since, "$gt": last}}
+    assert query == {"author": "a@b.com", "_id": {"$gte": since}}
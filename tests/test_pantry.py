@@ -0,0 +1,32 @@
+from app.indexes.pantry import PantryIndex, iter_bits, normalize
+
+from .test_search import meal
+
+
+def test_iter_bits_yields_set_positions():
+    assert list(iter_bits(0b101001)) == [0, 3, 5]
+    assert list(iter_bits(0)) == []
+
+
+def test_pantry_ranks_full_matches_first():
+    index = PantryIndex()
+    index.upsert(meal("1", "Fried Rice", ingredients=["Rice", "Egg"]))
+    index.upsert(meal("2", "Omelette", ingredients=["Egg", "Milk", "Butter"]))
+    index.upsert(meal("3", "Steak", ingredients=["Beef"]))
+
+    results = index.match(["rice", " EGG "])
+    assert results == [(0, -2, "1"), (2, -1, "2")]
+    assert index.match(["rice", "egg"], max_missing=1) == [(0, -2, "1")]
+    assert index.match(["rice", "egg"], after=(0, -2, "1")) == [(2, -1, "2")]
+    assert index.missing("2", ["egg"]) == ["milk", "butter"]
+
+
+def test_pantry_remove_and_unapproved():
+    index = PantryIndex()
+    index.upsert(meal("1", "Fried Rice", ingredients=["Rice"]))
+    index.upsert(meal("1", "Fried Rice", ingredients=["Rice"], status="pending"))
+    index.upsert(meal("2", "Water", ingredients=[]))
+
+    assert len(index) == 0
+    assert index.match(["rice"]) == []
+    assert normalize("  Coconut   Milk ") == "coconut milk"
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.passwords import PasswordPool
+
+
+def test_rejects_past_queue_limit():
+    pool = PasswordPool(size=1, queue_limit=1)
+
+    async def scenario():
+        running = asyncio.create_task(pool.run(time.sleep, 0.2))
+        while pool.pending == 0:
+            await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as error:
+            await pool.run(time.sleep, 0)
+        await running
+        return error.value
+
+    try:
+        error = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+    assert error.status_code == 503 and error.headers == {"Retry-After": "1"}
+    assert pool.stats()["rejected"] == 1 and pool.pending == 0
+
+
+def test_pending_released_after_failure():
+    pool = PasswordPool(size=1, queue_limit=1)
+    try:
+        with pytest.raises(ValueError):
+            asyncio.run(pool.run(int, "not a number"))
+        assert pool.pending == 0
+    finally:
+        pool.shutdown()
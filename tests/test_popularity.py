@@ -0,0 +1,146 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app import popularity
+from app.popularity import TrendingTracker, ViewBuffer, seed_trending
+
+from .collections import Collection
+
+HALF_LIFE = 100.0
+
+
+class MealCollection(Collection):
+    """
+    Records the `bulk_write`s it gets; the first `failures` calls raise.
+    """
+
+    def __init__(self, documents: list = (), failures: int = 0):
+        super().__init__(documents)
+        self.failures = failures
+        self.writes = []
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("write failed")
+        self.writes.append((operations, ordered))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1_000_000.0)
+    monkeypatch.setattr(popularity, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def tracker(capacity: int = 10) -> TrendingTracker:
+    return TrendingTracker(half_life=HALF_LIFE, capacity=capacity)
+
+
+def test_flush_writes_one_increment_per_meal():
+    meals = [str(ObjectId()), str(ObjectId())]
+    buffer = ViewBuffer()
+    for meal_id in [meals[0], meals[1], meals[0]]:
+        buffer.add(meal_id)
+    collection = MealCollection()
+
+    asyncio.run(buffer.flush(collection))
+    asyncio.run(buffer.flush(collection))
+
+    assert collection.writes == [(
+        [
+            UpdateOne({"_id": ObjectId(meals[0])}, {"$inc": {"view_count": 2}}),
+            UpdateOne({"_id": ObjectId(meals[1])}, {"$inc": {"view_count": 1}}),
+        ],
+        False,
+    )]
+    assert buffer.flushed == 3
+
+
+def test_failed_flush_keeps_views_for_next_flush():
+    meal_id = str(ObjectId())
+    buffer = ViewBuffer()
+    buffer.add(meal_id)
+    collection = MealCollection(failures=1)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(buffer.flush(collection))
+    buffer.add(meal_id)
+    asyncio.run(buffer.flush(collection))
+
+    assert collection.writes == [([UpdateOne({"_id": ObjectId(meal_id)}, {"$inc": {"view_count": 2}})], False)]
+    assert buffer.flushed == 2
+
+
+def test_older_event_weighs_half_after_half_life(clock):
+    trending = tracker()
+    trending.record("old", 1.0)
+    clock.now += HALF_LIFE
+    trending.record("new", 1.0)
+
+    assert trending.scores["new"] == pytest.approx(2 * trending.scores["old"])
+    clock.now += HALF_LIFE
+    trending.record("old", 1.0)
+    assert trending.ranked(2) == ["old", "new"]
+
+
+def test_record_rebases_long_running_scores(clock):
+    trending = tracker()
+    trending.record("old", 2.0 ** 50)
+    trending.record("faded", 1.0)
+    clock.now += 65 * HALF_LIFE
+    trending.record("new", 1.0)
+
+    assert trending.origin == clock.now
+    assert trending.scores == pytest.approx({"old": 2.0 ** -15, "new": 1.0}, rel=1e-9)
+    assert "faded" not in trending.scores
+
+
+def test_ranked_trims_to_capacity(clock):
+    trending = tracker(capacity=2)
+    for meal_id, weight in [("a", 1.0), ("b", 3.0), ("c", 2.0)]:
+        trending.record(meal_id, weight)
+
+    assert trending.ranked(1) == ["b"]
+    assert set(trending.scores) == {"b", "c"}
+
+
+def test_seed_counts_as_one_half_life_ago(clock):
+    trending = tracker()
+    clock.now += 3 * HALF_LIFE
+    trending.seed({"seeded": 2.0})
+    trending.record("fresh", 1.0)
+
+    assert trending.scores["seeded"] == pytest.approx(trending.scores["fresh"])
+
+
+def test_refresh_keeps_approved_meals_in_rank_order(clock):
+    meals = [
+        {"_id": ObjectId(), "verification_status": "approved"},
+        {"_id": ObjectId(), "verification_status": "pending"},
+        {"_id": ObjectId(), "verification_status": "approved"},
+    ]
+    trending = tracker()
+    for meal, weight in zip(meals, [1.0, 3.0, 2.0]):
+        trending.record(str(meal["_id"]), weight)
+
+    asyncio.run(trending.refresh(MealCollection(meals), 2))
+    assert trending.top == [meals[2], meals[0]]
+
+    trending.forget(str(meals[2]["_id"]))
+    assert trending.top == [meals[0]]
+    assert str(meals[2]["_id"]) not in trending.scores
+
+
+def test_seed_trending_weights_views_and_favourites(clock, monkeypatch):
+    meal = {"_id": ObjectId(), "verification_status": "approved", "view_count": 3, "favourite_count": 2}
+    trending = tracker()
+    monkeypatch.setattr(popularity, "trending", trending)
+
+    asyncio.run(seed_trending(MealCollection([meal])))
+
+    assert trending.scores == pytest.approx({str(meal["_id"]): (3 + 2 * 5) / 2})
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+from app.cache import TTLCache
+from app.queries import ANY_FLAG, created_at_value, user_filter
+from app.routers import admin
+
+from .collections import Collection
+
+CREATED_FROM = datetime(2024, 3, 1, 12, 0, tzinfo=timezone.utc)
+CREATED_TO = datetime(2024, 4, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class UserCollection(Collection):
+    """
+    Counts the `count_documents` calls it gets.
+    """
+
+    def __init__(self, documents: list = ()):
+        super().__init__(documents)
+        self.counts = 0
+
+    async def estimated_document_count(self):
+        return len(self.documents)
+
+    async def count_documents(self, query: dict, limit: int = None):
+        self.counts += 1
+        return await super().count_documents(query, limit)
+
+
+@pytest.fixture
+def users(monkeypatch):
+    collection = UserCollection([{"email": f"user{n}@example.com", "verified": n % 2 == 0} for n in range(5)])
+    monkeypatch.setattr(admin, "user_collection", collection)
+    monkeypatch.setattr(admin, "user_counts", TTLCache(maxsize=8, ttl=60))
+    return collection
+
+
+def test_user_filter_without_filters_is_empty():
+    assert user_filter() == {}
+
+
+def test_user_filter_fills_unset_flags():
+    assert user_filter(verified=False) == {"superuser": ANY_FLAG, "active": ANY_FLAG, "verified": False}
+
+
+def test_user_filter_created_range_widens_id_range():
+    query = user_filter(created_from=CREATED_FROM, created_to=CREATED_TO)
+
+    assert query["_id"] == {
+        "$gte": ObjectId.from_datetime(CREATED_FROM - timedelta(minutes=1)),
+        "$lt": ObjectId.from_datetime(CREATED_TO + timedelta(minutes=1)),
+    }
+    assert query["created_at"] == {"$gte": "2024-03-01T12:00:00", "$lt": "2024-04-01T12:00:00"}
+
+
+def test_user_filter_open_created_range():
+    query = user_filter(created_to=CREATED_TO)
+
+    assert set(query["_id"]) == {"$lt"}
+    assert set(query["created_at"]) == {"$lt"}
+
+
+def test_created_at_value_converts_to_naive_utc():
+    local = CREATED_FROM.astimezone(timezone(timedelta(hours=7)))
+
+    assert created_at_value(local) == created_at_value(CREATED_FROM.replace(tzinfo=None)) == "2024-03-01T12:00:00"
+
+
+def test_user_filter_escapes_email_prefix():
+    assert user_filter(email_prefix="a.b+") == {"email": {"$regex": r"^a\.b\+"}}
+    assert user_filter(email_prefix="") == {}
+
+
+def test_count_users_unfiltered_is_estimate(users):
+    assert asyncio.run(admin.count_users({})) == (5, True)
+    assert users.counts == 0
+
+
+def test_count_users_filtered_is_cached(users):
+    assert asyncio.run(admin.count_users({"verified": True})) == (3, False)
+    assert asyncio.run(admin.count_users({"verified": True})) == (3, False)
+    assert asyncio.run(admin.count_users({"verified": False})) == (2, False)
+
+    assert users.counts == 2
+
+
+def test_count_users_at_limit_is_estimate(users, monkeypatch):
+    monkeypatch.setattr(admin, "USER_COUNT_LIMIT", 3)
+
+    assert asyncio.run(admin.count_users({"verified": True})) == (3, True)
+    assert asyncio.run(admin.count_users({"verified": False})) == (2, False)
@@ -0,0 +1,263 @@
+"""
+Query plans of the router and background-job queries against a real `mongod`.
+
+Creates the indexes from `app.database.config.INDEXES` in a scratch database,
+inserts a few documents and explains every query shape that is sent, built
+with the same `app.queries` builders. A shape fails when its plan, or a
+`$lookup` inside it, scans a whole collection. Skipped when no server answers
+at `TEST_MONGODB_URL` (default `mongodb://localhost:27017`).
+
+The `$facet` in `app.stats.meal_counts` and the `favourite_count`
+reconciliation read whole collections on purpose (hourly) and are not checked,
+neither is the one-off `Outbox.scrub` at startup.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from app.database.config import INDEXES
+from app.database.models import MEAL_SUMMARY_PROJECTION
+from app.pagination import after_cursor, encode_cursor
+from app.queries import (
+    approved_among, approved_meals, authored_by, claimable_outbox, daily_counts_pipeline, favourite_meals_pipeline,
+    favourite_of, favourites_among, owned_meal, popular_meals, user_filter,
+)
+from app.stats import STATS_ID, day_key
+
+URL = os.getenv("TEST_MONGODB_URL", "mongodb://localhost:27017")
+DATABASE = "meal_query_plans"
+
+
+def find(collection, query, sort=None, limit=None):
+    command = {"find": collection, "filter": query}
+    if sort is not None:
+        command["sort"] = {sort: 1}
+    if limit is not None:
+        command["limit"] = limit
+    return command
+
+
+def count(collection, query, limit=None):
+    # `count_documents` mengirim aggregate ini, bukan perintah `count`
+    pipeline = [{"$match": query}]
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+    pipeline.append({"$group": {"_id": 1, "n": {"$sum": 1}}})
+    return aggregate(collection, pipeline)
+
+
+def aggregate(collection, pipeline):
+    return {"aggregate": collection, "pipeline": pipeline, "cursor": {}}
+
+
+def find_and_modify(collection, query, update=None, sort=None):
+    command = {"findAndModify": collection, "query": query}
+    if update is None:
+        command["remove"] = True
+    else:
+        command["update"] = update
+    if sort is not None:
+        command["sort"] = {sort: 1}
+    return command
+
+
+def update(collection, query, change, upsert=False):
+    return {"update": collection, "updates": [{"q": query, "u": change, "upsert": upsert}]}
+
+
+def delete(collection, query):
+    return {"delete": collection, "deletes": [{"q": query, "limit": 0}]}
+
+
+class Sample:
+    """
+    Documents the shapes refer to.
+    """
+
+    def __init__(self):
+        now = datetime.now(timezone.utc)
+        self.now = now
+        self.users = [
+            {
+                "_id": ObjectId(),
+                "email": f"user{i}@example.com",
+                "password": "hash",
+                "superuser": i % 10 == 0,
+                "active": True,
+                "verified": i % 2 == 0,
+                "created_at": now.replace(tzinfo=None).isoformat(),
+            }
+            for i in range(50)
+        ]
+        self.meals = [
+            {
+                "_id": ObjectId(),
+                "name": f"Meal {i}",
+                "category": ["Chicken", "Beef", "Seafood"][i % 3],
+                "area": ["Indonesian", "Japanese"][i % 2],
+                "author": self.users[i % len(self.users)]["email"],
+                "verification_status": ["approved", "pending", "rejected"][i % 3],
+                "view_count": i % 4,
+                "favourite_count": i % 5,
+                "version": 1,
+            }
+            for i in range(200)
+        ]
+        self.favourites = [
+            {"_id": ObjectId(), "user_id": self.users[i % len(self.users)]["_id"], "meal_id": self.meals[i]["_id"]}
+            for i in range(100)
+        ]
+        self.outbox = [
+            {
+                "_id": ObjectId(),
+                "email": self.users[i]["email"],
+                "state": "pending",
+                "attempts": 0,
+                "created_at": now,
+                "available_at": now,
+            }
+            for i in range(20)
+        ]
+        self.user = self.users[0]
+        self.meal_id = str(self.meals[0]["_id"])
+        self.meal_ids = [meal["_id"] for meal in self.meals[:20]]
+        self.cursor = encode_cursor(self.meals[10]["_id"])
+
+    def collections(self) -> dict:
+        return {"users": self.users, "meals": self.meals, "favourites": self.favourites, "outbox": self.outbox}
+
+
+SHAPES = {
+    # dependencies / auth
+    "current user by email": lambda s: find("users", {"email": s.user["email"]}, limit=1),
+    "verify email": lambda s: find_and_modify("users", {"email": s.user["email"]}, {"$set": {"verified": True}}),
+    "meal exists": lambda s: count("meals", {"_id": ObjectId(s.meal_id)}, limit=1),
+
+    # meals
+    "meals approved": lambda s: find("meals", approved_meals(), "_id", 21),
+    "meals approved after cursor": lambda s: find("meals", after_cursor(approved_meals(), s.cursor), "_id", 21),
+    "meals by category": lambda s: find("meals", after_cursor(approved_meals("Chicken"), s.cursor), "_id", 21),
+    "meals by area": lambda s: find("meals", approved_meals(area="Japanese"), "_id", 21),
+    "meals by category and area": lambda s: find("meals", approved_meals("Chicken", "Japanese"), "_id", 21),
+    "meals in search order": lambda s: find("meals", {"_id": {"$in": s.meal_ids}}),
+    "my meals": lambda s: find("meals", after_cursor(authored_by(s.user), s.cursor), "_id", 21),
+    "meal by id": lambda s: find("meals", {"_id": ObjectId(s.meal_id)}, limit=1),
+    "favourite flag": lambda s: find("favourites", favourite_of(s.user, s.meal_id), limit=1),
+    "favourite flags for page": lambda s: find("favourites", favourites_among(s.user, s.meal_ids)),
+    "favourite remove": lambda s: find_and_modify("favourites", favourite_of(s.user, s.meal_id)),
+    "favourite add": lambda s: update(
+        "favourites", favourite_of(s.user, s.meal_id), {"$setOnInsert": favourite_of(s.user, s.meal_id)}, upsert=True
+    ),
+    "favourite count": lambda s: update(
+        "meals", {"_id": ObjectId(s.meal_id), "favourite_count": {"$gt": 0}}, {"$inc": {"favourite_count": -1}}
+    ),
+    "own meal check": lambda s: count("meals", owned_meal(s.meal_id, s.user), limit=1),
+    "update own meal": lambda s: find_and_modify("meals", owned_meal(s.meal_id, s.user), {"$set": {"name": "x"}}),
+    "delete own meal": lambda s: find_and_modify("meals", owned_meal(s.meal_id, s.user)),
+    "trending meals": lambda s: find("meals", approved_among([str(meal_id) for meal_id in s.meal_ids])),
+    "seed trending": lambda s: find("meals", popular_meals()),
+
+    # users
+    "favourite meals": lambda s: aggregate(
+        "favourites", favourite_meals_pipeline(s.user, s.cursor, MEAL_SUMMARY_PROJECTION, 21)
+    ),
+    "favourite meals full view": lambda s: aggregate("favourites", favourite_meals_pipeline(s.user, limit=21)),
+    "favourite meals stream": lambda s: aggregate("favourites", favourite_meals_pipeline(s.user)),
+
+    # admin
+    "pending meals": lambda s: find("meals", after_cursor({"verification_status": "pending"}, s.cursor), "_id", 21),
+    "users by flag": lambda s: find("users", user_filter(verified=False), "_id", 21),
+    "users by flag count": lambda s: count("users", user_filter(superuser=True), limit=10_000),
+    "users by created range": lambda s: find(
+        "users", user_filter(created_from=s.now - timedelta(days=90), created_to=s.now), "_id", 21
+    ),
+    "users by email prefix": lambda s: find("users", user_filter(email_prefix="user1"), "email", 21),
+    "users by flag and email prefix": lambda s: find(
+        "users", user_filter(active=True, email_prefix="user1"), "email", 21
+    ),
+    "user by id": lambda s: find("users", {"_id": s.user["_id"]}, limit=1),
+    "stats documents": lambda s: find("stats", {"_id": {"$in": [STATS_ID, day_key(s.now)]}}),
+
+    # stats
+    "verified users count": lambda s: count("users", user_filter(verified=True)),
+    "daily signups": lambda s: aggregate("users", daily_counts_pipeline(s.now - timedelta(days=90))),
+    "daily favourites": lambda s: aggregate("favourites", daily_counts_pipeline(s.now - timedelta(days=90))),
+
+    # etag / outbox
+    "counters": lambda s: find("counters", {"_id": {"$in": ["catalogue", f"favourites:{s.user['_id']}"]}}),
+    "outbox claim": lambda s: find_and_modify(
+        "outbox", claimable_outbox(s.now), {"$inc": {"attempts": 1}}, sort="available_at"
+    ),
+    "outbox users": lambda s: find("users", {"email": {"$in": [user["email"] for user in s.users[:5]]}}),
+    "outbox done": lambda s: delete("outbox", {"_id": {"$in": [record["_id"] for record in s.outbox[:5]]}, "claimed_by": "w"}),
+    "outbox pending count": lambda s: count("outbox", {"state": "pending"}),
+}
+
+
+@pytest.fixture(scope="module")
+def database():
+    client = MongoClient(URL, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        pytest.skip(f"no mongod at {URL}")
+
+    client.drop_database(DATABASE)
+    database = client[DATABASE]
+    for collection, indexes in INDEXES.items():
+        database[collection].create_indexes(indexes)
+    sample = Sample()
+    for collection, documents in sample.collections().items():
+        database[collection].insert_many(documents)
+    database.stats.insert_one({"_id": STATS_ID})
+    database.counters.insert_one({"_id": "catalogue", "seq": 1})
+
+    yield database, sample
+    client.drop_database(DATABASE)
+    client.close()
+
+
+def plan_stages(explain) -> list[str]:
+    """
+    Stage names in the winning plans of an explain result, at any depth.
+    """
+    stages = []
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "rejectedPlans":
+                continue
+            if key == "stage" and isinstance(value, str):
+                stages.append(value)
+            stages.extend(plan_stages(value))
+    elif isinstance(explain, list):
+        for value in explain:
+            stages.extend(plan_stages(value))
+    return stages
+
+
+def collection_scans(explain) -> int:
+    """
+    Collection scans reported by `$lookup` stages, whose inner plans are not
+    part of the winning plan.
+    """
+    if isinstance(explain, dict):
+        return explain.get("collectionScans", 0) + sum(collection_scans(value) for value in explain.values())
+    if isinstance(explain, list):
+        return sum(collection_scans(value) for value in explain)
+    return 0
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_query_uses_index(database, shape):
+    database, sample = database
+    command = SHAPES[shape](sample)
+    explain = database.command({"explain": command, "verbosity": "executionStats"})
+
+    stages = plan_stages(explain)
+    assert "COLLSCAN" not in stages, " > ".join(dict.fromkeys(stages))
+    assert collection_scans(explain) == 0
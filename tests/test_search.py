@@ -0,0 +1,155 @@
+import math
+import random
+
+from app.indexes.search import InvertedIndex, ingredient_names, meal_tokens, prefix_match, tokenize, top_results
+
+WORDS = ["chicken", "chickpea", "rice", "egg", "coconut", "milk", "soto", "ayam", "beef", "rendang"]
+
+
+def meal(meal_id, name, category="", area="", ingredients=(), status="approved"):
+    return {
+        "_id": meal_id,
+        "name": name,
+        "category": category,
+        "area": area,
+        "ingredients": [{"name": ingredient, "measure": "1"} for ingredient in ingredients],
+        "verification_status": status,
+    }
+
+
+def random_index(rng, size):
+    index = InvertedIndex()
+    for i in range(size):
+        name = " ".join(rng.choices(WORDS, k=rng.randint(1, 4)))
+        index.upsert(meal(f"m{i:04d}", name, ingredients=rng.choices(WORDS, k=rng.randint(0, 3))))
+    return index
+
+
+def exhaustive(index, search, only=None):
+    """
+    Every match ranked, scored without pruning.
+    """
+    return index.search(search, only=only)
+
+
+def test_tokenize_lowercases_words():
+    assert tokenize("Soto Ayam, Indonesia!") == ["soto", "ayam", "indonesia"]
+
+
+def test_ingredient_names_skips_malformed_entries():
+    document = {"ingredients": [{"name": "Rice"}, "salt", {"measure": "1"}, {"name": 3}, None]}
+    assert ingredient_names(document) == ["Rice"]
+    assert ingredient_names({"ingredients": None}) == []
+
+
+def test_meal_tokens_cover_name_area_category_and_ingredients():
+    tokens = meal_tokens(meal("1", "Soto Ayam", "Chicken", "Indonesian", ["Turmeric"]))
+    assert tokens == ["soto", "ayam", "indonesian", "chicken", "turmeric"]
+
+
+def test_prefix_match_needs_every_keyword():
+    assert prefix_match(["chick", "ri"], ["chicken", "rice"])
+    assert not prefix_match(["chick", "egg"], ["chicken", "rice"])
+
+
+def test_top_results_ranks_by_score_then_id():
+    scores = {"b": 1.0, "a": 1.0, "c": 2.0}
+    assert top_results(scores) == [(2.0, "c"), (1.0, "a"), (1.0, "b")]
+    assert top_results(scores, limit=2) == [(2.0, "c"), (1.0, "a")]
+    assert top_results(scores, after=(1.0, "a")) == [(1.0, "b")]
+
+
+def test_search_matches_every_keyword_by_prefix():
+    index = InvertedIndex()
+    index.upsert(meal("1", "Chicken Rice"))
+    index.upsert(meal("2", "Chicken Soup"))
+    index.upsert(meal("3", "Beef Rice"))
+
+    assert {meal_id for _, meal_id in index.search("chick")} == {"1", "2"}
+    assert [meal_id for _, meal_id in index.search("chick ri")] == ["1"]
+    assert index.search("lamb") == []
+    assert index.search("  ") == []
+
+
+def test_search_scores_match_bm25():
+    index = InvertedIndex()
+    documents = [
+        meal("1", "Chicken Chicken Rice"),
+        meal("2", "Chicken Soup", ingredients=["Carrot", "Celery"]),
+        meal("3", "Beef Rice"),
+    ]
+    for document in documents:
+        index.upsert(document)
+
+    lengths = {document["_id"]: len(meal_tokens(document)) for document in documents}
+    average = sum(lengths.values()) / len(lengths)
+    df = 2
+    idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+
+    def expected(tf, length):
+        return idf * tf * (index.k1 + 1) / (tf + index.k1 * (1 - index.b + index.b * length / average))
+
+    scores = dict((meal_id, score) for score, meal_id in index.search("chicken"))
+    assert math.isclose(scores["1"], expected(2, lengths["1"]))
+    assert math.isclose(scores["2"], expected(1, lengths["2"]))
+
+
+def test_search_ignores_unapproved_and_removed_meals():
+    index = InvertedIndex()
+    index.upsert(meal("1", "Chicken Rice"))
+    index.upsert(meal("2", "Chicken Soup", status="pending"))
+    assert [meal_id for _, meal_id in index.search("chicken")] == ["1"]
+
+    index.upsert(meal("1", "Chicken Rice", status="rejected"))
+    assert index.search("chicken") == []
+    assert index.terms == [] and index.postings == {} and len(index) == 0
+
+
+def test_search_keeps_cached_weights_in_sync_with_writes():
+    index = InvertedIndex()
+    index.upsert(meal("1", "Chicken Rice"))
+    index.search("chicken")
+    index.upsert(meal("2", "Chicken Soup"))
+    index.remove("1")
+
+    assert [meal_id for _, meal_id in index.search("chicken")] == ["2"]
+    assert list(index.impacts["chicken"].weights) == ["2"]
+
+
+def test_pruned_pages_match_exhaustive_ranking():
+    rng = random.Random(7)
+    index = random_index(rng, 400)
+    for search in ["chicken", "chick rice", "egg milk", "soto ayam", "c", "rendang beef egg"]:
+        expected = exhaustive(index, search)
+        for limit in [1, 5, 20]:
+            assert index.search(search, limit=limit) == expected[:limit]
+
+
+def test_pruned_pages_follow_cursor_and_only():
+    rng = random.Random(11)
+    index = random_index(rng, 300)
+    only = {f"m{i:04d}" for i in range(0, 300, 3)}
+    for search in ["rice", "chicken egg"]:
+        expected = exhaustive(index, search)
+        pages, after = [], None
+        while True:
+            page = index.search(search, limit=7, after=after)
+            if not page:
+                break
+            pages += page
+            after = page[-1]
+        assert pages == expected
+        assert index.search(search, limit=10, only=only) == exhaustive(index, search, only)[:10]
+
+
+def test_pruned_pages_stay_exact_after_writes():
+    rng = random.Random(3)
+    index = random_index(rng, 200)
+    for step in range(50):
+        index.search("rice", limit=5)
+        if step % 2:
+            index.remove(f"m{rng.randrange(200):04d}")
+        else:
+            name = " ".join(rng.choices(WORDS, k=3))
+            index.upsert(meal(f"m{rng.randrange(250):04d}", name))
+        assert index.search("rice", limit=5) == exhaustive(index, "rice")[:5]
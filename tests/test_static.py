@@ -0,0 +1,69 @@
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.cache import FileCache, FileEntry
+from app.routers.static import byte_range
+
+ENTRY = FileEntry(memoryview(b"0123456789"), '"image"', "image/png", "")
+
+
+def request(**headers) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/images/a.png",
+        "query_string": b"",
+        "headers": [(key.replace("_", "-").encode(), value.encode()) for key, value in headers.items()],
+    })
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-3", (0, 4)),
+    ("bytes=4-", (4, 10)),
+    ("bytes=-3", (7, 10)),
+    ("bytes=-20", (0, 10)),
+    ("bytes=8-20", (8, 10)),
+    ("bytes=9-2", None),
+    ("bytes=0-1,4-5", None),
+    ("bytes=-", None),
+    ("items=0-1", None),
+])
+def test_byte_range(header, expected):
+    assert byte_range(request(range=header), ENTRY) == expected
+
+
+def test_byte_range_without_header():
+    assert byte_range(request(), ENTRY) is None
+
+
+def test_byte_range_if_range_must_match():
+    assert byte_range(request(range="bytes=0-3", if_range='"image"'), ENTRY) == (0, 4)
+    assert byte_range(request(range="bytes=0-3", if_range='"older"'), ENTRY) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=10-", "bytes=-0"])
+def test_byte_range_not_satisfiable(header):
+    with pytest.raises(HTTPException) as error:
+        byte_range(request(range=header), ENTRY)
+    assert error.value.status_code == 416
+    assert error.value.headers == {"Content-Range": "bytes */10"}
+
+
+def test_file_cache_bounded_by_bytes():
+    files = FileCache(max_bytes=10, max_file_size=6)
+    files.set("a", b"aaaa", '"a"', "image/png", "")
+    files.set("b", b"bbbb", '"b"', "image/png", "")
+    files.get("a")
+    files.set("c", b"cccc", '"c"', "image/png", "")
+
+    assert "b" not in files and "a" in files and "c" in files
+    assert files.size == 8 and files.evictions == 1
+
+
+def test_file_cache_skips_large_files():
+    files = FileCache(max_bytes=10, max_file_size=3)
+    entry = files.set("a", b"aaaa", '"a"', "image/png", "")
+
+    assert bytes(entry.content) == b"aaaa"
+    assert "a" not in files and files.size == 0
@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from pymongo import UpdateOne
+
+from app.stats import STATS_ID, StatsBuffer, day_key, field_key, meal_delta
+
+
+class StatsCollection:
+    """
+    Records the `bulk_write`s it gets; the first `failures` calls raise.
+    """
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.writes = []
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("primary stepped down")
+        self.writes.append(operations)
+
+
+def meal(status="approved", category="Chicken", area="Indonesian"):
+    return {"verification_status": status, "category": category, "area": area}
+
+
+def test_meal_delta_insert_and_delete():
+    assert meal_delta(None, meal()) == {"meals.approved": 1, "categories.Chicken": 1, "areas.Indonesian": 1}
+    assert meal_delta(meal(), None) == {"meals.approved": -1, "categories.Chicken": -1, "areas.Indonesian": -1}
+
+
+def test_meal_delta_update_moves_counts():
+    delta = meal_delta(meal("pending"), meal("approved", area="Japanese"))
+    assert {field: value for field, value in delta.items() if value} == {
+        "meals.pending": -1,
+        "meals.approved": 1,
+        "areas.Indonesian": -1,
+        "areas.Japanese": 1,
+    }
+
+
+def test_field_key_escapes_mongo_field_names():
+    assert field_key("St. Lucia") == "St． Lucia"
+    assert field_key("$where") == "＄where"
+    assert meal_delta(None, {})["meals.None"] == 1
+
+
+def test_flush_writes_nonzero_increments():
+    buffer = StatsBuffer()
+    at = datetime(2026, 1, 2, tzinfo=timezone.utc)
+    buffer.add({"users": 1}, day={"signups": 1}, at=at)
+    buffer.meal_changed(meal(), meal())
+    collection = StatsCollection()
+    asyncio.run(buffer.flush(collection))
+
+    assert collection.writes == [[
+        UpdateOne({"_id": STATS_ID}, {"$inc": {"users": 1}}, upsert=True),
+        UpdateOne({"_id": day_key(at)}, {"$inc": {"signups": 1}}, upsert=True),
+    ]]
+    asyncio.run(buffer.flush(collection))
+    assert len(collection.writes) == 1
+
+
+def test_failed_flush_keeps_increments_for_next_flush():
+    buffer = StatsBuffer()
+    buffer.add({"users": 1})
+    collection = StatsCollection(failures=1)
+    with pytest.raises(ConnectionError):
+        asyncio.run(buffer.flush(collection))
+
+    buffer.add({"users": 2, "favourites": 1})
+    asyncio.run(buffer.flush(collection))
+    assert collection.writes == [[UpdateOne({"_id": STATS_ID}, {"$inc": {"users": 3, "favourites": 1}}, upsert=True)]]
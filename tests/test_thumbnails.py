@@ -0,0 +1,87 @@
+import hashlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app import images
+from app.images import image_path, is_original
+from app.routers import static
+from app.thumbnails import ThumbnailPipeline, render_variants, variant_candidates, variant_name
+
+DIGEST = hashlib.sha256(b"thumbnail test").hexdigest()
+ORIGINAL = f"{DIGEST}.png"
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(images, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(images, "UPLOAD_ROOT", tmp_path.resolve())
+    return tmp_path
+
+
+def save(name: str, width: int = 800, height: int = 400):
+    path = image_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", (width, height), "green").save(path, "PNG" if name.endswith(".png") else "WEBP")
+    return path
+
+
+def test_only_originals_have_variants():
+    assert is_original(ORIGINAL)
+    assert not is_original(variant_name(ORIGINAL, 640))
+    assert not is_original("legacy.png")
+
+
+def test_variant_candidates_smallest_first():
+    assert variant_candidates(ORIGINAL, 200) == [f"{DIGEST}_w320.webp", f"{DIGEST}_w640.webp"]
+    assert variant_candidates(ORIGINAL, 1000) == []
+
+
+def test_enqueue_rejects_variants_and_legacy_names():
+    pipeline = ThumbnailPipeline(size=1, concurrency=1, queue_limit=10)
+    assert not pipeline.enqueue(variant_name(ORIGINAL, 640))
+    assert not pipeline.enqueue("legacy.png")
+    assert pipeline.pending == {}
+
+
+def test_render_variants_skips_widths_not_smaller(upload_dir, tmp_path):
+    source = save(ORIGINAL, width=500, height=250)
+    targets = [(width, str(upload_dir / variant_name(ORIGINAL, width))) for width in (160, 320, 640)]
+
+    assert render_variants(str(source), targets, str(tmp_path)) == [320, 160]
+    with Image.open(upload_dir / variant_name(ORIGINAL, 160)) as variant:
+        assert variant.size == (160, 80)
+    assert not (upload_dir / variant_name(ORIGINAL, 640)).exists()
+
+
+@pytest.fixture
+def client(upload_dir, monkeypatch):
+    queued = []
+    monkeypatch.setattr(static.thumbnails, "enqueue", queued.append)
+    app = FastAPI()
+    app.include_router(static.router)
+    client = TestClient(app)
+    client.queued = queued
+    return client
+
+
+def test_width_on_original_serves_original_and_queues_variants(client):
+    save(ORIGINAL)
+    response = client.get(f"/static/images/{ORIGINAL}?w=100")
+
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == static.PROVISIONAL
+    assert client.queued == [ORIGINAL]
+
+
+def test_width_on_variant_serves_variant_as_is(client, upload_dir):
+    variant = variant_name(ORIGINAL, 640)
+    save(variant, width=640, height=320)
+    response = client.get(f"/static/images/{variant}?w=100")
+
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == static.IMMUTABLE
+    assert client.queued == []
+    assert sorted(path.name for path in image_path(variant).parent.iterdir()) == [variant]
@@ -0,0 +1,29 @@
+from app.indexes.trigram import TrigramIndex, trigrams
+
+from .test_search import meal
+
+
+def test_trigrams_pad_word_edges():
+    assert trigrams("ab") == {"  a", " ab", "ab "}
+
+
+def test_trigram_search_tolerates_typos():
+    index = TrigramIndex()
+    index.upsert(meal("1", "Chicken Rendang"))
+    index.upsert(meal("2", "Beef Rendang"))
+    index.upsert(meal("3", "Chicken Soup"))
+
+    assert {meal_id for _, meal_id in index.search("chiken")} == {"1", "3"}
+    assert [meal_id for _, meal_id in index.search("chiken rendag")] == ["1"]
+    assert [meal_id for _, meal_id in index.search("rendag", only={"2"})] == ["2"]
+    assert index.matches(["chiken"], {"chicken"})
+    assert not index.matches(["beef"], {"chicken"})
+
+
+def test_trigram_remove_drops_unused_words():
+    index = TrigramIndex()
+    index.upsert(meal("1", "Chicken"))
+    index.remove("1")
+
+    assert index.search("chicken") == []
+    assert index.grams == {} and index.word_meals == {} and index.word_grams == {}